@@ -0,0 +1,137 @@
+"""
+Kiểm soát tải cho các endpoint nhận diện: hàng đợi có giới hạn, ưu tiên và deadline
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from config import ADMISSION_MAX_QUEUE, ADMISSION_WORKERS, ADMISSION_RETRY_AFTER
+
+# Mức ưu tiên: số nhỏ hơn được xử lý trước
+PRIORITY_LANE = 0
+PRIORITY_DASHBOARD = 1
+PRIORITIES = {'lane': PRIORITY_LANE, 'dashboard': PRIORITY_DASHBOARD}
+
+class QueueFullError(Exception):
+	"""Hàng đợi đầy (hoặc request bị đẩy ra bởi request ưu tiên cao hơn)."""
+
+	def __init__(self, message, retry_after=ADMISSION_RETRY_AFTER):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+class DeadlineExceededError(Exception):
+	"""Request đã quá deadline của client trước khi được xử lý."""
+
+	def __init__(self, message, retry_after=ADMISSION_RETRY_AFTER):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+class _Ticket:
+	__slots__ = ('priority', 'seq', 'fn', 'args', 'kwargs', 'deadline', 'enqueued', 'future')
+
+	def __init__(self, priority, seq, fn, args, kwargs, deadline):
+		self.priority = priority
+		self.seq = seq
+		self.fn = fn
+		self.args = args
+		self.kwargs = kwargs
+		self.deadline = deadline
+		self.enqueued = time.monotonic()
+		self.future = Future()
+
+	def __lt__(self, other):
+		return (self.priority, self.seq) < (other.priority, other.seq)
+
+class AdmissionController:
+	"""Hàng đợi ưu tiên có giới hạn đặt trước detector.
+
+	- Hàng đợi đầy: request mới bị từ chối bằng QueueFullError, trừ khi nó có ưu tiên cao
+	  hơn một request đang chờ - khi đó request ưu tiên thấp nhất, mới nhất bị đẩy ra.
+	- Deadline: worker bỏ qua request đã quá deadline (monotonic, giây) thay vì tốn CPU
+	  cho kết quả client không còn chờ.
+	- `workers` luồng lấy request theo thứ tự ưu tiên rồi FIFO.
+	"""
+
+	def __init__(self, max_queue=ADMISSION_MAX_QUEUE, workers=ADMISSION_WORKERS,
+				 retry_after=ADMISSION_RETRY_AFTER):
+		self.max_queue = max_queue
+		self.retry_after = retry_after
+		self._heap = []
+		self._seq = itertools.count()
+		self._cond = threading.Condition()
+		self._in_flight = 0
+		self._counters = {'admitted': 0, 'rejected': 0, 'evicted': 0, 'expired': 0, 'completed': 0, 'failed': 0}
+		self._wait_total = 0.0
+		self._wait_max = 0.0
+		self._threads = [
+			threading.Thread(target=self._worker, name=f'admission-{i}', daemon=True)
+			for i in range(workers)
+		]
+		for t in self._threads:
+			t.start()
+
+	def submit(self, fn, *args, priority=PRIORITY_DASHBOARD, deadline=None, **kwargs):
+		"""Đưa fn(*args, **kwargs) vào hàng đợi, trả về Future. Ném QueueFullError nếu hết chỗ."""
+		ticket = _Ticket(priority, next(self._seq), fn, args, kwargs, deadline)
+		with self._cond:
+			if len(self._heap) >= self.max_queue:
+				victim = max(self._heap)
+				if victim.priority <= priority:
+					self._counters['rejected'] += 1
+					raise QueueFullError("Hàng đợi nhận diện đã đầy", self.retry_after)
+				self._heap.remove(victim)
+				heapq.heapify(self._heap)
+				self._counters['evicted'] += 1
+				victim.future.set_exception(QueueFullError("Bị thay bởi request ưu tiên cao hơn", self.retry_after))
+			heapq.heappush(self._heap, ticket)
+			self._counters['admitted'] += 1
+			self._cond.notify()
+		return ticket.future
+
+	def _worker(self):
+		while True:
+			with self._cond:
+				while not self._heap:
+					self._cond.wait()
+				ticket = heapq.heappop(self._heap)
+				now = time.monotonic()
+				waited = now - ticket.enqueued
+				self._wait_total += waited
+				self._wait_max = max(self._wait_max, waited)
+				if ticket.deadline is not None and now > ticket.deadline:
+					self._counters['expired'] += 1
+					ticket.future.set_exception(DeadlineExceededError("Request đã quá deadline", self.retry_after))
+					continue
+				# Client đã bỏ chờ (Future bị hủy) thì không xử lý nữa
+				if not ticket.future.set_running_or_notify_cancel():
+					self._counters['expired'] += 1
+					continue
+				self._in_flight += 1
+			try:
+				result = ticket.fn(*ticket.args, **ticket.kwargs)
+				ticket.future.set_result(result)
+				outcome = 'completed'
+			except Exception as e:
+				ticket.future.set_exception(e)
+				outcome = 'failed'
+			with self._cond:
+				self._in_flight -= 1
+				self._counters[outcome] += 1
+
+	def stats(self):
+		with self._cond:
+			dequeued = sum(self._counters[k] for k in ('expired', 'completed', 'failed')) + self._in_flight
+			by_priority = {}
+			for ticket in self._heap:
+				by_priority[ticket.priority] = by_priority.get(ticket.priority, 0) + 1
+			return {
+				'queue_depth': len(self._heap),
+				'queue_depth_by_priority': {name: by_priority.get(p, 0) for name, p in PRIORITIES.items()},
+				'max_queue': self.max_queue,
+				'in_flight': self._in_flight,
+				**self._counters,
+				'avg_wait_ms': round(self._wait_total / dequeued * 1000, 2) if dequeued else 0,
+				'max_wait_ms': round(self._wait_max * 1000, 2),
+			}
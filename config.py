@@ -19,7 +19,112 @@ FPS = 30
 # Cấu hình nhận diện biển số
 LICENSE_PLATE_MIN_AREA = 1000  # Diện tích tối thiểu của biển số
 LICENSE_PLATE_ASPECT_RATIO = 2.0  # Tỷ lệ khung hình biển số
-CONFIDENCE_THRESHOLD = 0.7  # Ngưỡng tin cậy cho OCR
+CONFIDENCE_THRESHOLD = 0.7  # Ngưỡng tin cậy cho OCR (dừng cascade sớm khi biển số chuẩn đạt ngưỡng)
+OCR_CALL_BUDGET = 20  # Số lượt OCR tối đa cho mỗi frame (None = không giới hạn)
+# 'readtext': detect + recognize cho từng biến thể ảnh
+# 'shared_detection': detect text một lần mỗi frame/crop, các biến thể chỉ chạy recognize
+# 'batched': gộp mọi biến thể của frame (và các crop) vào một lượt readtext_batched
+OCR_MODE = "readtext"
+# Vùng crop từ contours đã có dạng biển số -> chỉ chạy recognize, gộp tất cả crop trong một lượt
+CONTOUR_RECOGNITION_ONLY = True
+OCR_BATCH_SIZE = 8  # batch_size cho EasyOCR
+OCR_BATCH_CROP_SIZE = (320, 96)  # (rộng, cao) chung khi gộp các crop khác kích thước vào một batch
+# Profile tiền xử lý: "fast" (lọc median, 2 biến thể), "balanced" (lọc bilateral, 3 biến thể),
+# "accurate" (khử nhiễu NL-means, 4 biến thể - chậm nhất)
+PREPROCESS_PROFILE = "accurate"
+# Profile riêng cho từng camera, ví dụ {"0": "fast", "lane-2": "balanced"}
+CAMERA_PROFILES = {}
+# Vùng quan tâm (đa giác) của từng camera: chỉ vùng này được crop, tiền xử lý và OCR.
+# Toạ độ theo tỉ lệ 0..1 hoặc theo pixel kèm frame_size, ví dụ
+# {"lane-1": [[0.1, 0.45], [0.9, 0.45], [1.0, 1.0], [0.0, 1.0]],
+#  "lane-2": {"points": [[200, 500], [1700, 500], [1900, 1080], [0, 1080]], "frame_size": [1920, 1080]}}
+CAMERA_ROIS = {}
+CAMERA_ROIS_FILE = BASE_DIR / "camera_rois.json"  # Nếu tồn tại thì ghi đè CAMERA_ROIS
+# Thử các biến thể ảnh theo tỉ lệ ra biển số lịch sử của từng camera,
+# mỗi VARIANT_EXPLORE_EVERY frame thì ưu tiên các biến thể ít được thử để khám phá lại.
+# Thống kê thuộc từng tiến trình: với pool OCR mỗi worker có thống kê riêng (mất khi worker được thay)
+VARIANT_ORDERING = True
+VARIANT_EXPLORE_EVERY = 20
+
+# Pool tiến trình OCR cho web app (0 = chạy OCR ngay trong tiến trình Flask)
+OCR_POOL_SIZE = 0
+OCR_POOL_TORCH_THREADS = 1  # Số luồng torch cho mỗi worker
+OCR_POOL_MAX_TASKS_PER_WORKER = 500  # Thay worker mới sau K request (None = không thay)
+# Cách tạo worker: "spawn"/"forkserver" = tiến trình mới tự nạp model (an toàn trong Flask đa luồng),
+# "fork" = dùng chung model của tiến trình cha, chỉ an toàn khi chưa có luồng/torch nào chạy
+OCR_POOL_START_METHOD = "spawn"
+OCR_POOL_TIMEOUT = 120  # Số giây tối đa chờ một task OCR
+VIDEO_POOL_TIMEOUT = None  # Số giây tối đa chờ một video xử lý trên pool (None = không giới hạn)
+
+# Micro-batching cho /api/detect_plate: gom các request đến trong cửa sổ MICRO_BATCH_WINDOW_MS
+# thành một lượt gọi detector (tối đa MICRO_BATCH_MAX_SIZE ảnh mỗi lô). Mỗi ảnh vẫn chạy đủ cascade
+# như request đơn lẻ; lợi ích là ít lượt gửi sang pool OCR hơn khi có nhiều request đồng thời
+MICRO_BATCH_ENABLED = False
+MICRO_BATCH_WINDOW_MS = 10
+MICRO_BATCH_MAX_SIZE = 8
+MICRO_BATCH_MAX_IN_FLIGHT = 2  # Số lô chạy đồng thời (khi có pool OCR: tối thiểu OCR_POOL_SIZE)
+
+# Kiểm soát tải cho các endpoint nhận diện
+ADMISSION_MAX_QUEUE = 32  # Số request tối đa chờ trong hàng đợi
+ADMISSION_WORKERS = 4  # Số request được xử lý đồng thời
+ADMISSION_DEFAULT_DEADLINE_MS = 10000  # Deadline mặc định nếu client không gửi deadline_ms
+ADMISSION_RETRY_AFTER = 2  # Giá trị header Retry-After (giây) khi quá tải
+# Video đồng bộ có hàng đợi và worker riêng để video dài không chiếm worker của nhận diện ảnh
+VIDEO_ADMISSION_MAX_QUEUE = 4
+VIDEO_ADMISSION_WORKERS = 1
+
+# Job xử lý video chạy nền
+VIDEO_JOB_WORKERS = 2  # Số video được xử lý đồng thời
+VIDEO_JOB_TTL = 3600  # Giữ kết quả job đã xong trong bao nhiêu giây
+
+# Pipeline video: một luồng giải mã (grab/retrieve) song song với các luồng OCR
+VIDEO_PIPELINE_WORKERS = 2  # Số luồng OCR
+VIDEO_PIPELINE_QUEUE_SIZE = 8  # Số frame đã giải mã tối đa chờ OCR
+VIDEO_STREAM_BUFFER = 32  # Số event tối đa chờ gửi cho client stream (đầy thì xử lý video chờ client)
+
+# Xử lý video dài song song theo đoạn: chia file thành N đoạn, mỗi đoạn một tiến trình,
+# không giới hạn số frame (0 = tắt, /api/detect_plate_video xử lý tuần tự như cũ)
+VIDEO_SEGMENT_PROCESSES = 0
+
+# Theo dõi biển số qua nhiều frame (video): mỗi xe chỉ OCR khi mới xuất hiện hoặc sau mỗi
+# TRACK_OCR_EVERY frame, các lần đọc được gộp bằng bỏ phiếu từng ký tự
+VIDEO_TRACKING = False
+TRACK_IOU_THRESHOLD = 0.3  # IoU tối thiểu để ghép vùng với track cũ
+TRACK_OCR_EVERY = 5  # Đọc lại track sau mỗi bao nhiêu frame được xử lý
+TRACK_MAX_AGE = 10  # Kết thúc track sau bao nhiêu frame không thấy
+TRACK_MAX_FINISHED = 256  # Số track đã kết thúc giữ lại chờ lấy kết quả (pop_finished), cũ nhất bị bỏ
+
+# Lọc chuyển động cho camera/video: bỏ qua OCR trên frame tĩnh (làn trống), chỉ xử lý vùng có chuyển động
+MOTION_GATING = False
+MOTION_GATE = {
+    "method": "diff",  # "diff" (so với frame trước) hoặc "mog2" (background subtraction)
+    "width": 160,  # Chiều rộng ảnh thu nhỏ dùng để so sánh
+    "threshold": 25,  # Ngưỡng chênh lệch độ sáng (method "diff")
+    "min_area": 0.002,  # Tỉ lệ điểm ảnh thay đổi tối thiểu để coi là có chuyển động
+    "padding": 0.15,  # Nới vùng chuyển động thêm bao nhiêu (theo kích thước vùng)
+    "crop_max": 0.6,  # Vùng lớn hơn tỉ lệ này thì xử lý cả frame
+}
+# Cấu hình riêng cho từng nguồn, ví dụ {"0": {"enabled": True, "threshold": 15}, "lane-2": {"method": "mog2"}}
+CAMERA_MOTION_GATES = {}
+
+# Chọn frame video để OCR: "sample" (mỗi sample_rate frame, tối đa 100 frame) hoặc "sharpness"
+# (mỗi cửa sổ KEYFRAME_WINDOW frame chỉ OCR KEYFRAME_PER_WINDOW frame nét nhất, không giới hạn số frame)
+FRAME_SELECTION = "sample"
+KEYFRAME_WINDOW = 10
+KEYFRAME_PER_WINDOW = 1
+KEYFRAME_WIDTH = 320  # Chiều rộng ảnh thu nhỏ để tính độ nét
+KEYFRAME_ROI = None  # Vùng tính độ nét (x, y, w, h) theo tỉ lệ 0..1, ví dụ (0.2, 0.4, 0.6, 0.6)
+
+# Camera trực tiếp: đọc/hiển thị theo FPS camera, OCR chạy nền trên frame mới nhất (frame cũ bị bỏ)
+LIVE_ASYNC = True
+
+# Nhiều làn, mỗi làn một camera (chạy: python ingest_manager.py). source: index camera, URL RTSP
+# hoặc video file để test; fps: số frame tối đa đưa vào OCR mỗi giây; priority: số nhỏ hơn ưu tiên hơn
+# Ví dụ: [{"lane_id": "lane-1", "source": 0, "fps": 4, "priority": 0},
+#         {"lane_id": "lane-2", "source": "rtsp://10.0.0.12/stream", "fps": 2, "priority": 1}]
+LANES = []
+INGEST_WORKERS = 2  # Số luồng gửi frame vào detector/pool OCR
+INGEST_RECONNECT_DELAY = 5  # Giây chờ trước khi mở lại stream bị mất kết nối
 
 # Cấu hình thu phí (VNĐ)
 BASE_TOLL_FEE = 50000  # Phí cơ bản
@@ -38,6 +143,35 @@ DATABASE_CONFIG = {
     "echo": False
 }
 
+# Kết nối SQLite: giữ sẵn tối đa DATABASE_POOL_SIZE kết nối để dùng lại giữa các request,
+# WAL cho phép đọc song song với ghi, synchronous=NORMAL chỉ fsync khi checkpoint
+DATABASE_POOL_SIZE = 8
+DATABASE_CACHED_STATEMENTS = 64  # Số câu lệnh đã biên dịch được giữ lại trên mỗi kết nối
+DATABASE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # Số âm = KB (~16MB)
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # ms
+}
+
+# Ghi giao dịch thu phí theo lô (write-behind): gom tối đa TOLL_WRITE_BATCH_SIZE giao dịch hoặc
+# chờ tối đa TOLL_WRITE_FLUSH_MS rồi ghi bằng một lần commit.
+# TOLL_WRITE_DURABILITY: "flush" (mặc định) chỉ xác nhận giao dịch sau khi lô chứa nó đã được
+# commit, mỗi lượt xe chờ thêm tối đa TOLL_WRITE_FLUSH_MS; "enqueue" xác nhận ngay khi giao dịch vào
+# hàng đợi nhưng có thể mất tối đa một lô đã xác nhận nếu tiến trình bị kill - chỉ bật khi chấp
+# nhận mất giao dịch để đổi lấy độ trễ
+TOLL_WRITE_BEHIND = True
+TOLL_WRITE_BATCH_SIZE = 200
+TOLL_WRITE_FLUSH_MS = 10
+TOLL_WRITE_DURABILITY = "flush"
+TOLL_WRITE_QUEUE_SIZE = 10000  # Hàng đợi đầy thì luồng gọi phải chờ
+
+# Cache thông tin xe (biển số -> loại xe, trọng lượng) trong bộ nhớ: xe quen không phải ghi lại
+# bảng vehicles mỗi lượt qua trạm. 0 = tắt cache
+VEHICLE_CACHE_SIZE = 10000
+VEHICLE_CACHE_TTL = 3600  # Giây; hết hạn thì đọc lại từ DB (phòng DB bị sửa từ nơi khác)
+
 # Tạo thư mục uploads nếu chưa tồn tại
 UPLOAD_FOLDER.mkdir(exist_ok=True)
 
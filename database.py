@@ -4,15 +4,161 @@ Module quản lý cơ sở dữ liệu cho hệ thống thu phí
 
 import sqlite3
 import datetime
+import queue
+import threading
+import time
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import (
+    DATABASE_POOL_SIZE, DATABASE_CACHED_STATEMENTS, DATABASE_PRAGMAS,
+    TOLL_WRITE_BEHIND, TOLL_WRITE_BATCH_SIZE, TOLL_WRITE_FLUSH_MS, TOLL_WRITE_DURABILITY,
+    TOLL_WRITE_QUEUE_SIZE, VEHICLE_CACHE_SIZE, VEHICLE_CACHE_TTL,
+)
+
+# Chế độ xác nhận của WriteBehindWriter
+WRITE_DURABILITY_MODES = ('enqueue', 'flush')
+
+# Câu lệnh dùng chung (cùng chuỗi SQL nên được lấy lại từ cache statement của kết nối)
+# Upsert giữ nguyên id và chỉ ghi khi thông tin xe thực sự thay đổi (INSERT OR REPLACE xóa rồi
+# chèn lại dòng mỗi lần)
+UPSERT_VEHICLE = (
+    'INSERT INTO vehicles (license_plate, vehicle_type, weight) VALUES (?, ?, ?) '
+    'ON CONFLICT (license_plate) DO UPDATE SET '
+    'vehicle_type = excluded.vehicle_type, weight = excluded.weight '
+    'WHERE vehicle_type IS NOT excluded.vehicle_type OR weight IS NOT excluded.weight'
+)
+INSERT_TRANSACTION = ('INSERT INTO toll_transactions (license_plate, toll_fee, timestamp, vehicle_type, lane_id) '
+                      'VALUES (?, ?, ?, ?, ?)')
+# Cộng dồn vào bảng tổng hợp (rollup) theo giờ/ngày x loại xe x làn
+UPSERT_ROLLUP = (
+    'INSERT INTO {table} VALUES (?, ?, ?, ?, ?) '
+    'ON CONFLICT ({period}, vehicle_type, lane_id) DO UPDATE SET '
+    'vehicles = vehicles + excluded.vehicles, revenue = revenue + excluded.revenue'
+)
+UPSERT_ROLLUP_HOURLY = UPSERT_ROLLUP.format(table='toll_rollup_hourly', period='hour')
+UPSERT_ROLLUP_DAILY = UPSERT_ROLLUP.format(table='toll_rollup_daily', period='day')
+# Khóa của rollup khi lượt xe không có loại xe / làn
+DEFAULT_VEHICLE_TYPE = 'default'
+DEFAULT_LANE = ''
+
+def format_timestamp(value):
+    """Thời điểm lưu trong DB: 'YYYY-MM-DD HH:MM:SS.ffffff' (độ dài cố định nên so sánh chuỗi
+    đúng thứ tự thời gian và dùng được index). Nhận datetime, date hoặc chuỗi ISO."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    elif not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+class VehicleCache:
+    """Cache LRU có TTL: biển số -> (vehicle_type, weight) như đang lưu trong bảng vehicles."""
+
+    def __init__(self, size=VEHICLE_CACHE_SIZE, ttl=VEHICLE_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()  # license_plate -> (vehicle_type, weight, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, license_plate):
+        """(vehicle_type, weight) nếu có trong cache và chưa hết hạn, ngược lại None."""
+        with self._lock:
+            item = self._items.get(license_plate)
+            if item is not None and item[2] <= time.monotonic():
+                del self._items[license_plate]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(license_plate)
+            self.hits += 1
+            return item[:2]
+
+    def put(self, license_plate, vehicle_type, weight):
+        with self._lock:
+            self._items[license_plate] = (vehicle_type, weight, time.monotonic() + self.ttl)
+            self._items.move_to_end(license_plate)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, license_plate):
+        with self._lock:
+            self._items.pop(license_plate, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'max_size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
 
 class TollDatabase:
-    def __init__(self, db_path="toll_system.db"):
+    def __init__(self, db_path="toll_system.db", pool_size=DATABASE_POOL_SIZE, pragmas=None,
+                 vehicle_cache_size=VEHICLE_CACHE_SIZE):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.pragmas = dict(DATABASE_PRAGMAS if pragmas is None else pragmas)
+        self._pool = queue.LifoQueue()  # Kết nối đang rảnh
+        self.connections_opened = 0
+        self.vehicle_cache = VehicleCache(vehicle_cache_size) if vehicle_cache_size > 0 else None
+        self.vehicle_writes_skipped = 0
         self.init_database()
-    
+
+    def _connect(self):
+        # Kết nối có thể được luồng khác dùng lại sau khi trả về pool (mỗi lúc chỉ một luồng giữ)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=DATABASE_CACHED_STATEMENTS)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        self.connections_opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Mượn một kết nối từ pool (mở mới nếu pool rỗng) và trả lại sau khi dùng."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._pool.qsize() < self.pool_size:
+                self._pool.put(conn)
+            else:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Các câu lệnh trong khối được commit một lần khi kết thúc (rollback nếu có lỗi)."""
+        with self.connection() as conn:
+            with conn:
+                yield conn.cursor()
+
+    def close(self):
+        """Đóng các kết nối đang rảnh trong pool."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
     def init_database(self):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self.transaction() as cursor:
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS vehicles (
                     id INTEGER PRIMARY KEY,
@@ -29,20 +175,428 @@ class TollDatabase:
                     timestamp TIMESTAMP
                 )
             ''')
-            conn.commit()
-    
+            self._migrate_transactions(cursor)
+            # Bảng tổng hợp cho thống kê: mỗi truy vấn chỉ đọc vài dòng thay vì quét giao dịch
+            rollups_exist = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'toll_rollup_daily'").fetchone()
+            for table, period in (('toll_rollup_hourly', 'hour'), ('toll_rollup_daily', 'day')):
+                cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        {period} TEXT,
+                        vehicle_type TEXT,
+                        lane_id TEXT,
+                        vehicles INTEGER,
+                        revenue REAL,
+                        PRIMARY KEY ({period}, vehicle_type, lane_id)
+                    )
+                ''')
+            if not rollups_exist:
+                self._rebuild_rollups(cursor)
+            # Lịch sử theo biển số và theo thời gian (rowid nằm sẵn trong index nên phân trang
+            # theo (timestamp, id) không cần sắp xếp lại)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_plate_time '
+                           'ON toll_transactions (license_plate, timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_time '
+                           'ON toll_transactions (timestamp)')
+
+    def _migrate_transactions(self, cursor):
+        """Thêm cột vehicle_type, lane_id cho DB tạo từ phiên bản cũ; loại xe của giao dịch cũ
+        lấy theo bảng vehicles."""
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(toll_transactions)')}
+        if 'vehicle_type' not in columns:
+            cursor.execute('ALTER TABLE toll_transactions ADD COLUMN vehicle_type TEXT')
+            cursor.execute('UPDATE toll_transactions SET vehicle_type = '
+                           '(SELECT v.vehicle_type FROM vehicles v '
+                           'WHERE v.license_plate = toll_transactions.license_plate)')
+        if 'lane_id' not in columns:
+            cursor.execute('ALTER TABLE toll_transactions ADD COLUMN lane_id TEXT')
+        # Phiên bản cũ ghi datetime qua adapter mặc định của sqlite3, bỏ phần micro giây khi bằng 0:
+        # chuẩn hóa về format_timestamp để so sánh chuỗi (lọc thời gian, phân trang) đúng thứ tự
+        legacy = cursor.execute("SELECT id, timestamp FROM toll_transactions "
+                                "WHERE length(timestamp) != 26 OR timestamp LIKE '%T%'").fetchall()
+        normalized = []
+        for transaction_id, timestamp in legacy:
+            try:
+                normalized.append((format_timestamp(timestamp), transaction_id))
+            except (TypeError, ValueError):
+                print(f"Bỏ qua thời điểm không hợp lệ của giao dịch {transaction_id}: {timestamp}")
+        cursor.executemany('UPDATE toll_transactions SET timestamp = ? WHERE id = ?', normalized)
+
+    def _insert_transactions(self, cursor, rows):
+        """Ghi giao dịch (license_plate, toll_fee, timestamp, vehicle_type, lane_id) và cộng dồn
+        vào các bảng rollup trong cùng transaction của `cursor`."""
+        rows = [(plate, toll_fee, format_timestamp(timestamp), vehicle_type, lane_id)
+                for plate, toll_fee, timestamp, vehicle_type, lane_id in rows]
+        cursor.executemany(INSERT_TRANSACTION, rows)
+        hourly = {}
+        for _, toll_fee, timestamp, vehicle_type, lane_id in rows:
+            key = (timestamp[:13], vehicle_type or DEFAULT_VEHICLE_TYPE, lane_id or DEFAULT_LANE)
+            vehicles, revenue = hourly.get(key, (0, 0.0))
+            hourly[key] = (vehicles + 1, revenue + (toll_fee or 0))
+        daily = {}
+        for (hour, vehicle_type, lane_id), (vehicles, revenue) in hourly.items():
+            key = (hour[:10], vehicle_type, lane_id)
+            total_vehicles, total_revenue = daily.get(key, (0, 0.0))
+            daily[key] = (total_vehicles + vehicles, total_revenue + revenue)
+        cursor.executemany(UPSERT_ROLLUP_HOURLY, [key + value for key, value in hourly.items()])
+        cursor.executemany(UPSERT_ROLLUP_DAILY, [key + value for key, value in daily.items()])
+
+    def _rebuild_rollups(self, cursor):
+        cursor.execute('DELETE FROM toll_rollup_hourly')
+        cursor.execute('DELETE FROM toll_rollup_daily')
+        cursor.execute('INSERT INTO toll_rollup_hourly '
+                       'SELECT substr(timestamp, 1, 13), COALESCE(vehicle_type, ?), COALESCE(lane_id, ?), '
+                       'COUNT(*), COALESCE(SUM(toll_fee), 0) FROM toll_transactions GROUP BY 1, 2, 3',
+                       (DEFAULT_VEHICLE_TYPE, DEFAULT_LANE))
+        cursor.execute('INSERT INTO toll_rollup_daily '
+                       'SELECT substr(hour, 1, 10), vehicle_type, lane_id, SUM(vehicles), SUM(revenue) '
+                       'FROM toll_rollup_hourly GROUP BY 1, 2, 3')
+
+    def rebuild_rollups(self):
+        """Tính lại toàn bộ bảng rollup từ toll_transactions."""
+        with self.transaction() as cursor:
+            self._rebuild_rollups(cursor)
+
+    def check_rollups(self):
+        """So sánh bảng rollup với số liệu tính trực tiếp từ toll_transactions; trả về list các
+        dòng lệch (rỗng nếu khớp)."""
+        expected_hourly = (
+            'SELECT substr(timestamp, 1, 13), COALESCE(vehicle_type, ?), COALESCE(lane_id, ?), '
+            'COUNT(*), ROUND(COALESCE(SUM(toll_fee), 0), 2) FROM toll_transactions GROUP BY 1, 2, 3'
+        )
+        expected_daily = (
+            'SELECT substr(timestamp, 1, 10), COALESCE(vehicle_type, ?), COALESCE(lane_id, ?), '
+            'COUNT(*), ROUND(COALESCE(SUM(toll_fee), 0), 2) FROM toll_transactions GROUP BY 1, 2, 3'
+        )
+        params = (DEFAULT_VEHICLE_TYPE, DEFAULT_LANE)
+        mismatches = []
+        with self.connection() as conn:
+            for table, period, expected in (('toll_rollup_hourly', 'hour', expected_hourly),
+                                            ('toll_rollup_daily', 'day', expected_daily)):
+                actual = f'SELECT {period}, vehicle_type, lane_id, vehicles, ROUND(revenue, 2) FROM {table}'
+                for row in conn.execute(f'{expected} EXCEPT {actual}', params):
+                    mismatches.append({'table': table, 'expected': row})
+                for row in conn.execute(f'{actual} EXCEPT {expected}', params):
+                    mismatches.append({'table': table, 'actual': row})
+        return mismatches
+
+    def _upsert_vehicles(self, cursor, vehicles):
+        """Ghi các xe (license_plate, vehicle_type, weight) có thông tin khác với cache.
+
+        Cache được cập nhật ngay sau câu lệnh ghi, khi transaction vẫn đang giữ khóa ghi của
+        SQLite, nên thứ tự cập nhật cache trùng thứ tự commit giữa các luồng; nếu transaction
+        bị rollback thì các xe vừa ghi bị xóa khỏi cache (xem _write).
+        """
+        latest = {}
+        for license_plate, vehicle_type, weight in vehicles:
+            latest[license_plate] = (vehicle_type, weight)
+        if self.vehicle_cache is not None:
+            changed = {plate: info for plate, info in latest.items()
+                       if self.vehicle_cache.get(plate) != info}
+            self.vehicle_writes_skipped += len(vehicles) - len(changed)
+        else:
+            changed = latest
+        cursor.executemany(UPSERT_VEHICLE, [(plate, vehicle_type, weight)
+                                            for plate, (vehicle_type, weight) in changed.items()])
+        if self.vehicle_cache is not None:
+            for plate, (vehicle_type, weight) in changed.items():
+                self.vehicle_cache.put(plate, vehicle_type, weight)
+        return list(changed)
+
+    @contextmanager
+    def _write(self):
+        """Transaction ghi; trả về list để ghi các biển số đã đưa vào cache trong transaction."""
+        cached = []
+        try:
+            with self.transaction() as cursor:
+                yield cursor, cached
+        except Exception:
+            if self.vehicle_cache is not None:
+                for plate in cached:
+                    self.vehicle_cache.invalidate(plate)
+            raise
+
     def add_vehicle(self, license_plate, vehicle_type, weight=None):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('INSERT OR REPLACE INTO vehicles VALUES (?, ?, ?, ?)',
-                         (None, license_plate, vehicle_type, weight))
-            conn.commit()
-    
-    def add_transaction(self, license_plate, toll_fee):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('INSERT INTO toll_transactions VALUES (?, ?, ?, ?)',
-                         (None, license_plate, toll_fee, datetime.datetime.now()))
-            conn.commit()
-
-db = TollDatabase() 
\ No newline at end of file
+        with self._write() as (cursor, cached):
+            cached.extend(self._upsert_vehicles(cursor, [(license_plate, vehicle_type, weight)]))
+
+    def add_transaction(self, license_plate, toll_fee, vehicle_type=None, lane_id=None):
+        with self.transaction() as cursor:
+            self._insert_transactions(cursor, [(license_plate, toll_fee, datetime.datetime.now(),
+                                                vehicle_type, lane_id)])
+
+    def process_vehicle_entry(self, license_plate, vehicle_type, weight, toll_fee, lane_id=None):
+        """Ghi xe và giao dịch thu phí trong cùng một transaction (một lần commit)."""
+        timestamp = datetime.datetime.now()
+        self.process_vehicle_entries([(license_plate, vehicle_type, weight, toll_fee, timestamp, lane_id)])
+        return timestamp
+
+    def process_vehicle_entries(self, entries):
+        """Ghi nhiều lượt xe (license_plate, vehicle_type, weight, toll_fee, timestamp, lane_id)
+        bằng executemany trong một transaction."""
+        with self._write() as (cursor, cached):
+            cached.extend(self._upsert_vehicles(cursor, [(plate, vehicle_type, weight)
+                                                         for plate, vehicle_type, weight, _, _, _ in entries]))
+            self._insert_transactions(cursor, [(plate, toll_fee, timestamp, vehicle_type, lane_id)
+                                               for plate, vehicle_type, _, toll_fee, timestamp, lane_id in entries])
+
+    def get_vehicle(self, license_plate):
+        cached = self.vehicle_cache.get(license_plate) if self.vehicle_cache is not None else None
+        if cached is not None:
+            return {'license_plate': license_plate, 'vehicle_type': cached[0], 'weight': cached[1]}
+        with self.connection() as conn:
+            row = conn.execute('SELECT license_plate, vehicle_type, weight FROM vehicles '
+                               'WHERE license_plate = ?', (license_plate,)).fetchone()
+        if row is None:
+            return None
+        if self.vehicle_cache is not None:
+            self.vehicle_cache.put(row[0], row[1], row[2])
+        return {'license_plate': row[0], 'vehicle_type': row[1], 'weight': row[2]}
+
+    def get_transactions(self, license_plate=None, start=None, end=None, limit=50, before=None):
+        """Giao dịch mới nhất trước, trong khoảng [start, end).
+
+        Phân trang theo keyset: before=(timestamp, id) của giao dịch cuối trang trước, trang
+        sau chỉ đọc tiếp trên index thay vì OFFSET quét lại các trang đã qua.
+        """
+        conditions, params = [], []
+        if license_plate:
+            conditions.append('license_plate = ?')
+            params.append(license_plate)
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(format_timestamp(start))
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(format_timestamp(end))
+        if before is not None:
+            conditions.append('(timestamp, id) < (?, ?)')
+            params.extend((format_timestamp(before[0]), int(before[1])))
+        sql = 'SELECT id, license_plate, toll_fee, timestamp FROM toll_transactions'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+        params.append(limit)
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{'id': row[0], 'license_plate': row[1], 'toll_fee': row[2], 'timestamp': row[3]}
+                for row in rows]
+
+    def get_statistics(self, start, end):
+        """Số lượt xe, doanh thu, số lượt theo loại xe, theo làn và theo giờ trong các ngày
+        [start, end), đọc từ bảng rollup."""
+        params = (format_timestamp(start)[:10], format_timestamp(end)[:10])
+        with self.connection() as conn:
+            rows = conn.execute('SELECT vehicle_type, lane_id, vehicles, revenue FROM toll_rollup_daily '
+                                'WHERE day >= ? AND day < ?', params).fetchall()
+            hourly = conn.execute('SELECT substr(hour, 12, 2), SUM(vehicles) FROM toll_rollup_hourly '
+                                  'WHERE hour >= ? AND hour < ? GROUP BY 1 ORDER BY 1', params).fetchall()
+        vehicle_types, lanes = {}, {}
+        for vehicle_type, lane_id, vehicles, revenue in rows:
+            vehicle_types[vehicle_type] = vehicle_types.get(vehicle_type, 0) + vehicles
+            if lane_id != DEFAULT_LANE:
+                lanes[lane_id] = lanes.get(lane_id, 0) + vehicles
+        return {
+            'total_vehicles': sum(row[2] for row in rows),
+            'total_revenue': sum(row[3] for row in rows),
+            'vehicle_types': vehicle_types,
+            'lanes': lanes,
+            'hourly': dict(hourly),
+        }
+
+    def stats(self):
+        return {
+            'connections_opened': self.connections_opened,
+            'connections_idle': self._pool.qsize(),
+            'pool_size': self.pool_size,
+            'vehicle_writes_skipped': self.vehicle_writes_skipped,
+            'vehicle_cache': self.vehicle_cache.stats() if self.vehicle_cache is not None else None,
+        }
+
+class _Batch:
+    """Các lượt xe được ghi cùng một lần commit."""
+
+    def __init__(self):
+        self.entries = []
+        self.done = threading.Event()
+        self.error = None
+
+class WriteBehindWriter:
+    """Hàng đợi ghi sau (write-behind) cho các lượt xe qua trạm.
+
+    submit() chỉ thêm lượt xe vào lô hiện tại; luồng nền ghi cả lô bằng
+    TollDatabase.process_vehicle_entries (một lần commit) khi lô đủ `batch_size` lượt hoặc
+    lượt đầu tiên đã chờ `flush_ms` ms. durability='enqueue' trả về ngay, 'flush' chờ tới khi
+    lô đã được commit (và ném lỗi nếu ghi thất bại). close() ghi nốt hàng đợi, được gọi khi
+    tiến trình kết thúc.
+    """
+
+    def __init__(self, database, batch_size=TOLL_WRITE_BATCH_SIZE, flush_ms=TOLL_WRITE_FLUSH_MS,
+                 durability=TOLL_WRITE_DURABILITY, max_pending=TOLL_WRITE_QUEUE_SIZE):
+        if durability not in WRITE_DURABILITY_MODES:
+            raise ValueError(f"Chế độ ghi không hỗ trợ: {durability}")
+        self.db = database
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.durability = durability
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._batch = _Batch()
+        self._batch_started = None
+        self._pending = 0  # Lượt xe đã nhận nhưng chưa commit (kể cả lô đang ghi)
+        self._closed = False
+        self._thread = None
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self._flush_time = 0.0
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='toll-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def submit(self, license_plate, vehicle_type, weight, toll_fee, lane_id=None):
+        timestamp = datetime.datetime.now()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WriteBehindWriter đã đóng")
+            self._start()
+            while self._pending >= self.max_pending:
+                self._cond.wait()
+            batch = self._batch
+            if not batch.entries:
+                self._batch_started = time.monotonic()
+            batch.entries.append((license_plate, vehicle_type, weight, toll_fee, timestamp, lane_id))
+            self._pending += 1
+            self.enqueued += 1
+            # Đánh thức luồng ghi khi lô mới bắt đầu (đặt hạn flush) hoặc đã đủ lượt
+            if len(batch.entries) == 1 or len(batch.entries) >= self.batch_size:
+                self._cond.notify_all()
+        if self.durability == 'flush':
+            batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+        return timestamp
+
+    def _take_batch(self):
+        """Chờ tới khi lô hiện tại cần ghi (gọi khi giữ _cond); None nếu đã đóng và hết việc."""
+        while True:
+            entries = len(self._batch.entries)
+            if entries:
+                wait = self._batch_started + self.flush_ms / 1000.0 - time.monotonic()
+                if entries >= self.batch_size or wait <= 0 or self._closed:
+                    batch, self._batch = self._batch, _Batch()
+                    return batch
+                self._cond.wait(wait)
+            elif self._closed:
+                return None
+            else:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                self.db.process_vehicle_entries(batch.entries)
+            except Exception as e:
+                batch.error = e
+                print(f"Lỗi ghi {len(batch.entries)} giao dịch: {e}")
+            with self._cond:
+                self._flush_time += time.perf_counter() - started
+                self.batches += 1
+                if batch.error is None:
+                    self.written += len(batch.entries)
+                else:
+                    self.failed += len(batch.entries)
+                self._pending -= len(batch.entries)
+                self._cond.notify_all()
+            batch.done.set()
+
+    def flush(self, timeout=None):
+        """Ghi ngay các lượt xe đang chờ và đợi tới khi commit xong; trả về False nếu hết timeout."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            if self._batch.entries:
+                self._batch_started = time.monotonic() - self.flush_ms / 1000.0
+                self._cond.notify_all()
+            while self._pending:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """Ghi nốt hàng đợi và dừng luồng nền."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'durability': self.durability,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'failed': self.failed,
+                'pending': self._pending,
+                'batches': self.batches,
+                'avg_batch_size': round((self.written + self.failed) / self.batches, 2) if self.batches else 0,
+                'avg_flush_ms': round(self._flush_time / self.batches * 1000, 2) if self.batches else 0,
+            }
+
+# Instance dùng chung được tạo khi dùng lần đầu: chỉ import module (test, công cụ) không mở,
+# migrate hay bật WAL trên toll_system.db
+_db = None
+_toll_writer = None
+_instance_lock = threading.Lock()
+
+def get_db():
+    """TollDatabase dùng chung (toll_system.db)."""
+    global _db
+    with _instance_lock:
+        if _db is None:
+            _db = TollDatabase()
+    return _db
+
+def get_toll_writer():
+    """WriteBehindWriter dùng chung, None nếu tắt TOLL_WRITE_BEHIND."""
+    global _toll_writer
+    if not TOLL_WRITE_BEHIND:
+        return None
+    database = get_db()
+    with _instance_lock:
+        if _toll_writer is None:
+            _toll_writer = WriteBehindWriter(database)
+    return _toll_writer
+
+def __getattr__(name):
+    # Tương thích với `from database import db` / `database.toll_writer`
+    if name == 'db':
+        return get_db()
+    if name == 'toll_writer':
+        return get_toll_writer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Kiểm tra / tính lại bảng tổng hợp thống kê thu phí")
+    parser.add_argument('--rebuild', action='store_true', help="tính lại rollup từ toll_transactions")
+    args = parser.parse_args()
+    if args.rebuild:
+        get_db().rebuild_rollups()
+        print("✅ Đã tính lại bảng rollup")
+    mismatches = get_db().check_rollups()
+    for mismatch in mismatches:
+        print(f"❌ {mismatch}")
+    print("✅ Bảng rollup khớp với toll_transactions" if not mismatches
+          else f"⚠️  {len(mismatches)} dòng lệch, chạy lại với --rebuild")
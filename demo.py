@@ -4,13 +4,15 @@ Demo đơn giản để test các chức năng cơ bản
 
 import cv2
 import numpy as np
-from database import db
+from database import get_db
 from toll_system import toll_system
 
 def test_database():
     """Test cơ sở dữ liệu"""
     print("🧪 Test cơ sở dữ liệu...")
     
+    db = get_db()
+    
     # Thêm xe mẫu
     db.add_vehicle("30A-12345", "car", 1500)
     db.add_vehicle("51F-67890", "truck", 8000)
@@ -0,0 +1,252 @@
+"""
+Lọc frame rẻ trước OCR: vùng quan tâm cố định của camera, bỏ qua frame tĩnh, giới hạn vùng
+xử lý theo chuyển động và chọn frame nét
+"""
+
+import json
+import os
+import cv2
+import numpy as np
+from config import (
+	CAMERA_ROIS, CAMERA_ROIS_FILE,
+	MOTION_GATING, MOTION_GATE, CAMERA_MOTION_GATES,
+	FRAME_SELECTION, KEYFRAME_WINDOW, KEYFRAME_PER_WINDOW, KEYFRAME_WIDTH, KEYFRAME_ROI,
+)
+
+# 'sample': mỗi sample_rate frame một frame; 'sharpness': frame nét nhất mỗi cửa sổ
+FRAME_SELECTION_MODES = ('sample', 'sharpness')
+
+class CameraROI:
+	"""Vùng quan tâm (đa giác) cố định của một camera, ví dụ chỉ phần mặt đường của làn.
+
+	points: các đỉnh [x, y] theo pixel, hoặc theo tỉ lệ 0..1 nếu mọi toạ độ <= 1.
+	frame_size: (width, height) của frame dùng khi vẽ đa giác theo pixel; ảnh có kích thước
+		khác (ví dụ đã thu nhỏ về MAX_SERVER_DIM) thì đa giác được co giãn theo.
+	"""
+
+	def __init__(self, points, frame_size=None):
+		if len(points) < 3:
+			raise ValueError("ROI cần ít nhất 3 đỉnh")
+		self.points = np.array(points, dtype=np.float64)
+		self.normalized = float(self.points.max()) <= 1.0
+		self.frame_size = tuple(frame_size) if frame_size else None
+		self._cache = {}  # (h, w) -> (rect, mask hoặc None nếu ROI là hình chữ nhật)
+
+	@classmethod
+	def from_config(cls, value):
+		if isinstance(value, dict):
+			return cls(value['points'], value.get('frame_size'))
+		return cls(value)
+
+	def geometry(self, shape):
+		"""(x, y, w, h) bao quanh đa giác trên ảnh kích thước `shape` và mask trong vùng đó."""
+		h, w = shape[:2]
+		if (h, w) not in self._cache:
+			points = self.points.copy()
+			if self.normalized:
+				points *= (w, h)
+			elif self.frame_size:
+				points *= (w / float(self.frame_size[0]), h / float(self.frame_size[1]))
+			points = np.round(points).astype(np.int32)
+			points[:, 0] = np.clip(points[:, 0], 0, w)
+			points[:, 1] = np.clip(points[:, 1], 0, h)
+			x, y, rw, rh = cv2.boundingRect(points)
+			rw, rh = min(rw, w - x), min(rh, h - y)
+			mask = np.zeros((rh, rw), dtype=np.uint8)
+			cv2.fillPoly(mask, [points - (x, y)], 255)
+			# Đa giác là hình chữ nhật: chỉ cần crop, không cần mask
+			if cv2.countNonZero(mask) == mask.size:
+				mask = None
+			self._cache[(h, w)] = ((x, y, rw, rh), mask)
+		return self._cache[(h, w)]
+
+	def apply(self, image):
+		"""Crop ảnh theo ROI, điểm ngoài đa giác được tô bằng màu trung bình trong ROI
+		(tránh tạo cạnh giả cho Canny). Trả về (ảnh, (x, y) offset về ảnh gốc)."""
+		(x, y, w, h), mask = self.geometry(image.shape)
+		crop = image[y:y+h, x:x+w]
+		if mask is None:
+			return crop, (x, y)
+		out = crop.copy()
+		fill = cv2.mean(crop, mask)
+		out[mask == 0] = fill[:out.shape[2]] if out.ndim == 3 else fill[0]
+		return out, (x, y)
+
+	def area_ratio(self, shape):
+		(_, _, w, h), _ = self.geometry(shape)
+		return round(w * h / float(shape[0] * shape[1]), 3)
+
+def load_camera_rois(rois=None, path=CAMERA_ROIS_FILE):
+	"""ROI theo camera_id từ CAMERA_ROIS, ghi đè bởi file JSON `path` nếu có."""
+	rois = dict(CAMERA_ROIS if rois is None else rois)
+	if path and os.path.exists(path):
+		with open(path, 'r', encoding='utf-8') as f:
+			rois.update(json.load(f))
+	return {str(camera_id): CameraROI.from_config(value) for camera_id, value in rois.items()}
+
+class MotionGate:
+	"""Phát hiện chuyển động trên ảnh thu nhỏ (rộng `width` px).
+
+	- method='diff': so sánh với frame trước (xe dừng hẳn sau khi đã vào làn cũng bị lọc)
+	- method='mog2': background subtractor MOG2 của OpenCV (bỏ qua vùng bóng)
+
+	check(frame) trả về None nếu frame tĩnh (không cần OCR), ngược lại trả về vùng chuyển
+	động (x, y, w, h) trên frame gốc, đã nới thêm `padding`. Nếu vùng chiếm hơn `crop_max`
+	diện tích frame thì trả về cả frame.
+	"""
+
+	def __init__(self, method='diff', width=160, threshold=25, min_area=0.002,
+				 padding=0.15, crop_max=0.6):
+		if method not in ('diff', 'mog2'):
+			raise ValueError(f"Phương pháp không hỗ trợ: {method}")
+		self.method = method
+		self.width = width
+		self.threshold = threshold
+		self.min_area = min_area
+		self.padding = padding
+		self.crop_max = crop_max
+		self._previous = None
+		self._subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=True) if method == 'mog2' else None
+		self.frames = 0
+		self.gated = 0
+		self.cropped = 0
+
+	def _mask(self, gray):
+		if self._subtractor is not None:
+			mask = self._subtractor.apply(gray)
+			# MOG2 đánh dấu bóng bằng 127: chỉ giữ foreground thật
+			return cv2.threshold(mask, 200, 255, cv2.THRESH_BINARY)[1], self.frames > 1
+		previous, self._previous = self._previous, gray
+		if previous is None or previous.shape != gray.shape:
+			return None, False
+		diff = cv2.absdiff(gray, previous)
+		return cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1], True
+
+	def check(self, frame):
+		self.frames += 1
+		h, w = frame.shape[:2]
+		scale = min(1.0, self.width / float(w))
+		small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+		gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+		gray = cv2.GaussianBlur(gray, (5, 5), 0)
+		mask, ready = self._mask(gray)
+		if not ready:
+			# Chưa có nền để so sánh: xử lý cả frame
+			return (0, 0, w, h)
+		mask = cv2.dilate(mask, None, iterations=2)
+		if cv2.countNonZero(mask) < self.min_area * mask.size:
+			self.gated += 1
+			return None
+		x, y, bw, bh = cv2.boundingRect(mask)
+		pad_x, pad_y = bw * self.padding, bh * self.padding
+		x1 = max(0, int((x - pad_x) / scale))
+		y1 = max(0, int((y - pad_y) / scale))
+		x2 = min(w, int((x + bw + pad_x) / scale) + 1)
+		y2 = min(h, int((y + bh + pad_y) / scale) + 1)
+		if (x2 - x1) * (y2 - y1) > self.crop_max * w * h:
+			return (0, 0, w, h)
+		self.cropped += 1
+		return (x1, y1, x2 - x1, y2 - y1)
+
+	def stats(self):
+		return {
+			'method': self.method,
+			'frames': self.frames,
+			'gated': self.gated,
+			'gated_ratio': round(self.gated / self.frames, 3) if self.frames else 0,
+			'cropped': self.cropped,
+		}
+
+def motion_gate_for(source=None, enabled=None):
+	"""Tạo MotionGate cho một nguồn (camera id, đường dẫn video) theo MOTION_GATE và
+	CAMERA_MOTION_GATES; trả về None nếu nguồn đó tắt lọc chuyển động."""
+	options = dict(MOTION_GATE)
+	if source is not None:
+		options.update(CAMERA_MOTION_GATES.get(str(source), {}))
+	if enabled is None:
+		enabled = options.pop('enabled', MOTION_GATING)
+	else:
+		options.pop('enabled', None)
+	return MotionGate(**options) if enabled else None
+
+class KeyframeSelector:
+	"""Chọn frame nét nhất thay cho lấy mẫu cố định mỗi N frame.
+
+	Điểm nét = phương sai Laplacian trên ROI thu nhỏ (rộng `width` px). Frame được chia
+	thành các cửa sổ `window` frame liên tiếp (theo số thứ tự tuyệt đối); mỗi cửa sổ chỉ
+	giữ `per_window` frame điểm cao nhất (và >= `min_score`), trả về theo thứ tự frame.
+	roi: (x, y, w, h) theo tỉ lệ 0..1 của frame, None = cả frame.
+	"""
+
+	def __init__(self, window=10, per_window=1, width=320, roi=None, min_score=0.0):
+		if window < 1 or per_window < 1:
+			raise ValueError("window và per_window phải >= 1")
+		self.window = window
+		self.per_window = per_window
+		self.width = width
+		self.roi = roi
+		self.min_score = min_score
+		self._window_id = None
+		self._candidates = []  # (score, frame_number, frame) của cửa sổ hiện tại
+		self.frames_scored = 0
+		self.frames_selected = 0
+		self.windows = 0
+		self._selected_score = 0.0
+
+	def score(self, frame):
+		h, w = frame.shape[:2]
+		if self.roi is not None:
+			rx, ry, rw, rh = self.roi
+			frame = frame[int(ry * h):int((ry + rh) * h), int(rx * w):int((rx + rw) * w)]
+			h, w = frame.shape[:2]
+		scale = min(1.0, self.width / float(max(w, 1)))
+		small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+		gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+		return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+	def _close_window(self):
+		self.windows += 1
+		best = sorted(self._candidates, key=lambda c: c[0], reverse=True)[:self.per_window]
+		self._candidates = []
+		best = [c for c in best if c[0] >= self.min_score]
+		self.frames_selected += len(best)
+		self._selected_score += sum(c[0] for c in best)
+		return [(frame_number, frame) for _, frame_number, frame in sorted(best, key=lambda c: c[1])]
+
+	def push(self, frame_number, frame):
+		"""Thêm frame (frame_number đánh số từ 1); trả về list (frame_number, frame) được chọn
+		của cửa sổ vừa kết thúc (rỗng nếu cửa sổ chưa kết thúc)."""
+		window_id = (frame_number - 1) // self.window
+		selected = []
+		if self._window_id is not None and window_id != self._window_id and self._candidates:
+			selected = self._close_window()
+		self._window_id = window_id
+		self.frames_scored += 1
+		self._candidates.append((self.score(frame), frame_number, frame))
+		if len(self._candidates) > self.per_window:
+			# Chỉ giữ per_window ứng viên tốt nhất để không tốn bộ nhớ
+			self._candidates.remove(min(self._candidates, key=lambda c: c[0]))
+		return selected
+
+	def flush(self):
+		"""Các frame được chọn của cửa sổ cuối (gọi khi hết video)."""
+		return self._close_window() if self._candidates else []
+
+	def stats(self):
+		return {
+			'window': self.window,
+			'per_window': self.per_window,
+			'frames_scored': self.frames_scored,
+			'frames_selected': self.frames_selected,
+			'windows': self.windows,
+			'avg_selected_score': round(self._selected_score / self.frames_selected, 2) if self.frames_selected else 0,
+		}
+
+def keyframe_selector_for(frame_selection=None):
+	"""KeyframeSelector theo cấu hình nếu chế độ chọn frame là 'sharpness', ngược lại None."""
+	frame_selection = frame_selection or FRAME_SELECTION
+	if frame_selection not in FRAME_SELECTION_MODES:
+		raise ValueError(f"Chế độ chọn frame không hỗ trợ: {frame_selection}")
+	if frame_selection != 'sharpness':
+		return None
+	return KeyframeSelector(KEYFRAME_WINDOW, KEYFRAME_PER_WINDOW, KEYFRAME_WIDTH, KEYFRAME_ROI)
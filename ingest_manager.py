@@ -0,0 +1,280 @@
+"""
+Nhận hình từ nhiều camera (mỗi làn một nguồn) và chia detector dùng chung cho các làn
+"""
+
+import threading
+import time
+from collections import deque
+import cv2
+from frame_filters import motion_gate_for
+from license_plate_detector import LicensePlateDetector
+from ocr_pool import DetectorPool
+from config import LANES, INGEST_WORKERS, INGEST_RECONNECT_DELAY, OCR_POOL_SIZE
+
+def _is_file_source(source):
+	return isinstance(source, str) and not source.isdigit() and '://' not in source
+
+class Lane:
+	"""Một làn: nguồn video, giới hạn FPS đưa vào OCR và mức ưu tiên (số nhỏ hơn ưu tiên hơn;
+	mỗi mức ưu tiên cao hơn được chia gấp đôi phần OCR khi detector bị tranh chấp).
+
+	Luồng capture đọc nguồn liên tục và chỉ giữ frame mới nhất; frame bị thay thế trước
+	khi được OCR tính là bỏ qua (dropped).
+	"""
+
+	def __init__(self, lane_id, source, fps=2, priority=1, motion_gating=None):
+		self.lane_id = str(lane_id)
+		self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+		self.fps = fps
+		self.priority = priority
+		self.gate = motion_gate_for(self.lane_id, motion_gating)
+		self.frame = None  # (frame_index, captured_at, frame) mới nhất chưa xử lý
+		self.busy = False
+		self.finished = False
+		self.next_at = 0.0  # Thời điểm sớm nhất được OCR frame tiếp theo (giới hạn FPS)
+		self.vtime = 0.0  # Thời gian ảo của lập lịch công bằng có trọng số
+		self.frames_captured = 0
+		self.frames_processed = 0
+		self.frames_dropped = 0
+		self.frames_gated = 0
+		self.detections = 0
+		self.reconnects = 0
+		self.lags = deque(maxlen=500)  # Thời gian frame chờ trước khi được OCR
+		self.latencies = deque(maxlen=500)  # Thời gian từ lúc đọc frame tới lúc có kết quả
+
+	@property
+	def weight(self):
+		return 0.5 ** self.priority
+
+	def ready(self, now):
+		return not self.busy and self.frame is not None and now >= self.next_at
+
+	def stats(self, elapsed):
+		lags = list(self.lags)
+		latencies = list(self.latencies)
+		return {
+			'lane_id': self.lane_id,
+			'source': str(self.source),
+			'priority': self.priority,
+			'fps_cap': self.fps,
+			'finished': self.finished,
+			'frames_captured': self.frames_captured,
+			'frames_processed': self.frames_processed,
+			'frames_dropped': self.frames_dropped,
+			'frames_gated': self.frames_gated,
+			'detections': self.detections,
+			'reconnects': self.reconnects,
+			'throughput_fps': round(self.frames_processed / elapsed, 2) if elapsed > 0 else 0,
+			'lag_ms_avg': round(sum(lags) / len(lags) * 1000, 2) if lags else 0,
+			'lag_ms_max': round(max(lags) * 1000, 2) if lags else 0,
+			'latency_ms_avg': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0,
+		}
+
+class IngestManager:
+	"""Mở nhiều nguồn video và lập lịch OCR công bằng giữa các làn.
+
+	- Mỗi làn có một luồng capture (device index, URL RTSP hoặc video file để test; video
+	  file được đọc theo FPS gốc, stream mất kết nối thì mở lại sau `reconnect_delay` giây).
+	- `workers` luồng lấy việc từ các làn có frame mới và đã hết khoảng cách FPS, theo lập
+	  lịch công bằng có trọng số (weighted fair queuing): làn ưu tiên cao được phần lớn
+	  hơn nhưng làn ưu tiên thấp không bị bỏ đói. Mỗi làn chỉ có tối đa một frame đang OCR
+	  nên các frame của một làn luôn được xử lý theo thứ tự.
+	- detect_fn(frame, lane_id, region) -> list kết quả, region là vùng chuyển động (x, y, w, h)
+	  do motion gate của làn trả về hoặc None (làn tắt lọc chuyển động: cả frame); bbox kết quả
+	  theo toạ độ frame gốc. Mỗi kết quả được gắn lane_id, frame_index, captured_at và lag_ms
+	  rồi gửi cho on_detection(lane_id, results).
+	"""
+
+	def __init__(self, detect_fn, lanes=None, workers=INGEST_WORKERS, on_detection=None,
+				 reconnect_delay=INGEST_RECONNECT_DELAY):
+		lanes = LANES if lanes is None else lanes
+		self.detect_fn = detect_fn
+		self.lanes = [lane if isinstance(lane, Lane) else Lane(**lane) for lane in lanes]
+		if len({lane.lane_id for lane in self.lanes}) != len(self.lanes):
+			raise ValueError("lane_id bị trùng")
+		self.workers = workers
+		self.on_detection = on_detection
+		self.reconnect_delay = reconnect_delay
+		self._cond = threading.Condition()
+		self._stop = threading.Event()
+		self._threads = []
+		self._started = None
+		self._vclock = 0.0
+
+	def _open(self, lane):
+		cap = cv2.VideoCapture(lane.source)
+		if not cap.isOpened():
+			print(f"Làn {lane.lane_id}: không mở được nguồn {lane.source}")
+			return None
+		return cap
+
+	def _capture(self, lane):
+		is_file = _is_file_source(lane.source)
+		cap = self._open(lane)
+		fps = cap.get(cv2.CAP_PROP_FPS) if cap is not None else 0
+		interval = 1.0 / fps if is_file and fps > 0 else 0
+		next_at = time.perf_counter()
+		try:
+			while not self._stop.is_set():
+				ret, frame = cap.read() if cap is not None else (False, None)
+				if not ret:
+					if is_file:
+						break
+					# Stream/camera mất kết nối: mở lại
+					if cap is not None:
+						cap.release()
+					lane.reconnects += 1
+					if self._stop.wait(self.reconnect_delay):
+						break
+					cap = self._open(lane)
+					continue
+				with self._cond:
+					if lane.frame is not None:
+						lane.frames_dropped += 1
+					lane.frames_captured += 1
+					lane.frame = (lane.frames_captured, time.time(), frame)
+					self._cond.notify()
+				if interval:
+					next_at += interval
+					delay = next_at - time.perf_counter()
+					if delay > 0:
+						time.sleep(delay)
+		finally:
+			if cap is not None:
+				cap.release()
+			with self._cond:
+				lane.finished = True
+				self._cond.notify_all()
+
+	def _next_lane(self):
+		"""Chọn làn kế tiếp (gọi khi giữ _cond); trả về (lane, thời gian chờ tối đa)."""
+		now = time.perf_counter()
+		ready = [lane for lane in self.lanes if lane.ready(now)]
+		if ready:
+			# Làn vừa rảnh không được dồn phần đã bỏ lỡ: thời gian ảo tối thiểu là đồng hồ chung
+			return min(ready, key=lambda lane: (max(lane.vtime, self._vclock), lane.priority)), None
+		waits = [lane.next_at - now for lane in self.lanes
+				 if not lane.busy and lane.frame is not None]
+		return None, max(min(waits), 0.001) if waits else 0.5
+
+	def _worker(self):
+		while True:
+			with self._cond:
+				while True:
+					if self._stop.is_set():
+						return
+					lane, wait = self._next_lane()
+					if lane is not None:
+						break
+					if all(l.finished and l.frame is None for l in self.lanes):
+						return
+					self._cond.wait(wait)
+				frame_index, captured_at, frame = lane.frame
+				lane.frame = None
+				lane.busy = True
+				started = time.perf_counter()
+				self._vclock = max(lane.vtime, self._vclock)
+				lane.vtime = self._vclock + 1.0 / lane.weight
+				lane.next_at = started + (1.0 / lane.fps if lane.fps else 0)
+			lag = time.time() - captured_at
+			results = []
+			try:
+				region = lane.gate.check(frame) if lane.gate is not None else None
+				if lane.gate is not None and region is None:
+					lane.frames_gated += 1
+				else:
+					results = self.detect_fn(frame, lane.lane_id, region)
+			except Exception as e:
+				print(f"Làn {lane.lane_id}: lỗi nhận diện: {e}")
+			for result in results:
+				result['lane_id'] = lane.lane_id
+				result['frame_index'] = frame_index
+				result['captured_at'] = captured_at
+				result['lag_ms'] = round(lag * 1000, 2)
+			with self._cond:
+				lane.busy = False
+				lane.frames_processed += 1
+				lane.detections += len(results)
+				lane.lags.append(lag)
+				lane.latencies.append(time.time() - captured_at)
+				self._cond.notify_all()
+			if results and self.on_detection is not None:
+				try:
+					self.on_detection(lane.lane_id, results)
+				except Exception as e:
+					print(f"Làn {lane.lane_id}: lỗi xử lý kết quả: {e}")
+
+	def start(self):
+		self._stop.clear()
+		self._started = time.perf_counter()
+		self._threads = [
+			threading.Thread(target=self._capture, args=(lane,), name=f'ingest-{lane.lane_id}', daemon=True)
+			for lane in self.lanes
+		]
+		self._threads += [
+			threading.Thread(target=self._worker, name=f'ingest-worker-{i}', daemon=True)
+			for i in range(self.workers)
+		]
+		for t in self._threads:
+			t.start()
+		return self
+
+	def wait(self, timeout=None):
+		"""Chờ tới khi mọi nguồn kết thúc (chỉ xảy ra với video file) hoặc hết timeout."""
+		deadline = time.perf_counter() + timeout if timeout is not None else None
+		for t in self._threads:
+			t.join(None if deadline is None else max(0, deadline - time.perf_counter()))
+
+	def running(self):
+		return any(t.is_alive() for t in self._threads)
+
+	def stop(self):
+		self._stop.set()
+		with self._cond:
+			self._cond.notify_all()
+		for t in self._threads:
+			t.join()
+
+	def stats(self):
+		elapsed = time.perf_counter() - self._started if self._started else 0
+		with self._cond:
+			lanes = [lane.stats(elapsed) for lane in self.lanes]
+		return {
+			'elapsed_s': round(elapsed, 2),
+			'workers': self.workers,
+			'processed': sum(l['frames_processed'] for l in lanes),
+			'detections': sum(l['detections'] for l in lanes),
+			'lanes': lanes,
+		}
+
+def main():
+	"""Chạy các làn trong LANES (config.py) trên detector dùng chung (hoặc pool OCR nếu
+	OCR_POOL_SIZE > 0), in thống kê định kỳ."""
+	if not LANES:
+		print("Chưa cấu hình LANES trong config.py")
+		return
+	if OCR_POOL_SIZE > 0:
+		detector = DetectorPool(OCR_POOL_SIZE)
+		workers = max(INGEST_WORKERS, OCR_POOL_SIZE)
+	else:
+		detector = LicensePlateDetector()
+		workers = INGEST_WORKERS
+
+	def on_detection(lane_id, results):
+		for result in results:
+			print(f"[{lane_id}] Biển số: {result['text']} ({result['confidence']:.2f}, trễ {result['lag_ms']:.0f}ms)")
+
+	manager = IngestManager(lambda frame, lane_id, region: detector.detect_in_region(frame, region, lane_id),
+							workers=workers, on_detection=on_detection).start()
+	try:
+		while manager.running():
+			manager.wait(10)
+			print(f"Ingest: {manager.stats()}")
+	except KeyboardInterrupt:
+		pass
+	finally:
+		manager.stop()
+		print(f"Ingest: {manager.stats()}")
+
+if __name__ == "__main__":
+	main()
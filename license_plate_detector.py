@@ -7,9 +7,279 @@ import numpy as np
 import easyocr
 import re
 import os
+import time
+import threading
+from video_pipeline import VideoPipeline
+from plate_tracker import PlateTracker
+from frame_filters import motion_gate_for, keyframe_selector_for, load_camera_rois
+from live_camera import LiveDetector
+from config import (
+	CONFIDENCE_THRESHOLD, OCR_CALL_BUDGET, OCR_MODE, CONTOUR_RECOGNITION_ONLY,
+	OCR_BATCH_SIZE, OCR_BATCH_CROP_SIZE, PREPROCESS_PROFILE, CAMERA_PROFILES,
+	VARIANT_ORDERING, VARIANT_EXPLORE_EVERY, VIDEO_PIPELINE_WORKERS,
+	VIDEO_TRACKING, LIVE_ASYNC,
+)
+
+# Định dạng biển số chuẩn, ví dụ 28A-175.37
+STRICT_PLATE_REGEX = re.compile(r'^\d{1,2}[A-Z]{1,2}-\d{2,3}\.\d{2}$')
+
+OCR_MODES = ('readtext', 'shared_detection', 'batched')
+
+# Profile tiền xử lý: phương pháp khử nhiễu và các biến thể OCR (theo thứ tự thử)
+PREPROCESS_PROFILES = {
+	'fast': {'denoise': 'median', 'variants': ('processed', 'thresh')},
+	'balanced': {'denoise': 'bilateral', 'variants': ('processed', 'thresh', 'thresh_inv')},
+	'accurate': {'denoise': 'nlmeans', 'variants': ('processed', 'thresh', 'thresh_inv', 'morph')},
+}
+
+def is_strict_plate(text: str) -> bool:
+	return bool(text) and bool(STRICT_PLATE_REGEX.match(text))
+
+class _CascadeState:
+	"""Trạng thái một lượt cascade trên một frame: ngân sách OCR, kết quả và lý do dừng."""
+
+	def __init__(self, budget=None, early_exit_confidence=None, planes=None, camera_id=None):
+		self.budget = budget
+		self.planes = planes
+		self.camera_id = camera_id
+		self.stage_ms = {}
+		self.variant_order = []
+		self.explore = False
+		self.early_exit_confidence = early_exit_confidence
+		self.ocr_calls = 0
+		self.detect_calls = 0
+		# Cache box text detection theo key ('frame' hoặc vùng crop)
+		self.boxes = {}
+		self.stages = []
+		self.results = []
+		self.stop_reason = None
+		self.roi = None  # [x, y, w, h] vùng ROI đã crop (None = cả frame)
+		self.started = time.perf_counter()
+
+	@property
+	def done(self):
+		return self.stop_reason is not None
+
+	def remaining(self):
+		"""Số lượt OCR còn lại, None nếu không giới hạn."""
+		if self.budget is None:
+			return None
+		return max(self.budget - self.ocr_calls, 0)
+
+	def consume(self, calls):
+		"""Trừ ngân sách cho `calls` lượt OCR; trả False (và dừng cascade) nếu không đủ."""
+		remaining = self.remaining()
+		if remaining is not None and remaining < calls:
+			self.stop_reason = 'budget'
+			return False
+		self.ocr_calls += calls
+		return True
+
+	def add(self, result):
+		self.results.append(result)
+		if (self.early_exit_confidence is not None and not self.done
+				and is_strict_plate(result['text'])
+				and result['confidence'] >= self.early_exit_confidence):
+			self.stop_reason = 'confident'
+
+	def stats(self):
+		return {
+			'stages': list(self.stages),
+			'stages_run': len(self.stages),
+			'ocr_calls': self.ocr_calls,
+			'detect_calls': self.detect_calls,
+			'ocr_budget': self.budget,
+			'early_exit': self.stop_reason == 'confident',
+			'stop_reason': self.stop_reason or 'completed',
+			'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 2),
+			'stage_ms': dict(self.stage_ms),
+			'variant_order': list(self.variant_order),
+			'explore': self.explore,
+			'camera_id': self.camera_id,
+			'roi': self.roi,
+			'profile': self.planes.profile if self.planes is not None else None,
+			'preprocess': self.planes.stats() if self.planes is not None else None,
+		}
+
+class FramePlanes:
+	"""Cache các mặt phẳng tiền xử lý của một frame.
+
+	Mỗi plane (gray, CLAHE, khử nhiễu, làm nét, ngưỡng hóa, ...) chỉ được tính một lần
+	cho toàn frame; biến thể của các vùng crop là slice (không copy) của các plane đó.
+	hits/misses đếm số lần plane được lấy từ cache / phải tính mới, timings_ms ghi
+	thời gian tính riêng của từng plane. `profile` chọn phương pháp khử nhiễu và
+	danh sách biến thể (xem PREPROCESS_PROFILES).
+	"""
+
+	def __init__(self, image, profile='accurate'):
+		if profile not in PREPROCESS_PROFILES:
+			raise ValueError(f"Profile không hợp lệ: {profile} (hỗ trợ: {', '.join(PREPROCESS_PROFILES)})")
+		self.image = image
+		self.profile = profile
+		self.denoise = PREPROCESS_PROFILES[profile]['denoise']
+		self.variant_names = PREPROCESS_PROFILES[profile]['variants']
+		self._planes = {}
+		self.timings_ms = {}
+		self._nested = 0.0
+		self.hits = 0
+		self.misses = 0
+
+	def _compute(self, name):
+		if name == 'gray':
+			return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+		if name == 'enhanced':
+			clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+			return clahe.apply(self.plane('gray'))
+		if name == 'denoised':
+			enhanced = self.plane('enhanced')
+			if self.denoise == 'nlmeans':
+				return cv2.fastNlMeansDenoising(enhanced)
+			if self.denoise == 'bilateral':
+				return cv2.bilateralFilter(enhanced, 5, 50, 50)
+			if self.denoise == 'median':
+				return cv2.medianBlur(enhanced, 3)
+			return enhanced
+		if name == 'processed':
+			kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+			return cv2.filter2D(self.plane('denoised'), -1, kernel)
+		if name == 'thresh':
+			# Ngưỡng hóa thích nghi
+			return cv2.adaptiveThreshold(self.plane('processed'), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 5)
+		if name == 'thresh_inv':
+			return cv2.bitwise_not(self.plane('thresh'))
+		if name == 'morph':
+			# Đóng mở hình thái học để gộp ký tự mảnh
+			kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+			return cv2.morphologyEx(self.plane('processed'), cv2.MORPH_CLOSE, kernel, iterations=1)
+		raise KeyError(f"Plane không hỗ trợ: {name}")
+
+	def plane(self, name):
+		"""Lấy plane của toàn frame, tính và cache nếu chưa có."""
+		if name in self._planes:
+			self.hits += 1
+			return self._planes[name]
+		self.misses += 1
+		# Đo thời gian riêng của plane, không tính các plane phụ thuộc được tính lồng bên trong
+		outer = self._nested
+		self._nested = 0.0
+		start = time.perf_counter()
+		self._planes[name] = self._compute(name)
+		elapsed = time.perf_counter() - start
+		self.timings_ms[name] = round((elapsed - self._nested) * 1000, 3)
+		self._nested = outer + elapsed
+		return self._planes[name]
+
+	def get(self, name, rect=None):
+		"""Lấy biến thể theo tên ('raw' là ảnh gốc), cắt theo rect=(x, y, w, h) nếu có."""
+		img = self.image if name == 'raw' else self.plane(name)
+		if rect is None:
+			return img
+		x, y, w, h = rect
+		return img[y:y+h, x:x+w]
+
+	def variants(self):
+		"""Các biến thể OCR của toàn frame."""
+		return [self.plane(name) for name in self.variant_names]
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'timings_ms': dict(self.timings_ms)}
+
+class VariantStats:
+	"""Thống kê tỉ lệ ra biển số (hit) của từng biến thể ảnh theo camera.
+
+	Biến thể được thử theo tỉ lệ hit giảm dần (làm trơn Laplace, hòa thì giữ thứ tự
+	mặc định). Cứ mỗi `explore_every` frame của một camera, thứ tự ưu tiên các biến thể
+	ít được thử nhất để không biến thể nào bị bỏ rơi vĩnh viễn.
+
+	Thống kê nằm trong bộ nhớ của tiến trình: với pool OCR mỗi worker học thứ tự riêng từ
+	các frame nó xử lý và bắt đầu lại từ đầu khi worker được thay (maxtasksperchild).
+	"""
+
+	def __init__(self, explore_every=VARIANT_EXPLORE_EVERY):
+		self.explore_every = explore_every
+		self._cameras = {}
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def _key(camera_id):
+		return 'default' if camera_id is None else str(camera_id)
+
+	def order(self, camera_id, names):
+		"""Trả về (thứ tự biến thể cho frame này, có phải frame khám phá hay không)."""
+		with self._lock:
+			cam = self._cameras.setdefault(self._key(camera_id), {'frames': 0, 'variants': {}})
+			cam['frames'] += 1
+			counts = cam['variants']
+			for name in names:
+				counts.setdefault(name, {'attempts': 0, 'hits': 0})
+			if self.explore_every and cam['frames'] % self.explore_every == 0:
+				return sorted(names, key=lambda n: counts[n]['attempts']), True
+			return sorted(names, key=lambda n: -(counts[n]['hits'] + 1) / (counts[n]['attempts'] + 2)), False
+
+	def record(self, camera_id, name, hit):
+		with self._lock:
+			cam = self._cameras.setdefault(self._key(camera_id), {'frames': 0, 'variants': {}})
+			counts = cam['variants'].setdefault(name, {'attempts': 0, 'hits': 0})
+			counts['attempts'] += 1
+			counts['hits'] += 1 if hit else 0
+
+	def report(self):
+		with self._lock:
+			return {
+				camera: {
+					'frames': cam['frames'],
+					'variants': {
+						name: {**c, 'hit_rate': round(c['hits'] / c['attempts'], 3) if c['attempts'] else None}
+						for name, c in cam['variants'].items()
+					},
+				}
+				for camera, cam in self._cameras.items()
+			}
 
 class LicensePlateDetector:
-	def __init__(self):
+	def __init__(self, ocr_call_budget=OCR_CALL_BUDGET, early_exit_confidence=CONFIDENCE_THRESHOLD,
+				 ocr_mode=OCR_MODE, contour_recognition_only=CONTOUR_RECOGNITION_ONLY,
+				 ocr_batch_size=OCR_BATCH_SIZE, batch_crop_size=OCR_BATCH_CROP_SIZE,
+				 profile=PREPROCESS_PROFILE, camera_profiles=None, variant_ordering=VARIANT_ORDERING,
+				 camera_rois=None, reader=None):
+		"""
+		ocr_call_budget: số lượt OCR tối đa cho một frame (None = không giới hạn)
+		early_exit_confidence: dừng cascade khi có biển số chuẩn với confidence >= ngưỡng này (None = tắt)
+		ocr_mode: 'readtext' (detect + recognize cho từng biến thể),
+			'shared_detection' (detect một lần mỗi frame/crop, chỉ recognize cho từng biến thể) hoặc
+			'batched' (gộp mọi biến thể của frame/crop vào một lượt readtext_batched)
+		contour_recognition_only: đưa thẳng các crop contour vào recognizer (mỗi crop là một box),
+			gộp thành một lượt recognize thay vì readtext trên từng crop/biến thể
+		ocr_batch_size: batch_size truyền cho EasyOCR
+		batch_crop_size: (width, height) chung để resize các crop khi chạy batched
+		profile: profile tiền xử lý mặc định ('fast', 'balanced', 'accurate')
+		camera_profiles: dict camera_id -> profile, mặc định lấy CAMERA_PROFILES trong config
+		variant_ordering: thử các biến thể theo tỉ lệ hit lịch sử của từng camera
+		camera_rois: dict camera_id -> đa giác ROI, mặc định lấy CAMERA_ROIS / CAMERA_ROIS_FILE
+		reader: EasyOCR Reader (hoặc đối tượng cùng giao diện) dùng thay cho Reader tạo mới
+		"""
+		if ocr_mode not in OCR_MODES:
+			raise ValueError(f"ocr_mode không hợp lệ: {ocr_mode} (hỗ trợ: {', '.join(OCR_MODES)})")
+		camera_profiles = CAMERA_PROFILES if camera_profiles is None else camera_profiles
+		for p in [profile, *camera_profiles.values()]:
+			if p not in PREPROCESS_PROFILES:
+				raise ValueError(f"Profile không hợp lệ: {p} (hỗ trợ: {', '.join(PREPROCESS_PROFILES)})")
+		self.profile = profile
+		self.camera_profiles = {str(k): v for k, v in camera_profiles.items()}
+		self.camera_rois = load_camera_rois(camera_rois)
+		self._profile_stats = {}
+		self._stats_lock = threading.Lock()
+		self.variant_ordering = variant_ordering
+		self.variant_stats = VariantStats()
+		self.ocr_mode = ocr_mode
+		self.contour_recognition_only = contour_recognition_only
+		self.ocr_batch_size = ocr_batch_size
+		self.batch_crop_size = tuple(batch_crop_size)
+		self.ocr_call_budget = ocr_call_budget
+		self.early_exit_confidence = early_exit_confidence
+		if reader is not None:
+			self.reader = reader
+			return
 		try:
 			# Sử dụng cả tiếng Anh và tiếng Việt để cải thiện độ chính xác
 			self.reader = easyocr.Reader(['en', 'vi'], gpu=False)
@@ -17,31 +287,67 @@ class LicensePlateDetector:
 			print(f"Warning: Could not initialize EasyOCR: {e}")
 			self.reader = None
 
-	def preprocess_image(self, image):
+	def preprocess_image(self, image, profile=None):
 		"""Tiền xử lý ảnh để cải thiện OCR"""
-		gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-		clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-		enhanced = clahe.apply(gray)
-		denoised = cv2.fastNlMeansDenoising(enhanced)
-		kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-		sharpened = cv2.filter2D(denoised, -1, kernel)
-		return sharpened
-
-	def _generate_variants(self, image):
+		return FramePlanes(image, profile or self.profile).plane('processed')
+
+	def _generate_variants(self, image, profile=None):
 		"""Sinh nhiều biến thể ảnh để thử OCR."""
-		variants = []
-		processed = self.preprocess_image(image)
-		variants.append(processed)
-		# Ngưỡng hóa thích nghi
-		thr = cv2.adaptiveThreshold(processed, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 5)
-		variants.append(thr)
-		thr_inv = cv2.bitwise_not(thr)
-		variants.append(thr_inv)
-		# Đóng mở hình thái học để gộp ký tự mảnh
-		kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-		morph = cv2.morphologyEx(processed, cv2.MORPH_CLOSE, kernel, iterations=1)
-		variants.append(morph)
-		return variants
+		return FramePlanes(image, profile or self.profile).variants()
+
+	def profile_for(self, camera_id=None):
+		"""Profile tiền xử lý áp dụng cho camera (mặc định là profile của detector)."""
+		if camera_id is None:
+			return self.profile
+		return self.camera_profiles.get(str(camera_id), self.profile)
+
+	def apply_roi(self, image, camera_id=None):
+		"""Crop/mask ảnh theo ROI của camera; trả về (ảnh, (x, y) offset về ảnh gốc)."""
+		roi = self.camera_rois.get(str(camera_id)) if camera_id is not None else None
+		if roi is None:
+			return image, (0, 0)
+		return roi.apply(image)
+
+	def _offset_results(self, results, offset):
+		"""Đưa bbox kết quả từ toạ độ vùng crop về toạ độ ảnh gốc."""
+		x, y = offset
+		if x or y:
+			for result in results:
+				x1, y1, x2, y2 = result['bbox']
+				result['bbox'] = [x1 + x, y1 + y, x2 + x, y2 + y]
+		return results
+
+	def _record_profile_stats(self, stats, found):
+		profile = stats['profile']
+		with self._stats_lock:
+			agg = self._profile_stats.setdefault(profile, {
+				'frames': 0, 'frames_with_plate': 0, 'ocr_calls': 0,
+				'total_ms': 0.0, 'stage_ms': {}, 'plane_ms': {},
+			})
+			agg['frames'] += 1
+			agg['frames_with_plate'] += 1 if found else 0
+			agg['ocr_calls'] += stats['ocr_calls']
+			agg['total_ms'] += stats['elapsed_ms']
+			for name, ms in stats['stage_ms'].items():
+				agg['stage_ms'][name] = agg['stage_ms'].get(name, 0.0) + ms
+			for name, ms in stats['preprocess']['timings_ms'].items():
+				agg['plane_ms'][name] = agg['plane_ms'].get(name, 0.0) + ms
+
+	def get_profile_stats(self):
+		"""Chi phí trung bình mỗi frame theo từng profile: thời gian từng stage/plane, lượt OCR, tỉ lệ có biển số."""
+		report = {}
+		with self._stats_lock:
+			for profile, agg in self._profile_stats.items():
+				frames = agg['frames']
+				report[profile] = {
+					'frames': frames,
+					'plate_rate': round(agg['frames_with_plate'] / frames, 3),
+					'avg_ocr_calls': round(agg['ocr_calls'] / frames, 2),
+					'avg_total_ms': round(agg['total_ms'] / frames, 2),
+					'avg_stage_ms': {k: round(v / frames, 2) for k, v in agg['stage_ms'].items()},
+					'avg_plane_ms': {k: round(v / frames, 3) for k, v in agg['plane_ms'].items()},
+				}
+		return report
 
 	def _normalize_vn_plate(self, text: str) -> str:
 		"""Chuẩn hóa các biến thể về định dạng 28A-175.37 khi có thể."""
@@ -124,150 +430,534 @@ class LicensePlateDetector:
 		score += min(digits, 7) * 0.01
 		return score
 
-	def detect_license_plate(self, image: np.ndarray):
+	def _new_state(self, image, camera_id=None):
+		planes = FramePlanes(image, self.profile_for(camera_id))
+		state = _CascadeState(self.ocr_call_budget, self.early_exit_confidence, planes, camera_id)
+		names = list(planes.variant_names) + ['raw']
+		if self.variant_ordering:
+			state.variant_order, state.explore = self.variant_stats.order(camera_id, names)
+		else:
+			state.variant_order = names
+		return state
+
+	def _record_variant(self, state, name, before):
+		"""Ghi nhận biến thể `name` đã được thử, hit nếu có thêm kết quả hợp lệ từ lượt đó."""
+		self.variant_stats.record(state.camera_id, name, len(state.results) > before)
+
+	def _call_reader(self, state, fn, *args, ignore_errors=False, **kwargs):
+		"""Gọi reader một lần, tính vào ngân sách OCR của frame. Trả None nếu đã hết ngân sách."""
+		if not state.consume(1):
+			return None
+		try:
+			return fn(*args, **kwargs)
+		except Exception:
+			if not ignore_errors:
+				raise
+			return []
+
+	def _detect_boxes(self, state, image, key):
+		"""Chạy text detection (CRAFT) một lần cho ảnh `image`, cache theo `key` trong frame."""
+		if key not in state.boxes:
+			if not state.consume(1):
+				return None
+			state.detect_calls += 1
+			horizontal_list, free_list = self.reader.detect(image)
+			state.boxes[key] = (horizontal_list[0], free_list[0])
+		return state.boxes[key]
+
+	def _ocr_variants(self, state, source, variants, key, ignore_errors=False, **kwargs):
+		"""OCR lần lượt từng biến thể của `source`, yield kết quả của từng lượt.
+
+		Ở chế độ 'shared_detection', text detection chỉ chạy một lần trên `source`
+		(cache theo `key`), các biến thể chỉ đi qua bước recognize trên các box đó.
+		Dừng khi hết ngân sách OCR.
+		"""
+		if self.ocr_mode == 'shared_detection':
+			boxes = self._detect_boxes(state, source, key)
+			if boxes is None:
+				return
+			horizontal_list, free_list = boxes
+			if not horizontal_list and not free_list:
+				# Không có vùng text -> readtext trên mọi biến thể cũng sẽ rỗng
+				return
+			for variant in variants:
+				ocr_results = self._call_reader(state, self.reader.recognize, variant,
+					horizontal_list=horizontal_list, free_list=free_list, batch_size=self.ocr_batch_size,
+					ignore_errors=ignore_errors, **kwargs)
+				if ocr_results is None:
+					return
+				yield ocr_results
+		elif self.ocr_mode == 'batched':
+			yield from self._ocr_batched(state, variants, ignore_errors=ignore_errors, **kwargs)
+		else:
+			for variant in variants:
+				ocr_results = self._call_reader(state, self.reader.readtext, variant,
+					batch_size=self.ocr_batch_size, ignore_errors=ignore_errors, **kwargs)
+				if ocr_results is None:
+					return
+				yield ocr_results
+
+	def _ocr_batched(self, state, images, ignore_errors=False, **kwargs):
+		"""Gộp các ảnh vào một lượt readtext_batched, yield kết quả theo đúng thứ tự ảnh.
+
+		Ảnh khác kích thước (các crop) được resize về OCR_BATCH_CROP_SIZE.
+		Nếu ngân sách không đủ cho cả lô thì chỉ chạy phần còn lại trong ngân sách.
+		"""
+		remaining = state.remaining()
+		batch = images if remaining is None else images[:remaining]
+		if not batch or not state.consume(len(batch)):
+			state.stop_reason = state.stop_reason or 'budget'
+			return
+		if len({img.shape[:2] for img in batch}) > 1:
+			kwargs['n_width'], kwargs['n_height'] = self.batch_crop_size
+		try:
+			batch_results = self.reader.readtext_batched(batch, batch_size=self.ocr_batch_size, **kwargs)
+		except Exception:
+			if not ignore_errors:
+				raise
+			return
+		for ocr_results in batch_results:
+			yield ocr_results
+		if len(batch) < len(images) and not state.done:
+			state.stop_reason = 'budget'
+
+	def _add_result(self, state, text, conf, bbox):
+		"""Làm sạch, kiểm tra và ghi nhận một kết quả OCR; bật early-exit nếu đủ tin cậy."""
+		cleaned = self.clean_plate_text(text)
+		if self.validate_plate_format(cleaned) and conf > 0.12:
+			state.add({'text': cleaned,'confidence': conf,'bbox': bbox,'score': self._quality_score(cleaned, conf)})
+
+	def _stage_full_frame(self, image, state):
+		"""Stage 1: OCR trên các biến thể của toàn ảnh."""
+		full_bbox = [0,0,image.shape[1],image.shape[0]]
+		names = state.variant_order
+		variants = [state.planes.get(name) for name in names]
+		for name, ocr_results in zip(names, self._ocr_variants(state, image, variants, 'frame')):
+			before = len(state.results)
+			for _, text, conf in ocr_results:
+				self._add_result(state, text, conf, full_bbox)
+			self._record_variant(state, name, before)
+			if state.done:
+				return
+
+	def _find_plate_regions(self, image, planes=None):
+		"""Tìm các vùng có hình dạng biển số bằng Canny + contours, trả về list (x, y, w, h)."""
+		planes = planes or FramePlanes(image, self.profile)
+		processed = planes.plane('processed')
+		edges = cv2.Canny(processed, 50, 150)
+		contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+		regions = []
+		for c in contours:
+			area = cv2.contourArea(c)
+			if area > 800:
+				x, y, w, h = cv2.boundingRect(c)
+				ar = w / max(h, 1)
+				if 1.3 <= ar <= 5.0:
+					regions.append((x, y, w, h))
+		return regions
+
+	def _stage_contours(self, image, state):
+		"""Stage 2: OCR trên các vùng crop từ contours."""
+		regions = self._find_plate_regions(image, state.planes)
+		if self.contour_recognition_only:
+			self._recognize_regions(image, regions, state)
+			return
+		if self.ocr_mode == 'batched':
+			# Gộp mọi crop và biến thể của chúng vào một lượt batched
+			crops, owners = [], []
+			for x, y, w, h in regions:
+				for name in state.variant_order:
+					crops.append(state.planes.get(name, (x, y, w, h)))
+					owners.append((name, [x, y, x+w, y+h]))
+			if not crops:
+				return
+			for (name, bbox), ocr_results in zip(owners, self._ocr_batched(state, crops)):
+				before = len(state.results)
+				for _, text, conf in ocr_results:
+					self._add_result(state, text, conf, bbox)
+				self._record_variant(state, name, before)
+			return
+		for x, y, w, h in regions:
+			crop = image[y:y+h, x:x+w]
+			names = state.variant_order
+			variants = [state.planes.get(name, (x, y, w, h)) for name in names]
+			for name, ocr_results in zip(names, self._ocr_variants(state, crop, variants, ('crop', x, y, w, h))):
+				before = len(state.results)
+				for _, text, conf in ocr_results:
+					self._add_result(state, text, conf, [x,y,x+w,y+h])
+				self._record_variant(state, name, before)
+				if state.done:
+					return
+			if state.stop_reason == 'budget':
+				return
+
+	def _build_mosaic(self, tiles):
+		"""Xếp chồng các tile ảnh xám theo chiều dọc thành một ảnh duy nhất.
+
+		Trả về (mosaic, horizontal_list, offsets): mỗi tile có đúng một box
+		[x_min, x_max, y_min, y_max] trên mosaic, offsets map y_min -> chỉ số tile.
+		"""
+		width = max(t.shape[1] for t in tiles)
+		height = sum(t.shape[0] for t in tiles)
+		mosaic = np.zeros((height, width), dtype=np.uint8)
+		horizontal_list, offsets = [], {}
+		y = 0
+		for i, tile in enumerate(tiles):
+			h, w = tile.shape[:2]
+			mosaic[y:y+h, :w] = tile
+			horizontal_list.append([0, w, y, y + h])
+			offsets[y] = i
+			y += h
+		return mosaic, horizontal_list, offsets
+
+	def _region_tiles(self, state, regions):
+		"""Tile ảnh xám cho mỗi vùng (x, y, w, h) x mỗi biến thể, kèm owner (state, biến thể, bbox).
+
+		Xếp theo biến thể trước: khi ngân sách chỉ đủ một phần, mọi vùng đều được đọc bằng
+		biến thể tốt nhất trước khi tới biến thể tiếp theo.
+		"""
+		tiles, owners = [], []
+		for name in state.variant_order:
+			for x, y, w, h in regions:
+				# Mosaic là ảnh xám nên biến thể 'raw' lấy từ plane gray
+				tiles.append(state.planes.get('gray' if name == 'raw' else name, (x, y, w, h)))
+				owners.append((state, name, [x, y, x+w, y+h]))
+		return tiles, owners
+
+	def _recognize_tiles(self, tiles, owners):
+		"""Recognize mọi tile trong một lượt (qua mosaic), ghi kết quả về state của từng owner."""
+		mosaic, horizontal_list, offsets = self._build_mosaic(tiles)
+		ocr_results = self.reader.recognize(mosaic, horizontal_list=horizontal_list, free_list=[],
+			batch_size=self.ocr_batch_size)
+		hits = set()
+		for box, text, conf in ocr_results:
+			index = offsets.get(int(box[0][1]))
+			if index is None:
+				continue
+			state, _, bbox = owners[index]
+			before = len(state.results)
+			self._add_result(state, text, conf, bbox)
+			if len(state.results) > before:
+				hits.add(index)
+		for index, (state, name, _) in enumerate(owners):
+			self.variant_stats.record(state.camera_id, name, index in hits)
+
+	def _recognize_regions(self, image, regions, state):
+		"""Recognize trực tiếp các vùng đã định vị (không chạy lại text detection).
+
+		Mỗi crop (và các biến thể của nó) là một box duy nhất; tất cả được gộp vào một
+		mosaic và recognize trong một lần gọi. Reader vẫn nhận dạng từng box nên ngân sách
+		OCR bị trừ theo số tile; không đủ ngân sách thì chỉ recognize phần còn được phép.
+		"""
+		tiles, owners = self._region_tiles(state, regions)
+		remaining = state.remaining()
+		if remaining is not None and remaining < len(tiles):
+			tiles, owners = tiles[:remaining], owners[:remaining]
+			state.stop_reason = 'budget'
+		if not tiles:
+			return
+		state.ocr_calls += len(tiles)
+		self._recognize_tiles(tiles, owners)
+
+	def detect_batch(self, images, camera_ids=None):
+		"""Nhận diện nhiều frame (ví dụ từ nhiều request đồng thời) trong một lượt gọi.
+
+		Mỗi frame chạy đúng cascade của detect_with_stats (stage, ngân sách OCR, early-exit) nên
+		kết quả không phụ thuộc vào việc request có được gộp lô hay không; lợi ích của lô là một
+		lượt gửi sang pool cho nhiều request. Trả về list (results, stats) theo thứ tự frame.
+		"""
+		camera_ids = camera_ids or [None] * len(images)
+		output = []
+		for image, camera_id in zip(images, camera_ids):
+			results, stats = self.detect_with_stats(image, camera_id)
+			stats['batch_size'] = len(images)
+			output.append((results, stats))
+		return output
+
+	def _stage_paragraph(self, image, state):
+		"""Stage 3: paragraph mode (gộp đoạn) và suy diễn biển số."""
+		full_bbox = [0,0,image.shape[1],image.shape[0]]
+		variants = [state.planes.get(name) for name in state.variant_order]
+		for text_blocks in self._ocr_variants(state, image, variants, 'frame', ignore_errors=True, paragraph=True):
+			for _, text, conf in text_blocks:
+				clean = re.sub(r'[^A-Z0-9]', '', text.upper())
+				clean = self._char_postfix_fixes(clean)
+				infer = self._infer_plate_from_text(clean)
+				if infer:
+					state.add({'text': infer,'confidence': conf,'bbox': full_bbox,'score': self._quality_score(infer, conf)})
+			if state.done:
+				return
+
+	def _merge_results(self, all_results):
+		"""Hợp nhất theo score, mỗi biển số giữ kết quả tốt nhất."""
+		unique = {}
+		for r in all_results:
+			key = r['text']
+			if key not in unique or r['score'] > unique[key]['score']:
+				unique[key] = r
+		return sorted(unique.values(), key=lambda x: x['score'], reverse=True)
+
+	def detect_license_plate(self, image: np.ndarray, camera_id=None, roi=True):
 		"""Nhận diện biển số xe từ ảnh với cải tiến"""
+		results, _ = self.detect_with_stats(image, camera_id, roi)
+		return results
+
+	def detect_with_stats(self, image: np.ndarray, camera_id=None, roi=True):
+		"""Chạy cascade nhận diện theo thứ tự stage, dừng sớm khi có biển số chuẩn
+		(28A-175.37) đủ tin cậy hoặc khi hết ngân sách OCR.
+
+		camera_id chọn profile tiền xử lý theo CAMERA_PROFILES và ROI theo CAMERA_ROIS
+		(roi=False khi ảnh đã được crop theo ROI); bbox kết quả luôn theo toạ độ ảnh gốc.
+		Trả về (results, stats) với stats gồm các stage đã chạy, số lượt OCR đã dùng
+		và thời gian từng stage/plane.
+		"""
+		full_shape = image.shape
+		offset = (0, 0)
+		if roi:
+			image, offset = self.apply_roi(image, camera_id)
+		state = self._new_state(image, camera_id)
+		if image.shape != full_shape:
+			state.roi = [offset[0], offset[1], image.shape[1], image.shape[0]]
 		try:
 			if self.reader is None:
 				print("Warning: EasyOCR not available, skipping detection")
-				return []
-			all_results = []
-			# 1) OCR trên nhiều biến thể ảnh
-			for variant in self._generate_variants(image) + [image]:
-				ocr_results = self.reader.readtext(variant)
-				for _, text, conf in ocr_results:
-					cleaned = self.clean_plate_text(text)
-					if self.validate_plate_format(cleaned) and conf > 0.12:
-						all_results.append({'text': cleaned,'confidence': conf,'bbox': [0,0,image.shape[1],image.shape[0]],'score': self._quality_score(cleaned, conf)})
-			# 2) Contours crop
-			processed = self.preprocess_image(image)
-			edges = cv2.Canny(processed, 50, 150)
-			contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-			for c in contours:
-				area = cv2.contourArea(c)
-				if area > 800:
-					x, y, w, h = cv2.boundingRect(c)
-					ar = w / max(h, 1)
-					if 1.3 <= ar <= 5.0:
-						crop = image[y:y+h, x:x+w]
-						for variant in self._generate_variants(crop) + [crop]:
-							ocr_results = self.reader.readtext(variant)
-							for _, text, conf in ocr_results:
-								cleaned = self.clean_plate_text(text)
-								if self.validate_plate_format(cleaned) and conf > 0.12:
-									all_results.append({'text': cleaned,'confidence': conf,'bbox': [x,y,x+w,y+h],'score': self._quality_score(cleaned, conf)})
-			# 3) Paragraph mode (gộp đoạn)
-			if not all_results:
-				for variant in self._generate_variants(image) + [image]:
-					try:
-						text_blocks = self.reader.readtext(variant, paragraph=True)
-						for _, text, conf in text_blocks:
-							clean = re.sub(r'[^A-Z0-9]', '', text.upper())
-							clean = self._char_postfix_fixes(clean)
-							infer = self._infer_plate_from_text(clean)
-							if infer:
-								all_results.append({'text': infer,'confidence': conf,'bbox': [0,0,image.shape[1],image.shape[0]],'score': self._quality_score(infer, conf)})
-					except Exception:
-						pass
-			# Hợp nhất theo score
-			unique = {}
-			for r in all_results:
-				key = r['text']
-				if key not in unique or r['score'] > unique[key]['score']:
-					unique[key] = r
-			results = sorted(unique.values(), key=lambda x: x['score'], reverse=True)
-			return results
+				return [], state.stats()
+			stages = (
+				('full_frame', self._stage_full_frame),
+				('contours', self._stage_contours),
+				('paragraph', self._stage_paragraph),
+			)
+			for name, stage in stages:
+				if state.done:
+					break
+				# Paragraph chỉ chạy khi các stage trước không ra kết quả
+				if name == 'paragraph' and state.results:
+					break
+				state.stages.append(name)
+				started = time.perf_counter()
+				stage(image, state)
+				state.stage_ms[name] = round((time.perf_counter() - started) * 1000, 2)
+			results = self._offset_results(self._merge_results(state.results), offset)
+			stats = state.stats()
+			self._record_profile_stats(stats, bool(results))
+			return results, stats
 		except Exception as e:
 			print(f"Error in license plate detection: {e}")
+			return [], state.stats()
+
+	def detect_in_region(self, image: np.ndarray, region=None, camera_id=None):
+		"""Nhận diện chỉ trong vùng (x, y, w, h) của ảnh, bbox kết quả theo toạ độ ảnh gốc.
+
+		region=None hoặc phủ cả ảnh thì tương đương detect_license_plate. Nếu camera có ROI
+		thì chỉ xử lý phần giao của region với ROI.
+		"""
+		image, (roi_x, roi_y) = self.apply_roi(image, camera_id)
+		height, width = image.shape[:2]
+		if region is not None:
+			x, y, w, h = region
+			# Đổi region sang toạ độ ảnh đã crop theo ROI và cắt phần nằm ngoài
+			x1, y1 = max(0, x - roi_x), max(0, y - roi_y)
+			x2, y2 = min(width, x + w - roi_x), min(height, y + h - roi_y)
+			if x2 <= x1 or y2 <= y1:
+				return []
+			if x1 > 0 or y1 > 0 or x2 < width or y2 < height:
+				results = self.detect_license_plate(image[y1:y2, x1:x2], camera_id, roi=False)
+				return self._offset_results(results, (x1 + roi_x, y1 + roi_y))
+		results = self.detect_license_plate(image, camera_id, roi=False)
+		return self._offset_results(results, (roi_x, roi_y))
+
+	def _track_plate(self, track):
+		"""Biển số gộp của track; nếu kết quả bỏ phiếu sai định dạng thì lấy lần đọc tốt nhất."""
+		plate = track.plate()
+		if plate is not None and not self.validate_plate_format(plate['text']):
+			plate['text'], plate['confidence'] = max(track.reads, key=lambda r: r[1])
+		return plate
+
+	def detect_tracked(self, image: np.ndarray, tracker, camera_id=None, frame_number=None):
+		"""Nhận diện trên frame video với PlateTracker: chỉ OCR vùng của track mới hoặc đến lượt đọc lại.
+
+		Vùng lấy từ stage contours và được recognize chung một mosaic như _recognize_regions.
+		Trả về kết quả gộp (bỏ phiếu nhiều frame) của các track có mặt trong frame.
+		"""
+		try:
+			# Toạ độ track theo ảnh đã crop ROI (offset cố định theo camera)
+			image, offset = self.apply_roi(image, camera_id)
+			state = self._new_state(image, camera_id)
+			regions = self._find_plate_regions(image, state.planes)
+			updated = tracker.update(regions, frame_number)
+			to_ocr = [(track, region) for (track, needs_ocr), region in zip(updated, regions) if needs_ocr]
+			if to_ocr:
+				self._recognize_regions(image, [region for _, region in to_ocr], state)
+				owners = {(x, y, x + w, y + h): track for track, (x, y, w, h) in to_ocr}
+				for result in state.results:
+					track = owners.get(tuple(result['bbox']))
+					if track is not None:
+						track.add_read(result['text'], result['confidence'])
+			plates = [self._track_plate(track) for track, _ in updated]
+			return self._offset_results([p for p in plates if p is not None], offset)
+		except Exception as e:
+			print(f"Error in tracked detection: {e}")
 			return []
 
-	def detect_from_video_file(self, video_path: str, sample_rate: int = 5):
-		"""Nhận diện biển số từ video file"""
+	def iter_video_detections(self, video_path: str, sample_rate: int = 5,
+							  max_processed_frames=100, cancel_event=None, workers=VIDEO_PIPELINE_WORKERS,
+							  tracker=None, motion_gate=None, selector=None):
+		"""Generator nhận diện biển số từ video file, yield kết quả ngay sau mỗi frame được xử lý.
+
+		Mỗi phần tử là dict gồm frame_number, timestamp, frames_decoded, frames_processed,
+		total_frames, fps và detections (kết quả của frame, đã gắn frame_number/timestamp).
+		Giải mã và OCR chạy song song trên VideoPipeline với `workers` luồng OCR.
+		max_processed_frames: số frame xử lý tối đa (None = không giới hạn)
+		cancel_event: threading.Event, dừng giải mã khi được set
+		tracker: PlateTracker, nếu có thì nhận diện theo track (xem detect_tracked)
+		motion_gate: MotionGate, nếu có thì bỏ qua frame tĩnh và chỉ OCR vùng có chuyển động
+		selector: KeyframeSelector, nếu có thì OCR frame nét nhất mỗi cửa sổ thay cho mỗi sample_rate frame
+		"""
+		if not os.path.exists(video_path):
+			raise FileNotFoundError(f"Video file không tồn tại: {video_path}")
+		
+		# Giữ giới hạn cũ: dừng khi số frame đã xử lý vượt quá max_processed_frames
+		max_frames = max_processed_frames + 1 if max_processed_frames is not None else None
+		if tracker is not None:
+			# Tracker cần các frame theo đúng thứ tự: chỉ một luồng OCR
+			# và toạ độ vùng ổn định giữa các frame nên không crop theo vùng chuyển động
+			pipeline = VideoPipeline(
+				lambda frame, number, _: self.detect_tracked(frame, tracker, frame_number=number),
+				workers=1, gate=motion_gate, selector=selector)
+		else:
+			pipeline = VideoPipeline(
+				lambda frame, _, region: self.detect_in_region(frame, region),
+				workers=workers, gate=motion_gate, selector=selector)
+		for progress in pipeline.run(video_path, sample_rate, max_frames, cancel_event):
+			for result in progress['detections']:
+				print(f"Frame {progress['frame_number']}: Tìm thấy biển số {result['text']} (confidence: {result['confidence']:.2f})")
+			yield progress
+
+	def detect_from_video_file(self, video_path: str, sample_rate: int = 5,
+							   progress_callback=None, cancel_event=None, tracking=VIDEO_TRACKING,
+							   motion_gating=None, frame_selection=None, ignore_errors=True,
+							   max_processed_frames=100):
+		"""Nhận diện biển số từ video file
+
+		progress_callback(progress): gọi sau mỗi frame được xử lý với dict gồm
+			frames_decoded, frames_processed, total_frames và detections (kết quả mới của frame đó)
+		cancel_event: threading.Event, dừng xử lý (trả về kết quả đến thời điểm đó) khi được set
+		tracking: theo dõi từng xe qua các frame, mỗi track cho một kết quả gộp
+		motion_gating: bật/tắt lọc chuyển động (None = theo MOTION_GATING trong config)
+		frame_selection: 'sample' hoặc 'sharpness' (None = theo FRAME_SELECTION trong config);
+			'sharpness' không giới hạn 100 frame
+		max_processed_frames: số frame xử lý tối đa (None = hết video)
+		ignore_errors: in lỗi và trả về [] (mặc định); False = ném lỗi cho nơi gọi (job nền)
+		"""
 		try:
-			if not os.path.exists(video_path):
-				raise FileNotFoundError(f"Video file không tồn tại: {video_path}")
-			
-			cap = cv2.VideoCapture(video_path)
-			if not cap.isOpened():
-				raise ValueError(f"Không thể mở video file: {video_path}")
-			
-			total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-			fps = cap.get(cv2.CAP_PROP_FPS)
-			duration = total_frames / fps if fps > 0 else 0
-			
-			print(f"Video info: {total_frames} frames, {fps:.2f} fps, {duration:.2f}s")
+			# Chỉ giữ kết quả tốt nhất của mỗi biển số: bộ nhớ không tăng theo độ dài video
+			best = {}
+			detections = 0
+			tracker = PlateTracker() if tracking else None
+			gate = motion_gate_for(None, motion_gating)
+			selector = keyframe_selector_for(frame_selection)
+			if selector is not None:
+				max_processed_frames = None
+			for progress in self.iter_video_detections(video_path, sample_rate, max_processed_frames, cancel_event,
+													   tracker=tracker, motion_gate=gate, selector=selector):
+				detections += len(progress['detections'])
+				if tracker is None:
+					self._keep_best(best, progress['detections'])
+				else:
+					# Xe đã đi qua: gộp kết quả của track rồi bỏ track
+					self._keep_best(best, tracker.pop_finished(self._track_plate))
+				if progress_callback is not None:
+					progress_callback(progress)
+			if tracker is not None:
+				# Mỗi track một kết quả gộp thay cho các lần đọc từng frame
+				print(f"Tracker: {tracker.stats()}")
+				self._keep_best(best, tracker.plates(self._track_plate))
+			if gate is not None:
+				print(f"Lọc chuyển động: {gate.stats()}")
+			if selector is not None:
+				print(f"Chọn frame nét: {selector.stats()}")
 			
-			all_results = []
-			frame_count = 0
-			processed_frames = 0
+			# Sắp xếp theo confidence
+			unique_results = sorted(best.values(), key=lambda x: x['confidence'], reverse=True)
 			
-			while True:
-				ret, frame = cap.read()
-				if not ret:
-					break
-				
-				frame_count += 1
-				
-				# Chỉ xử lý mỗi N frame để tăng tốc độ
-				if frame_count % sample_rate != 0:
-					continue
-				
-				processed_frames += 1
-				print(f"Đang xử lý frame {frame_count}/{total_frames} ({processed_frames} processed)")
-				
-				# Nhận diện biển số
-				results = self.detect_license_plate(frame)
-				
-				if results:
-					for result in results:
-						# Thêm thông tin frame
-						result['frame_number'] = frame_count
-						result['timestamp'] = frame_count / fps if fps > 0 else 0
-						all_results.append(result)
-						print(f"Frame {frame_count}: Tìm thấy biển số {result['text']} (confidence: {result['confidence']:.2f})")
-				
-				# Giới hạn số frame xử lý để tránh quá tải
-				if processed_frames > 100:  # Tối đa 100 frames
-					print("Đã đạt giới hạn frame xử lý")
-					break
-			
-			cap.release()
-			
-			# Loại bỏ kết quả trùng lặp và sắp xếp theo confidence
-			unique_results = self._remove_duplicate_plates(all_results)
-			unique_results.sort(key=lambda x: x['confidence'], reverse=True)
-			
-			print(f"Tổng cộng tìm thấy {len(unique_results)} biển số duy nhất từ {len(all_results)} detections")
+			print(f"Tổng cộng tìm thấy {len(unique_results)} biển số duy nhất từ {detections} detections")
 			
 			return unique_results
 			
 		except Exception as e:
 			print(f"Error in video file detection: {e}")
+			if not ignore_errors:
+				raise
 			return []
 
+	def detect_video_segment(self, video_path: str, start_frame: int, end_frame=None,
+							 sample_rate: int = 5, workers: int = 1, motion_gating=None, frame_selection=None,
+							 stats=None):
+		"""Nhận diện biển số trong đoạn frame [start_frame, end_frame) của video, không giới hạn số frame.
+
+		Trả về kết quả đã loại trùng trong đoạn; dùng cho xử lý song song theo đoạn.
+		stats: dict (tùy chọn) nhận thống kê pipeline của đoạn (frames_decoded, frames_processed, ...)
+		"""
+		pipeline = VideoPipeline(lambda frame, _, region: self.detect_in_region(frame, region),
+								 workers=workers, gate=motion_gate_for(None, motion_gating),
+								 selector=keyframe_selector_for(frame_selection))
+		best = {}
+		detections = 0
+		for progress in pipeline.run(video_path, sample_rate, start_frame=start_frame, end_frame=end_frame):
+			detections += len(progress['detections'])
+			self._keep_best(best, progress['detections'])
+		if stats is not None:
+			stats.update(pipeline.stats())
+		print(f"Đoạn [{start_frame}, {end_frame}): {detections} detections")
+		return list(best.values())
+
+	@staticmethod
+	def _keep_best(best, results):
+		"""Gộp results vào dict best (text -> kết quả), mỗi biển số giữ kết quả có confidence cao nhất"""
+		for result in results:
+			current = best.get(result['text'])
+			if current is None or result['confidence'] > current['confidence']:
+				best[result['text']] = result
+		return best
+
 	def _remove_duplicate_plates(self, results):
 		"""Loại bỏ các biển số trùng lặp, giữ lại kết quả có confidence cao nhất"""
-		if not results:
-			return []
-		
-		# Nhóm theo text
-		plate_groups = {}
-		for result in results:
-			text = result['text']
-			if text not in plate_groups:
-				plate_groups[text] = []
-			plate_groups[text].append(result)
-		
-		# Chọn kết quả tốt nhất cho mỗi biển số
-		unique_results = []
-		for text, group in plate_groups.items():
-			best_result = max(group, key=lambda x: x['confidence'])
-			unique_results.append(best_result)
-		
-		return unique_results
+		return list(self._keep_best({}, results).values())
+
+	def detect_from_video(self, video_path: str = 0, output_path: str = None, tracking=VIDEO_TRACKING,
+						  motion_gating=None, live=LIVE_ASYNC):
+		"""Nhận diện biển số từ video/camera
 
-	def detect_from_video(self, video_path: str = 0, output_path: str = None):
-		"""Nhận diện biển số từ video/camera"""
+		tracking: chỉ OCR xe mới hoặc sau mỗi TRACK_OCR_EVERY frame
+		motion_gating: bỏ qua frame tĩnh, chỉ OCR vùng có chuyển động (None = theo cấu hình của nguồn)
+		live: đọc/hiển thị theo FPS camera, OCR chạy nền trên frame mới nhất (LiveDetector);
+			False = OCR tuần tự từng frame như trước
+		"""
 		try:
+			tracker = PlateTracker() if tracking else None
+			gate = motion_gate_for(video_path, motion_gating)
+			# Nguồn (index camera/đường dẫn) là camera_id cho profile và ROI
+			camera_id = str(video_path)
+			
+			def detect_frame(frame):
+				# Nhận diện biển số (frame tĩnh thì bỏ qua OCR)
+				region = gate.check(frame) if gate is not None else None
+				if gate is not None and region is None:
+					return []
+				if tracker is not None:
+					results = self.detect_tracked(frame, tracker, camera_id)
+					# Báo kết quả gộp của xe đã đi qua rồi bỏ track: bộ nhớ không tăng theo thời gian chạy
+					for plate in tracker.pop_finished(self._track_plate):
+						print(f"Xe đã qua: {plate['text']} (Độ tin cậy: {plate['confidence']:.2f}, {plate['reads']} lần đọc)")
+					return results
+				return self.detect_in_region(frame, region, camera_id)
+			
+			if live:
+				LiveDetector(detect_frame).run(video_path, output_path)
+				if gate is not None:
+					print(f"Lọc chuyển động: {gate.stats()}")
+				return
+			
 			cap = cv2.VideoCapture(video_path)
 			
 			if output_path:
@@ -279,8 +969,7 @@ class LicensePlateDetector:
 				if not ret:
 					break
 				
-				# Nhận diện biển số
-				results = self.detect_license_plate(frame)
+				results = detect_frame(frame)
 				
 				# Hiển thị kết quả
 				for result in results:
@@ -306,6 +995,8 @@ class LicensePlateDetector:
 			if output_path:
 				out.release()
 			cv2.destroyAllWindows()
+			if gate is not None:
+				print(f"Lọc chuyển động: {gate.stats()}")
 			
 		except Exception as e:
 			print(f"Error in video detection: {e}")
@@ -0,0 +1,168 @@
+"""
+Nhận diện trực tiếp từ camera không chặn: đọc/hiển thị theo FPS camera, OCR chạy nền trên frame mới nhất
+"""
+
+import threading
+import time
+from collections import deque
+import cv2
+
+class LiveDetector:
+	"""Vòng lặp camera trực tiếp với ngữ nghĩa "frame mới nhất thắng".
+
+	- Luồng capture đọc camera liên tục (video file thì giữ đúng FPS của file) và chỉ giữ
+	  frame mới nhất, nên bộ đệm camera không bị dồn frame cũ.
+	- Luồng OCR luôn lấy frame mới nhất; các frame đến trong lúc OCR đang chạy bị bỏ qua.
+	- Luồng gọi run() hiển thị/ghi frame theo FPS camera, vẽ kết quả nhận diện gần nhất
+	  cho tới khi có kết quả mới.
+	- Độ trễ mỗi lần nhận diện = thời điểm có kết quả - thời điểm frame được đọc
+	  (thống kê trên 1000 lần gần nhất).
+
+	detect_fn(frame) -> list kết quả có 'text', 'confidence', 'bbox'.
+	"""
+
+	def __init__(self, detect_fn, display=True, window_name='License Plate Detection'):
+		self.detect_fn = detect_fn
+		self.display = display
+		self.window_name = window_name
+		self._cond = threading.Condition()
+		self._stop = threading.Event()
+		self._frame = None  # (frame_index, captured_at, frame) mới nhất
+		self._results = []
+		self._latencies = deque(maxlen=1000)  # Độ trễ các lần nhận diện gần nhất
+		self.frames_captured = 0
+		self.frames_ocr = 0
+		self.frames_dropped = 0
+		self._started = None
+
+	def _capture(self, cap, pace):
+		interval = 1.0 / pace if pace else 0
+		next_at = time.perf_counter()
+		try:
+			while not self._stop.is_set():
+				ret, frame = cap.read()
+				if not ret:
+					break
+				with self._cond:
+					self.frames_captured += 1
+					self._frame = (self.frames_captured, time.perf_counter(), frame)
+					self._cond.notify_all()
+				if interval:
+					# Video file: phát theo FPS gốc thay vì đọc nhanh hết mức
+					next_at += interval
+					delay = next_at - time.perf_counter()
+					if delay > 0:
+						time.sleep(delay)
+		finally:
+			self._stop.set()
+			with self._cond:
+				self._cond.notify_all()
+
+	def _ocr(self):
+		last_index = 0
+		while True:
+			with self._cond:
+				while not self._stop.is_set() and (self._frame is None or self._frame[0] == last_index):
+					self._cond.wait()
+				if self._stop.is_set():
+					return
+				index, captured_at, frame = self._frame
+			# Các frame giữa hai lần OCR bị bỏ qua
+			self.frames_dropped += index - last_index - 1
+			last_index = index
+			try:
+				results = self.detect_fn(frame)
+			except Exception as e:
+				print(f"Error in live detection: {e}")
+				results = []
+			latency = time.perf_counter() - captured_at
+			with self._cond:
+				self.frames_ocr += 1
+				self._results = results
+				self._latencies.append(latency)
+			for result in results:
+				print(f"Biển số: {result['text']} (Độ tin cậy: {result['confidence']:.2f}, trễ {latency * 1000:.0f}ms)")
+
+	def _draw(self, frame, results, latency):
+		for result in results:
+			x1, y1, x2, y2 = result['bbox']
+			cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+			cv2.putText(frame, result['text'], (x1, y1-10),
+					   cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+		if latency is not None:
+			cv2.putText(frame, f"OCR latency: {latency * 1000:.0f} ms", (10, 25),
+					   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+		return frame
+
+	def run(self, source=0, output_path=None, fps=None):
+		"""Chạy tới khi hết video, nhấn 'q' hoặc gọi stop(); trả về stats()."""
+		cap = cv2.VideoCapture(source)
+		if not cap.isOpened():
+			raise ValueError(f"Không thể mở nguồn video: {source}")
+		source_fps = cap.get(cv2.CAP_PROP_FPS)
+		is_file = isinstance(source, str) and not source.isdigit() and '://' not in source
+		pace = fps or (source_fps if is_file and source_fps > 0 else None)
+		self._stop.clear()
+		threads = [
+			threading.Thread(target=self._capture, args=(cap, pace), name='live-capture', daemon=True),
+			threading.Thread(target=self._ocr, name='live-ocr', daemon=True),
+		]
+		for t in threads:
+			t.start()
+		out = None
+		shown = 0
+		self._started = time.perf_counter()
+		try:
+			while not self._stop.is_set():
+				with self._cond:
+					while not self._stop.is_set() and (self._frame is None or self._frame[0] == shown):
+						self._cond.wait(0.5)
+					if self._frame is None or self._frame[0] == shown:
+						continue
+					shown, _, frame = self._frame
+					results = list(self._results)
+					latency = self._latencies[-1] if self._latencies else None
+				frame = self._draw(frame.copy(), results, latency)
+				if output_path:
+					if out is None:
+						h, w = frame.shape[:2]
+						out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'XVID'),
+											  pace or source_fps or 20.0, (w, h))
+					out.write(frame)
+				if self.display:
+					cv2.imshow(self.window_name, frame)
+					# Nhấn 'q' để thoát
+					if cv2.waitKey(1) & 0xFF == ord('q'):
+						break
+		finally:
+			self.stop()
+			for t in threads:
+				t.join()
+			cap.release()
+			if out is not None:
+				out.release()
+			if self.display:
+				cv2.destroyAllWindows()
+		stats = self.stats()
+		print(f"Live: {stats}")
+		return stats
+
+	def stop(self):
+		self._stop.set()
+		with self._cond:
+			self._cond.notify_all()
+
+	def stats(self):
+		with self._cond:
+			latencies = sorted(self._latencies)
+			elapsed = time.perf_counter() - self._started if self._started else 0
+			return {
+				'frames_captured': self.frames_captured,
+				'frames_ocr': self.frames_ocr,
+				'frames_dropped': self.frames_dropped,
+				'capture_fps': round(self.frames_captured / elapsed, 2) if elapsed > 0 else 0,
+				'ocr_fps': round(self.frames_ocr / elapsed, 2) if elapsed > 0 else 0,
+				'latency_ms_avg': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0,
+				'latency_ms_p95': round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else 0,
+				'latency_ms_max': round(latencies[-1] * 1000, 2) if latencies else 0,
+			}
@@ -45,7 +45,8 @@ def main():
         
         # Khởi tạo cơ sở dữ liệu
         print("\n🗄️  Khởi tạo cơ sở dữ liệu...")
-        from database import db
+        from database import get_db
+        get_db()
         print("✅ Cơ sở dữ liệu đã sẵn sàng!")
         
         # Khởi tạo hệ thống thu phí
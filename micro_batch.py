@@ -0,0 +1,93 @@
+"""
+Gộp các request nhận diện đến gần nhau thành một lượt gọi detector (micro-batching)
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import MICRO_BATCH_WINDOW_MS, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_IN_FLIGHT
+
+class MicroBatcher:
+	"""Gom các item đến trong cùng một cửa sổ thời gian và xử lý chúng bằng một lần gọi batch.
+
+	batch_fn nhận list item và trả về list kết quả cùng thứ tự. Mỗi submit() trả về một
+	Future; lô được chạy khi đủ `max_batch_size` item hoặc khi cửa sổ `window_ms` tính
+	từ item đầu tiên kết thúc, nên độ trễ thêm vào tối đa bằng cửa sổ gom.
+	Tối đa `max_in_flight` lô chạy đồng thời (ví dụ mỗi lô trên một worker của pool OCR);
+	khi mọi lô đều đang chạy, item mới dồn lại cho lô kế tiếp.
+	"""
+
+	def __init__(self, batch_fn, window_ms=MICRO_BATCH_WINDOW_MS, max_batch_size=MICRO_BATCH_MAX_SIZE,
+				 max_in_flight=MICRO_BATCH_MAX_IN_FLIGHT):
+		self.batch_fn = batch_fn
+		self.window = window_ms / 1000.0
+		self.max_batch_size = max_batch_size
+		self.max_in_flight = max_in_flight
+		self._queue = queue.Queue()
+		self._lock = threading.Lock()
+		self._slots = threading.BoundedSemaphore(max_in_flight)
+		self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='micro-batch')
+		self._in_flight = 0
+		self._batches = 0
+		self._items = 0
+		self._max_wait_ms = 0.0
+		self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+		self._thread.start()
+
+	def submit(self, item):
+		future = Future()
+		self._queue.put((item, future, time.perf_counter()))
+		return future
+
+	def _collect(self):
+		batch = [self._queue.get()]
+		deadline = time.perf_counter() + self.window
+		while len(batch) < self.max_batch_size:
+			remaining = deadline - time.perf_counter()
+			if remaining <= 0:
+				break
+			try:
+				batch.append(self._queue.get(timeout=remaining))
+			except queue.Empty:
+				break
+		return batch
+
+	def _loop(self):
+		while True:
+			# Chờ có chỗ trống trước khi gom để item đến trong lúc chờ vào cùng một lô
+			self._slots.acquire()
+			batch = self._collect()
+			started = time.perf_counter()
+			with self._lock:
+				self._batches += 1
+				self._items += len(batch)
+				self._in_flight += 1
+				self._max_wait_ms = max(self._max_wait_ms, (started - batch[0][2]) * 1000)
+			self._executor.submit(self._run_batch, batch)
+
+	def _run_batch(self, batch):
+		try:
+			results = self.batch_fn([item for item, _, _ in batch])
+			for (_, future, _), result in zip(batch, results):
+				future.set_result(result)
+		except Exception as e:
+			for _, future, _ in batch:
+				if not future.done():
+					future.set_exception(e)
+		finally:
+			with self._lock:
+				self._in_flight -= 1
+			self._slots.release()
+
+	def stats(self):
+		with self._lock:
+			return {
+				'batches': self._batches,
+				'items': self._items,
+				'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0,
+				'max_wait_ms': round(self._max_wait_ms, 2),
+				'in_flight': self._in_flight,
+				'max_in_flight': self.max_in_flight,
+				'pending': self._queue.qsize(),
+			}
@@ -0,0 +1,145 @@
+"""
+Pool tiến trình OCR: mỗi worker giữ sẵn một LicensePlateDetector (EasyOCR Reader) đã nạp
+"""
+
+import multiprocessing as mp
+import threading
+import time
+import cv2
+from license_plate_detector import LicensePlateDetector
+from video_pipeline import split_segments, video_frame_count
+from config import (
+	OCR_POOL_SIZE, OCR_POOL_TORCH_THREADS, OCR_POOL_MAX_TASKS_PER_WORKER, OCR_POOL_TIMEOUT, OCR_POOL_START_METHOD,
+)
+
+# Detector của worker. Với start method 'fork' detector được nạp ở tiến trình cha trước khi fork
+# (worker dùng chung trang nhớ của model theo copy-on-write); 'spawn'/'forkserver' thì mỗi worker tự nạp.
+_detector = None
+
+def _init_worker(torch_threads):
+	"""Giới hạn số luồng tính toán của mỗi worker để N worker không tranh nhau CPU, nạp detector nếu chưa có."""
+	global _detector
+	cv2.setNumThreads(1)
+	if torch_threads:
+		try:
+			import torch
+			torch.set_num_threads(torch_threads)
+		except ImportError:
+			pass
+	if _detector is None:
+		_detector = LicensePlateDetector()
+
+def _run_task(fn, args, kwargs):
+	return fn(_detector, *args, **kwargs)
+
+def _detect_with_stats(detector, image, camera_id=None):
+	return detector.detect_with_stats(image, camera_id)
+
+def _detect_in_region(detector, image, region=None, camera_id=None):
+	return detector.detect_in_region(image, region, camera_id)
+
+def _detect_video_segment(detector, video_path, start_frame, end_frame, sample_rate):
+	stats = {}
+	results = detector.detect_video_segment(video_path, start_frame, end_frame, sample_rate, stats=stats)
+	return results, stats
+
+class DetectorPool:
+	"""Pool N tiến trình worker, mỗi worker chạy OCR trên detector đã nạp sẵn.
+
+	Task là một hàm cấp module `fn(detector, *args, **kwargs)`; kết quả phải pickle được.
+	Worker được thay mới sau `max_tasks_per_worker` task.
+	start_method 'spawn' (mặc định) hoặc 'forkserver': worker là tiến trình mới và tự nạp model,
+	an toàn khi pool được tạo (hoặc worker được thay) trong tiến trình Flask đa luồng đã chạy torch.
+	'fork': nạp detector ở tiến trình cha rồi fork để worker dùng chung model; chỉ dùng khi tạo pool
+	lúc khởi động, trước khi có luồng khác hoặc OCR nào chạy, vì fork sau khi thread pool của torch
+	đã khởi động có thể gây treo (kể cả khi thay worker).
+	"""
+
+	def __init__(self, size=OCR_POOL_SIZE, torch_threads=OCR_POOL_TORCH_THREADS,
+				 max_tasks_per_worker=OCR_POOL_MAX_TASKS_PER_WORKER, timeout=OCR_POOL_TIMEOUT,
+				 start_method=OCR_POOL_START_METHOD):
+		global _detector
+		if size < 1:
+			raise ValueError("Kích thước pool phải >= 1")
+		ctx = mp.get_context(start_method)
+		if start_method == 'fork' and _detector is None:
+			_detector = LicensePlateDetector()
+		self.size = size
+		self.timeout = timeout
+		self.start_method = start_method
+		self._submitted = 0
+		self._lock = threading.Lock()
+		self._pool = ctx.Pool(
+			size,
+			initializer=_init_worker,
+			initargs=(torch_threads,),
+			maxtasksperchild=max_tasks_per_worker or None,
+		)
+		print(f"DetectorPool: {size} worker ({start_method}), {torch_threads} torch thread/worker, "
+			  f"recycle sau {max_tasks_per_worker or 'không giới hạn'} task")
+
+	def submit(self, fn, *args, **kwargs):
+		"""Gửi task bất đồng bộ, trả về AsyncResult."""
+		with self._lock:
+			self._submitted += 1
+		return self._pool.apply_async(_run_task, (fn, args, kwargs))
+
+	def run(self, fn, *args, **kwargs):
+		"""Gửi task và chờ kết quả (tối đa `timeout` giây)."""
+		return self.submit(fn, *args, **kwargs).get(self.timeout)
+
+	def detect_with_stats(self, image, camera_id=None):
+		return self.run(_detect_with_stats, image, camera_id)
+
+	def detect_license_plate(self, image, camera_id=None):
+		results, _ = self.detect_with_stats(image, camera_id)
+		return results
+
+	def detect_in_region(self, image, region=None, camera_id=None):
+		return self.run(_detect_in_region, image, region, camera_id)
+
+	def detect_video_file(self, video_path, sample_rate=5, segments=None, progress_callback=None,
+						  cancel_event=None):
+		"""Chia video thành `segments` đoạn (mặc định = số worker), mỗi đoạn xử lý ở một worker.
+
+		Không giới hạn số frame; kết quả các đoạn được gộp và loại trùng như detect_from_video_file.
+		Không có timeout: thời gian chạy tỉ lệ với độ dài video. Lỗi của một đoạn được ném lại.
+		progress_callback(progress): gọi mỗi khi một đoạn xong (cùng các khóa như detect_from_video_file,
+			detections là kết quả của đoạn đó) nên tiến độ tăng theo từng đoạn, không theo từng frame
+		cancel_event: threading.Event, ngừng chờ và trả về kết quả các đoạn đã xong khi được set;
+			đoạn đang chạy ở worker vẫn chạy nốt (không ngắt được task của pool)
+		"""
+		started = time.perf_counter()
+		total_frames = video_frame_count(video_path)
+		ranges = split_segments(total_frames, segments or self.size)
+		tasks = [
+			self.submit(_detect_video_segment, video_path, start, end, sample_rate)
+			for start, end in ranges
+		]
+		best = {}
+		progress = {'total_frames': total_frames, 'frames_decoded': 0, 'frames_processed': 0}
+		for (start, end), task in zip(ranges, tasks):
+			while not task.ready():
+				if cancel_event is not None and cancel_event.is_set():
+					break
+				task.wait(0.5)
+			if not task.ready():
+				break
+			results, segment_stats = task.get()
+			LicensePlateDetector._keep_best(best, results)
+			# Codec chỉ seek được tới keyframe sẽ giải mã lại phần trước đoạn: tính theo độ dài đoạn
+			progress['frames_decoded'] += end - start if end is not None else segment_stats.get('frames_decoded', 0)
+			progress['frames_processed'] += segment_stats.get('frames_processed', 0)
+			if progress_callback is not None:
+				progress_callback(dict(progress, detections=results))
+		unique_results = sorted(best.values(), key=lambda x: x['confidence'], reverse=True)
+		print(f"Video {len(ranges)} đoạn: {len(unique_results)} biển số duy nhất "
+			  f"trong {time.perf_counter() - started:.2f}s")
+		return unique_results
+
+	def stats(self):
+		return {'size': self.size, 'start_method': self.start_method, 'submitted': self._submitted}
+
+	def close(self):
+		self._pool.close()
+		self._pool.join()
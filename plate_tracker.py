@@ -0,0 +1,196 @@
+"""
+Theo dõi biển số qua nhiều frame: mỗi xe chỉ OCR khi mới xuất hiện hoặc sau mỗi K frame
+"""
+
+from collections import deque
+from config import TRACK_IOU_THRESHOLD, TRACK_OCR_EVERY, TRACK_MAX_AGE, TRACK_MAX_FINISHED
+
+def _iou(a, b):
+	ax, ay, aw, ah = a
+	bx, by, bw, bh = b
+	w = min(ax + aw, bx + bw) - max(ax, bx)
+	h = min(ay + ah, by + bh) - max(ay, by)
+	if w <= 0 or h <= 0:
+		return 0.0
+	inter = w * h
+	return inter / float(aw * ah + bw * bh - inter)
+
+def _center(box):
+	x, y, w, h = box
+	return x + w / 2.0, y + h / 2.0
+
+def fuse_reads(reads):
+	"""Gộp các lần đọc (text, confidence) bằng bỏ phiếu từng ký tự có trọng số confidence.
+
+	Chỉ các lần đọc có độ dài được ủng hộ nhiều nhất tham gia bỏ phiếu. Trả về
+	(text, confidence) với confidence = confidence trung bình x tỉ lệ đồng thuận.
+	"""
+	if not reads:
+		return None, 0.0
+	by_length = {}
+	for text, conf in reads:
+		by_length.setdefault(len(text), []).append((text, conf))
+	group = max(by_length.values(), key=lambda g: sum(c for _, c in g))
+	total = sum(c for _, c in group)
+	chars = []
+	agreement = 0.0
+	for i in range(len(group[0][0])):
+		votes = {}
+		for text, conf in group:
+			votes[text[i]] = votes.get(text[i], 0.0) + conf
+		char, weight = max(votes.items(), key=lambda v: v[1])
+		chars.append(char)
+		agreement += weight / total if total else 0.0
+	agreement /= max(len(chars), 1)
+	return ''.join(chars), total / len(group) * agreement
+
+class Track:
+	"""Một xe (vùng biển số) được theo dõi qua các frame."""
+
+	def __init__(self, track_id, bbox, frame_index, frame_number=None):
+		self.id = track_id
+		self.bbox = bbox  # (x, y, w, h) ở frame gần nhất
+		self.first_frame = frame_number
+		self.last_frame = frame_number
+		self.last_seen = frame_index
+		self.last_ocr = None  # frame_index của lần OCR gần nhất
+		self.hits = 1
+		self.reads = []  # (text, confidence) của mọi lần OCR
+
+	def needs_ocr(self, frame_index, ocr_every):
+		return self.last_ocr is None or frame_index - self.last_ocr >= ocr_every
+
+	def add_read(self, text, confidence):
+		self.reads.append((text, confidence))
+
+	def plate(self):
+		"""Kết quả gộp của track, cùng định dạng với kết quả của detector (None nếu chưa đọc được)."""
+		text, confidence = fuse_reads(self.reads)
+		if text is None:
+			return None
+		x, y, w, h = self.bbox
+		return {
+			'text': text,
+			'confidence': confidence,
+			'bbox': [x, y, x + w, y + h],
+			'track_id': self.id,
+			'reads': len(self.reads),
+			'first_frame': self.first_frame,
+			'last_frame': self.last_frame,
+		}
+
+class PlateTracker:
+	"""Ghép vùng biển số giữa các frame theo IoU, dự phòng bằng khoảng cách tâm.
+
+	update() nhận các vùng (x, y, w, h) của frame mới và trả về list (track, cần_OCR):
+	track mới luôn cần OCR, track cũ chỉ OCR lại sau mỗi `ocr_every` frame. Track không
+	xuất hiện quá `max_age` frame được chuyển sang danh sách đã kết thúc; danh sách này giữ
+	tối đa `max_finished` track, nơi gọi chạy lâu (camera, video dài) lấy dần bằng pop_finished().
+	"""
+
+	def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, ocr_every=TRACK_OCR_EVERY, max_age=TRACK_MAX_AGE,
+				 max_finished=TRACK_MAX_FINISHED):
+		self.iou_threshold = iou_threshold
+		self.ocr_every = ocr_every
+		self.max_age = max_age
+		self.tracks = []
+		self.finished = deque(maxlen=max_finished)
+		self.finished_total = 0
+		self.frame_index = 0
+		self._next_id = 1
+		self.regions_seen = 0
+		self.regions_ocr = 0
+
+	def _match(self, regions):
+		"""Ghép tham lam: cặp IoU cao nhất trước, vùng còn lại ghép theo khoảng cách tâm."""
+		matches = {}
+		used = set()
+		pairs = sorted(
+			((_iou(t.bbox, r), ti, ri) for ti, t in enumerate(self.tracks) for ri, r in enumerate(regions)),
+			reverse=True,
+		)
+		for score, ti, ri in pairs:
+			if score < self.iou_threshold:
+				break
+			if ti in used or ri in matches:
+				continue
+			matches[ri] = ti
+			used.add(ti)
+		for ri, region in enumerate(regions):
+			if ri in matches:
+				continue
+			cx, cy = _center(region)
+			best, best_dist = None, None
+			for ti, track in enumerate(self.tracks):
+				if ti in used:
+					continue
+				tx, ty = _center(track.bbox)
+				dist = ((cx - tx) ** 2 + (cy - ty) ** 2) ** 0.5
+				# Chỉ ghép khi tâm dịch chuyển không quá kích thước của vùng
+				if dist <= max(track.bbox[2], track.bbox[3]) and (best_dist is None or dist < best_dist):
+					best, best_dist = ti, dist
+			if best is not None:
+				matches[ri] = best
+				used.add(best)
+		return matches
+
+	def update(self, regions, frame_number=None):
+		self.frame_index += 1
+		matches = self._match(regions)
+		updated = []
+		for ri, region in enumerate(regions):
+			if ri in matches:
+				track = self.tracks[matches[ri]]
+				track.bbox = region
+				track.last_seen = self.frame_index
+				track.last_frame = frame_number
+				track.hits += 1
+			else:
+				track = Track(self._next_id, region, self.frame_index, frame_number)
+				self._next_id += 1
+				self.tracks.append(track)
+			needs_ocr = track.needs_ocr(self.frame_index, self.ocr_every)
+			if needs_ocr:
+				track.last_ocr = self.frame_index
+				self.regions_ocr += 1
+			updated.append((track, needs_ocr))
+		self.regions_seen += len(regions)
+		# Kết thúc các track đã mất dấu quá lâu
+		alive = []
+		for track in self.tracks:
+			if self.frame_index - track.last_seen > self.max_age:
+				# Chỉ giữ lại track đã đọc được biển số
+				if track.reads:
+					self.finished.append(track)
+					self.finished_total += 1
+			else:
+				alive.append(track)
+		self.tracks = alive
+		return updated
+
+	def plates(self, plate_fn=None):
+		"""Một kết quả gộp cho mỗi track (đã kết thúc và đang theo dõi) đã đọc được biển số.
+
+		plate_fn(track) thay cho Track.plate nếu cần kiểm tra thêm kết quả gộp.
+		"""
+		plate_fn = plate_fn or Track.plate
+		plates = [plate_fn(t) for t in list(self.finished) + self.tracks]
+		return [p for p in plates if p is not None]
+
+	def pop_finished(self, plate_fn=None):
+		"""Kết quả gộp của các track đã kết thúc kể từ lần gọi trước, rồi bỏ các track đó."""
+		plate_fn = plate_fn or Track.plate
+		plates = [plate_fn(t) for t in self.finished]
+		self.finished.clear()
+		return [p for p in plates if p is not None]
+
+	def stats(self):
+		return {
+			'frames': self.frame_index,
+			'active_tracks': len(self.tracks),
+			'finished_tracks': self.finished_total,
+			'tracks_created': self._next_id - 1,
+			'regions_seen': self.regions_seen,
+			'regions_ocr': self.regions_ocr,
+			'ocr_skipped': self.regions_seen - self.regions_ocr,
+		}
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script cho hàng đợi kiểm soát tải (admission.py)
+"""
+
+import threading
+import time
+from admission import (
+    AdmissionController, QueueFullError, DeadlineExceededError, PRIORITY_LANE, PRIORITY_DASHBOARD,
+)
+
+def _blocked_controller(max_queue):
+    """Controller 1 worker đang bận với một task chờ `release`, hàng đợi còn trống."""
+    controller = AdmissionController(max_queue=max_queue, workers=1)
+    release = threading.Event()
+    blocker = controller.submit(release.wait)
+    while controller.stats()['in_flight'] == 0:
+        time.sleep(0.01)
+    return controller, release, blocker
+
+def test_reject_when_full():
+    """Hàng đợi đầy: request cùng ưu tiên bị từ chối"""
+    controller, release, _ = _blocked_controller(max_queue=2)
+    queued = [controller.submit(lambda i=i: i, priority=PRIORITY_DASHBOARD) for i in range(2)]
+    try:
+        controller.submit(lambda: None, priority=PRIORITY_DASHBOARD)
+        assert False, "request phải bị từ chối"
+    except QueueFullError as e:
+        assert e.retry_after == controller.retry_after
+    release.set()
+    assert [f.result(timeout=5) for f in queued] == [0, 1]
+    stats = controller.stats()
+    assert stats['rejected'] == 1 and stats['admitted'] == 3
+    print("✅ Hàng đợi đầy: request thứ 3 bị từ chối")
+
+def test_evict_lower_priority():
+    """Request làn thu phí đẩy request dashboard mới nhất ra khỏi hàng đợi đầy"""
+    controller, release, _ = _blocked_controller(max_queue=2)
+    older = controller.submit(lambda: 'old', priority=PRIORITY_DASHBOARD)
+    newer = controller.submit(lambda: 'new', priority=PRIORITY_DASHBOARD)
+    lane = controller.submit(lambda: 'lane', priority=PRIORITY_LANE)
+    try:
+        newer.result(timeout=1)
+        assert False, "request dashboard mới nhất phải bị đẩy ra"
+    except QueueFullError:
+        pass
+    order = []
+    lane.add_done_callback(lambda f: order.append(f.result()))
+    older.add_done_callback(lambda f: order.append(f.result()))
+    release.set()
+    assert lane.result(timeout=5) == 'lane' and older.result(timeout=5) == 'old'
+    assert order == ['lane', 'old']
+    assert controller.stats()['evicted'] == 1
+    print("✅ Ưu tiên: request làn đẩy request dashboard ra và được xử lý trước")
+
+def test_skip_expired():
+    """Request đã quá deadline khi tới lượt không được chạy"""
+    controller, release, _ = _blocked_controller(max_queue=4)
+    calls = []
+    expired = controller.submit(calls.append, 'expired', deadline=time.monotonic() + 0.05)
+    alive = controller.submit(calls.append, 'alive', deadline=time.monotonic() + 60)
+    time.sleep(0.1)
+    release.set()
+    try:
+        expired.result(timeout=5)
+        assert False, "request quá deadline phải bị bỏ"
+    except DeadlineExceededError:
+        pass
+    alive.result(timeout=5)
+    assert calls == ['alive']
+    print("✅ Deadline: request hết hạn bị bỏ qua, không tốn worker")
+
+def test_stats_counters():
+    """Bộ đếm completed/failed/expired và độ sâu hàng đợi"""
+    controller, release, blocker = _blocked_controller(max_queue=4)
+    ok = controller.submit(lambda: 1)
+    failed = controller.submit(lambda: 1 / 0)
+    controller.submit(lambda: None, deadline=time.monotonic() - 1)
+    stats = controller.stats()
+    assert stats['queue_depth'] == 3 and stats['in_flight'] == 1
+    assert stats['queue_depth_by_priority']['dashboard'] == 3
+    release.set()
+    blocker.result(timeout=5)
+    ok.result(timeout=5)
+    try:
+        failed.result(timeout=5)
+    except ZeroDivisionError:
+        pass
+    while controller.stats()['queue_depth'] or controller.stats()['in_flight']:
+        time.sleep(0.01)
+    stats = controller.stats()
+    assert stats['admitted'] == 4
+    assert stats['completed'] == 2 and stats['failed'] == 1 and stats['expired'] == 1
+    print(f"✅ Thống kê hàng đợi: {stats}")
+
+if __name__ == "__main__":
+    test_reject_when_full()
+    test_evict_lower_priority()
+    test_skip_expired()
+    test_stats_counters()
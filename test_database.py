@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Test script cho cơ sở dữ liệu thu phí (dùng file SQLite tạm, không đụng toll_system.db)
+"""
+
+import os
+import datetime
+import sqlite3
+import tempfile
+import threading
+from database import TollDatabase, WriteBehindWriter, VehicleCache
+from toll_system import TollSystem, MAX_HISTORY_LIMIT
+
+def _temp_db(**kwargs):
+    path = os.path.join(tempfile.mkdtemp(), 'toll_test.db')
+    return TollDatabase(path, **kwargs)
+
+def test_process_vehicle_entry():
+    """Xe và giao dịch được ghi cùng một transaction, kết nối được dùng lại"""
+    db = _temp_db()
+    for i in range(50):
+        db.process_vehicle_entry(f"30A-{i % 5:05d}", 'car', 1500, 50000)
+    with db.connection() as conn:
+        vehicles = conn.execute('SELECT COUNT(*) FROM vehicles').fetchone()[0]
+        transactions = conn.execute('SELECT COUNT(*) FROM toll_transactions').fetchone()[0]
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    assert vehicles == 5
+    assert transactions == 50
+    assert journal_mode == 'wal'
+    assert db.stats()['connections_opened'] == 1
+    db.close()
+    print("✅ process_vehicle_entry: 50 giao dịch, 1 kết nối")
+
+def test_concurrent_writes():
+    """Nhiều luồng ghi đồng thời qua pool kết nối"""
+    db = _temp_db(pool_size=4)
+
+    def worker(lane):
+        for i in range(25):
+            db.process_vehicle_entry(f"51F-{lane}{i:04d}", 'truck', 8000, 80000)
+
+    threads = [threading.Thread(target=worker, args=(lane,)) for lane in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with db.connection() as conn:
+        transactions = conn.execute('SELECT COUNT(*) FROM toll_transactions').fetchone()[0]
+    assert transactions == 100
+    assert db.stats()['connections_idle'] <= 4
+    db.close()
+    print("✅ Ghi đồng thời: 100 giao dịch từ 4 luồng")
+
+def test_write_behind():
+    """Giao dịch được gom lô, ghi bằng ít lần commit và ghi nốt khi đóng"""
+    db = _temp_db()
+    writer = WriteBehindWriter(db, batch_size=100, flush_ms=1000, durability='enqueue')
+    for i in range(250):
+        writer.submit(f"29B-{i:05d}", 'car', None, 50000)
+    assert writer.flush(timeout=5)
+    stats = writer.stats()
+    assert stats['written'] == 250 and stats['pending'] == 0
+    assert stats['batches'] <= 3
+    writer.submit("29B-99999", 'bus', None, 70000)
+    writer.close()
+    with db.connection() as conn:
+        transactions = conn.execute('SELECT COUNT(*) FROM toll_transactions').fetchone()[0]
+    assert transactions == 251
+    db.close()
+    print(f"✅ Write-behind: 251 giao dịch, {writer.stats()['batches']} lô")
+
+def test_write_behind_flush_mode():
+    """Chế độ 'flush' chỉ trả về sau khi lô đã được commit"""
+    db = _temp_db()
+    writer = WriteBehindWriter(db, batch_size=50, flush_ms=5, durability='flush')
+    writer.submit("43A-00001", 'car', 1500, 50000)
+    with db.connection() as conn:
+        transactions = conn.execute('SELECT COUNT(*) FROM toll_transactions').fetchone()[0]
+    assert transactions == 1
+    writer.close()
+    db.close()
+    print("✅ Write-behind (flush): giao dịch đã commit khi submit trả về")
+
+def test_history_and_statistics():
+    """Lịch sử phân trang theo keyset, lọc theo ngày và thống kê từ dữ liệu thật"""
+    db = _temp_db()
+    day = datetime.datetime(2026, 3, 1, 8, 0)
+    entries = [(f"30A-{i % 7:05d}", 'truck' if i % 7 == 0 else 'car', None, 50000,
+                day + datetime.timedelta(minutes=30 * i), f"L{i % 2}") for i in range(60)]
+    db.process_vehicle_entries(entries)
+    assert db.get_vehicle("30A-00000")['vehicle_type'] == 'truck'
+    assert db.get_vehicle("99Z-99999") is None
+
+    pages, before = [], None
+    while True:
+        page = db.get_transactions(limit=25, before=before)
+        if not page:
+            break
+        pages.append(page)
+        before = (page[-1]['timestamp'], page[-1]['id'])
+    ids = [row['id'] for page in pages for row in page]
+    assert len(ids) == 60 and ids == sorted(ids, reverse=True)
+
+    first_day = db.get_transactions(start=day.date(), end=day.date() + datetime.timedelta(days=1), limit=100)
+    assert len(first_day) == 32  # 08:00 -> 23:30
+    assert all(row['license_plate'] == "30A-00003" for row in db.get_transactions("30A-00003"))
+
+    stats = db.get_statistics(day.date(), day.date() + datetime.timedelta(days=1))
+    assert stats['total_vehicles'] == 32
+    assert stats['total_revenue'] == 32 * 50000
+    assert sum(stats['vehicle_types'].values()) == 32
+    assert stats['lanes'] == {'L0': 16, 'L1': 16}
+    assert sum(stats['hourly'].values()) == 32
+    db.close()
+    print(f"✅ Lịch sử: {len(pages)} trang, thống kê ngày: {stats}")
+
+def test_history_cursor_clamped_limit():
+    """limit vượt MAX_HISTORY_LIMIT vẫn có cursor trang sau (tính theo giới hạn đã áp dụng)"""
+    db = _temp_db()
+    day = datetime.datetime(2026, 3, 1, 8, 0)
+    db.process_vehicle_entries([(f"30A-{i:05d}", 'car', None, 50000, day + datetime.timedelta(seconds=i), None)
+                                for i in range(MAX_HISTORY_LIMIT + 10)])
+    limit = TollSystem.clamp_history_limit(1000)
+    page = db.get_transactions(limit=limit)
+    assert limit == MAX_HISTORY_LIMIT and len(page) == MAX_HISTORY_LIMIT
+    cursor = TollSystem.history_cursor(page, limit)
+    assert cursor is not None
+    rest = db.get_transactions(limit=limit, before=TollSystem._parse_cursor(cursor))
+    assert len(rest) == 10 and TollSystem.history_cursor(rest, limit) is None
+    assert TollSystem.clamp_history_limit(0) == 1
+    db.close()
+    print("✅ Cursor lịch sử: limit=1000 được giới hạn còn 500, vẫn có trang sau")
+
+def test_history_cursor_legacy_timestamps():
+    """Giao dịch cũ không có phần micro giây: được chuẩn hóa khi mở DB, phân trang không lặp/sót"""
+    path = os.path.join(tempfile.mkdtemp(), 'legacy.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE toll_transactions (id INTEGER PRIMARY KEY, license_plate TEXT, '
+                     'toll_fee REAL, timestamp TIMESTAMP)')
+        conn.executemany('INSERT INTO toll_transactions VALUES (NULL, ?, ?, ?)',
+                         [('30A-12345', 50000, '2026-03-01 10:00:00'),
+                          ('30A-12346', 50000, '2026-03-01 10:00:00'),
+                          ('30A-12347', 50000, '2026-03-01 10:00:00.500000'),
+                          ('30A-12348', 50000, '2026-03-01T09:59:59')])
+    db = TollDatabase(path)
+    seen, cursor = [], None
+    while True:
+        page = db.get_transactions(limit=1, before=TollSystem._parse_cursor(cursor))
+        seen += [row['id'] for row in page]
+        cursor = TollSystem.history_cursor(page, 1)
+        if cursor is None:
+            break
+    assert seen == [3, 2, 1, 4]
+    assert db.get_transactions(limit=1)[0]['timestamp'] == '2026-03-01 10:00:00.500000'
+
+    # Cursor tạo từ giá trị chưa chuẩn hóa vẫn cùng định dạng với cột timestamp
+    assert TollSystem.history_cursor([{'id': 7, 'timestamp': '2026-03-01 10:00:00'}], 1) == \
+        '2026-03-01 10:00:00.000000|7'
+    assert TollSystem._parse_cursor('2026-03-01T10:00:00|7') == ('2026-03-01 10:00:00.000000', 7)
+    try:
+        TollSystem._parse_cursor('hôm qua|7')
+        assert False, "cursor không hợp lệ phải bị từ chối"
+    except ValueError:
+        pass
+    db.close()
+    print(f"✅ Cursor với thời điểm cũ: {seen}")
+
+def test_rollups():
+    """Rollup được cập nhật cùng transaction, DB cũ được migrate và tính lại rollup"""
+    path = os.path.join(tempfile.mkdtemp(), 'legacy.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE vehicles (id INTEGER PRIMARY KEY, license_plate TEXT UNIQUE, '
+                     'vehicle_type TEXT, weight REAL)')
+        conn.execute('CREATE TABLE toll_transactions (id INTEGER PRIMARY KEY, license_plate TEXT, '
+                     'toll_fee REAL, timestamp TIMESTAMP)')
+        conn.execute("INSERT INTO vehicles VALUES (NULL, '51F-67890', 'truck', 8000)")
+        conn.executemany('INSERT INTO toll_transactions VALUES (NULL, ?, ?, ?)',
+                         [('51F-67890', 80000, '2026-03-01 09:15:00.000000'),
+                          ('30A-12345', 50000, '2026-03-01 10:00:00.000000')])
+    db = TollDatabase(path)
+    stats = db.get_statistics(datetime.date(2026, 3, 1), datetime.date(2026, 3, 2))
+    assert stats['total_vehicles'] == 2
+    assert stats['vehicle_types'] == {'truck': 1, 'default': 1}
+
+    db.process_vehicle_entry("30A-12345", 'car', None, 50000, lane_id='L1')
+    db.add_transaction("30A-12345", 50000, 'car')
+    assert db.check_rollups() == []
+    with db.transaction() as cursor:
+        cursor.execute('UPDATE toll_rollup_daily SET vehicles = vehicles + 1')
+    assert db.check_rollups()
+    db.rebuild_rollups()
+    assert db.check_rollups() == []
+    db.close()
+    print("✅ Rollup: migrate DB cũ, cập nhật cùng giao dịch, kiểm tra và tính lại")
+
+def test_vehicle_cache():
+    """Xe không đổi thông tin không bị ghi lại, xe đổi thông tin được upsert giữ nguyên id"""
+    db = _temp_db()
+    for _ in range(10):
+        db.process_vehicle_entry("30A-12345", 'car', 1500, 50000)
+    assert db.stats()['vehicle_writes_skipped'] == 9
+    with db.connection() as conn:
+        vehicle_id = conn.execute("SELECT id FROM vehicles WHERE license_plate = '30A-12345'").fetchone()[0]
+    db.process_vehicle_entry("30A-12345", 'truck', 8000, 80000)
+    with db.connection() as conn:
+        row = conn.execute("SELECT id, vehicle_type, weight FROM vehicles "
+                           "WHERE license_plate = '30A-12345'").fetchone()
+    assert row == (vehicle_id, 'truck', 8000)
+    assert db.get_vehicle("30A-12345")['vehicle_type'] == 'truck'
+    assert db.vehicle_cache.stats()['hits'] >= 10
+    db.close()
+
+    cache = VehicleCache(size=2, ttl=60)
+    cache.put("A", 'car', None)
+    cache.put("B", 'car', None)
+    cache.get("A")
+    cache.put("C", 'bus', None)
+    assert cache.get("B") is None and cache.get("A") == ('car', None)
+    assert cache.stats()['evictions'] == 1
+    expired = VehicleCache(size=2, ttl=0)
+    expired.put("A", 'car', None)
+    assert expired.get("A") is None and expired.stats()['expirations'] == 1
+    print(f"✅ Cache xe: {db.vehicle_cache.stats()}")
+
+if __name__ == "__main__":
+    test_process_vehicle_entry()
+    test_concurrent_writes()
+    test_write_behind()
+    test_write_behind_flush_mode()
+    test_history_and_statistics()
+    test_history_cursor_clamped_limit()
+    test_history_cursor_legacy_timestamps()
+    test_rollups()
+    test_vehicle_cache()
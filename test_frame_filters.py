@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script cho ROI camera, lọc chuyển động và chọn frame nét (frame_filters.py)
+"""
+
+import cv2
+import numpy as np
+from frame_filters import CameraROI, MotionGate, motion_gate_for, KeyframeSelector
+
+def _scene(block=None, value=90):
+    """Frame 320x240 nền đều, tuỳ chọn một khối sáng (x, y, w, h)."""
+    frame = np.full((240, 320, 3), value, dtype=np.uint8)
+    if block is not None:
+        x, y, w, h = block
+        cv2.rectangle(frame, (x, y), (x + w - 1, y + h - 1), (230, 230, 230), -1)
+    return frame
+
+def _frame(sharp, value=128):
+    """Frame xám đều (không nét) hoặc có lưới cạnh sắc (nét)."""
+    frame = np.full((120, 160, 3), value, dtype=np.uint8)
+    if sharp:
+        frame[::4, :] = 255
+        frame[:, ::4] = 0
+    return frame
+
+def _contains(region, box):
+    x, y, w, h = region
+    bx, by, bw, bh = box
+    return x <= bx and y <= by and x + w >= bx + bw and y + h >= by + bh
+
+def test_roi_geometry():
+    """ROI chữ nhật chỉ crop, đa giác có mask; toạ độ tỉ lệ và theo frame_size được co giãn"""
+    # Đỉnh là pixel (tính cả hai đầu): x 20..119, y 10..59
+    rect = CameraROI([[20, 10], [119, 10], [119, 59], [20, 59]])
+    assert rect.geometry((100, 200)) == ((20, 10, 100, 50), None)
+
+    triangle = CameraROI([[0, 0], [100, 0], [0, 100]])
+    (x, y, w, h), mask = triangle.geometry((200, 200, 3))
+    assert (x, y) == (0, 0) and mask is not None and mask.shape == (h, w)
+    assert mask[2, 2] == 255 and mask[h - 2, w - 2] == 0
+
+    # Toạ độ tỉ lệ, cạnh 1.0 bị giới hạn trong ảnh
+    normalized = CameraROI([[0.25, 0.5], [0.745, 0.5], [0.745, 1.0], [0.25, 1.0]])
+    assert normalized.normalized
+    assert normalized.geometry((100, 200))[0] == (50, 50, 100, 50)
+
+    # Đa giác vẽ trên frame 400x200, ảnh thu nhỏ còn 200x100
+    scaled = CameraROI([[100, 50], [298, 50], [298, 148], [100, 148]], frame_size=(400, 200))
+    assert scaled.geometry((100, 200))[0] == (50, 25, 100, 50)
+    assert scaled.area_ratio((100, 200)) == 0.25
+    print("✅ CameraROI.geometry: chữ nhật, đa giác, tỉ lệ, co giãn theo frame_size")
+
+def test_roi_apply():
+    """apply() crop theo ROI, trả về offset và tô điểm ngoài đa giác bằng màu trung bình"""
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    image[:, :50] = (0, 0, 200)
+    image[:, 50:] = (200, 0, 0)
+    crop, offset = CameraROI([[10, 20], [59, 20], [59, 69], [10, 69]]).apply(image)
+    assert offset == (10, 20) and crop.shape == (50, 50, 3)
+    assert np.array_equal(crop, image[20:70, 10:60])
+
+    triangle = CameraROI([[0, 0], [100, 0], [0, 100]])
+    out, offset = triangle.apply(image)
+    (_, _, w, h), mask = triangle.geometry(image.shape)
+    assert offset == (0, 0)
+    fill = cv2.mean(image[:h, :w], mask)[:3]
+    assert np.allclose(out[mask == 0], fill, atol=1)
+    assert np.array_equal(out[mask > 0], image[:h, :w][mask > 0])
+    print(f"✅ CameraROI.apply: offset {offset}, ngoài đa giác tô màu {tuple(round(c) for c in fill)}")
+
+def test_motion_gate_diff():
+    """So sánh với frame trước: frame tĩnh bị lọc, chỉ xử lý vùng chuyển động (đã nới thêm padding)"""
+    gate = MotionGate('diff', width=160)
+    # Frame đầu chưa có gì để so sánh: xử lý cả frame
+    assert gate.check(_scene()) == (0, 0, 320, 240)
+    assert gate.check(_scene()) is None
+
+    block = (200, 100, 60, 40)
+    region = gate.check(_scene(block))
+    assert _contains(region, block) and region[2] * region[3] < 320 * 240 * 0.6
+    # Xe dừng hẳn: frame giống frame trước nên bị lọc
+    assert gate.check(_scene(block)) is None
+
+    # Thay đổi phủ gần hết frame (ví dụ đổi ánh sáng): trả về cả frame thay vì crop
+    assert gate.check(_scene(block, value=200)) == (0, 0, 320, 240)
+    assert gate.stats() == {'method': 'diff', 'frames': 5, 'gated': 2, 'gated_ratio': 0.4, 'cropped': 1}
+    print(f"✅ MotionGate diff: vùng chuyển động {region}")
+
+def test_motion_gate_mog2():
+    """MOG2: nền học qua các frame tĩnh, khối mới xuất hiện là foreground"""
+    gate = MotionGate('mog2', width=160)
+    assert gate.check(_scene()) == (0, 0, 320, 240)
+    for _ in range(10):
+        assert gate.check(_scene()) is None
+    block = (40, 60, 60, 40)
+    region = gate.check(_scene(block))
+    assert region is not None and _contains(region, block)
+    assert gate.stats()['gated'] == 10 and gate.stats()['cropped'] == 1
+    print(f"✅ MotionGate mog2: vùng chuyển động {region}")
+
+def test_motion_gate_for():
+    """Bật/tắt theo tham số, phương pháp không hỗ trợ bị từ chối"""
+    assert motion_gate_for('lane-1', enabled=False) is None
+    gate = motion_gate_for('lane-1', enabled=True)
+    assert isinstance(gate, MotionGate)
+    try:
+        MotionGate('optical-flow')
+        assert False, "phương pháp không hỗ trợ phải bị từ chối"
+    except ValueError:
+        pass
+    print(f"✅ motion_gate_for: {gate.method}")
+
+def test_keyframe_selector():
+    """Mỗi cửa sổ chỉ giữ frame nét nhất, trả về khi cửa sổ kết thúc và khi flush()"""
+    selector = KeyframeSelector(window=5, per_window=1)
+    sharp_frames = {3, 9}
+    selected = []
+    for frame_number in range(1, 13):
+        selected += selector.push(frame_number, _frame(frame_number in sharp_frames, 100 + frame_number))
+    assert [n for n, _ in selected] == [3, 9]
+    last = selector.flush()
+    assert len(last) == 1 and 11 <= last[0][0] <= 12
+    assert selector.flush() == []
+    stats = selector.stats()
+    assert stats['frames_scored'] == 12 and stats['frames_selected'] == 3 and stats['windows'] == 3
+
+    # min_score bỏ cửa sổ toàn frame mờ; per_window giữ nhiều frame, trả về theo thứ tự frame
+    strict = KeyframeSelector(window=4, per_window=2, min_score=1.0)
+    chosen = []
+    for frame_number in range(1, 9):
+        chosen += strict.push(frame_number, _frame(frame_number in (2, 3), 100))
+    chosen += strict.flush()
+    assert [n for n, _ in chosen] == [2, 3]
+    print(f"✅ KeyframeSelector: {stats}")
+
+if __name__ == "__main__":
+    test_roi_geometry()
+    test_roi_apply()
+    test_motion_gate_diff()
+    test_motion_gate_mog2()
+    test_motion_gate_for()
+    test_keyframe_selector()
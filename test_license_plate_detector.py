@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Test script cho cascade nhận diện của LicensePlateDetector (dùng reader giả lập, không nạp EasyOCR)
+"""
+
+import itertools
+import os
+import tempfile
+import cv2
+import numpy as np
+from license_plate_detector import LicensePlateDetector, FramePlanes, VariantStats
+
+BOX = [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+class FakeReader:
+    """Reader cùng giao diện EasyOCR: `answer(kind, image, kwargs)` trả list (box, text, conf),
+    mọi lượt gọi được ghi vào `calls`."""
+
+    def __init__(self, answer=None, boxes=None):
+        self.answer = answer or (lambda kind, image, kwargs: [])
+        self.boxes = boxes if boxes is not None else [[0, 100, 0, 30]]  # box text detection trả về
+        self.calls = []
+
+    def readtext(self, image, **kwargs):
+        kind = 'paragraph' if kwargs.get('paragraph') else 'readtext'
+        self.calls.append(kind)
+        return self.answer(kind, image, kwargs)
+
+    def readtext_batched(self, images, **kwargs):
+        self.calls.append(f"batched:{len(images)}")
+        kind = 'paragraph' if kwargs.get('paragraph') else 'readtext'
+        return [self.answer(kind, image, kwargs) for image in images]
+
+    def detect(self, image, **kwargs):
+        self.calls.append('detect')
+        return [self.boxes], [[]]
+
+    def recognize(self, image, horizontal_list=None, free_list=None, **kwargs):
+        self.calls.append('recognize')
+        return self.answer('recognize', image, dict(kwargs, horizontal_list=horizontal_list))
+
+def _detector(reader, **kwargs):
+    kwargs.setdefault('profile', 'fast')
+    kwargs.setdefault('variant_ordering', False)
+    return LicensePlateDetector(reader=reader, camera_rois={}, camera_profiles={}, **kwargs)
+
+def _blank(width=240, height=120):
+    return np.full((height, width, 3), 255, dtype=np.uint8)
+
+def test_early_exit():
+    """Biển số chuẩn đủ tin cậy ở lượt OCR đầu tiên: dừng cascade ngay"""
+    reader = FakeReader(lambda kind, image, kwargs: [(BOX, '28A17537', 0.9)])
+    results, stats = _detector(reader).detect_with_stats(_blank())
+    assert results[0]['text'] == '28A-175.37'
+    assert stats['stages'] == ['full_frame'] and stats['ocr_calls'] == 1
+    assert stats['stop_reason'] == 'confident' and stats['early_exit']
+    assert reader.calls == ['readtext']
+    print(f"✅ Early exit: {stats['stages']}, {stats['ocr_calls']} lượt OCR")
+
+def test_cascade_without_early_exit():
+    """Kết quả chưa đủ tin cậy: chạy hết full_frame và contours, bỏ qua paragraph"""
+    reader = FakeReader(lambda kind, image, kwargs: [(BOX, '28A17537', 0.4)])
+    results, stats = _detector(reader).detect_with_stats(_blank())
+    assert results[0]['text'] == '28A-175.37'
+    assert stats['stages'] == ['full_frame', 'contours'] and stats['stop_reason'] == 'completed'
+    # Profile 'fast': 2 biến thể + ảnh gốc, ảnh trắng không có contour nào
+    assert stats['ocr_calls'] == 3 and 'paragraph' not in reader.calls
+
+    # Không đọc được gì: stage paragraph suy diễn biển số từ đoạn text gộp
+    def answer(kind, image, kwargs):
+        return [(BOX, '28A 175 37', 0.5)] if kind == 'paragraph' else []
+    reader = FakeReader(answer)
+    results, stats = _detector(reader).detect_with_stats(_blank())
+    assert stats['stages'] == ['full_frame', 'contours', 'paragraph']
+    assert results[0]['text'] == '28A-175.37'
+    print(f"✅ Cascade: {stats['stages']}, {stats['ocr_calls']} lượt OCR")
+
+def test_ocr_budget():
+    """Ngân sách OCR giới hạn tổng số lượt gọi reader của một frame"""
+    reader = FakeReader()
+    results, stats = _detector(reader, ocr_call_budget=2).detect_with_stats(_blank())
+    assert results == []
+    assert stats['ocr_calls'] == 2 and len(reader.calls) == 2
+    assert stats['stop_reason'] == 'budget' and stats['ocr_budget'] == 2
+
+    reader = FakeReader()
+    _, stats = _detector(reader, ocr_call_budget=None).detect_with_stats(_blank())
+    assert stats['stop_reason'] == 'completed' and stats['ocr_calls'] == len(reader.calls) == 6
+    print(f"✅ Ngân sách OCR: dừng sau 2 lượt, không giới hạn thì chạy {stats['ocr_calls']} lượt")
+
+def test_shared_detection():
+    """Chế độ shared_detection: text detection chạy một lần mỗi frame, các biến thể chỉ recognize"""
+    reader = FakeReader()
+    _, stats = _detector(reader, ocr_mode='shared_detection').detect_with_stats(_blank())
+    assert reader.calls.count('detect') == 1 and stats['detect_calls'] == 1
+    # full_frame và paragraph dùng chung box: mỗi stage 3 lượt recognize (2 biến thể + ảnh gốc)
+    assert reader.calls.count('recognize') == 6
+    assert stats['ocr_calls'] == 7 and 'readtext' not in reader.calls
+
+    # Frame không có vùng text nào: bỏ qua recognize trên mọi biến thể
+    reader = FakeReader(boxes=[])
+    _, stats = _detector(reader, ocr_mode='shared_detection').detect_with_stats(_blank())
+    assert reader.calls == ['detect'] and stats['ocr_calls'] == 1
+    print("✅ Shared detection: 1 lượt detect cho cả frame, frame không có text thì bỏ qua recognize")
+
+def _two_plates():
+    """Ảnh có hai vùng dạng biển số (contour ~123x43)."""
+    image = _blank(320, 160)
+    cv2.rectangle(image, (20, 20), (140, 60), (0, 0, 0), -1)
+    cv2.rectangle(image, (180, 90), (300, 130), (0, 0, 0), -1)
+    return image
+
+def _read_every_box(texts, conf):
+    """Reader chỉ đọc được khi recognize trên box: box thứ i đọc ra texts[i % len(texts)]."""
+    def answer(kind, image, kwargs):
+        if kind != 'recognize':
+            return []
+        return [([[b[0], b[2]], [b[1], b[2]], [b[1], b[3]], [b[0], b[3]]], texts[i % len(texts)], conf)
+                for i, b in enumerate(kwargs['horizontal_list'])]
+    return answer
+
+def test_contour_recognition_only():
+    """Crop contour đi thẳng vào recognizer: một lượt recognize chung, ngân sách trừ theo từng tile"""
+    # Tile xếp theo biến thể rồi tới vùng: box chẵn là vùng dưới, box lẻ là vùng trên
+    texts = ['51F67890', '30A12345']
+    reader = FakeReader(_read_every_box(texts, 0.5))
+    results, stats = _detector(reader).detect_with_stats(_two_plates())
+    assert reader.calls == ['readtext'] * 3 + ['recognize']
+    # 2 vùng x 3 biến thể = 6 tile
+    assert stats['ocr_calls'] == 3 + 6 and stats['stages'] == ['full_frame', 'contours']
+    assert {r['text']: r['bbox'] for r in results} == {
+        '51F-678.90': [179, 89, 302, 132], '30A-123.45': [19, 19, 142, 62]}
+
+    # Ngân sách chỉ còn 2 tile: mỗi vùng được đọc bằng biến thể tốt nhất trước
+    reader = FakeReader(_read_every_box(texts, 0.5))
+    results, stats = _detector(reader, ocr_call_budget=5).detect_with_stats(_two_plates())
+    assert stats['ocr_calls'] == 5 and stats['stop_reason'] == 'budget'
+    assert reader.calls.count('recognize') == 1 and len(results) == 2
+    print(f"✅ Recognize crop contour: {stats['ocr_calls']} lượt OCR, dừng vì {stats['stop_reason']}")
+
+def test_batched_mode():
+    """Chế độ batched: mỗi stage một lượt readtext_batched, ngân sách trừ theo số ảnh trong lô"""
+    reader = FakeReader()
+    detector = _detector(reader, ocr_mode='batched', contour_recognition_only=False)
+    _, stats = detector.detect_with_stats(_two_plates())
+    # full_frame: 3 biến thể; contours: 2 vùng x 3 biến thể; paragraph: 3 biến thể
+    assert reader.calls == ['batched:3', 'batched:6', 'batched:3']
+    assert stats['ocr_calls'] == 12
+
+    reader = FakeReader()
+    detector = _detector(reader, ocr_mode='batched', contour_recognition_only=False, ocr_call_budget=5)
+    _, stats = detector.detect_with_stats(_two_plates())
+    assert reader.calls == ['batched:3', 'batched:2']
+    assert stats['ocr_calls'] == 5 and stats['stop_reason'] == 'budget'
+
+    # Biển số chuẩn ở lô đầu: dừng sau một lượt gọi
+    reader = FakeReader(lambda kind, image, kwargs: [(BOX, '28A17537', 0.9)])
+    _, stats = _detector(reader, ocr_mode='batched').detect_with_stats(_two_plates())
+    assert reader.calls == ['batched:3'] and stats['stop_reason'] == 'confident'
+    print(f"✅ Batched: {stats['ocr_calls']} ảnh trong 1 lượt readtext_batched")
+
+def test_detect_batch():
+    """Lô nhiều ảnh (micro-batching) cho cùng kết quả và cùng cascade như gọi từng ảnh"""
+    texts = ['51F67890', '30A12345']
+    images = [_two_plates(), _blank()]
+    for answer in (_read_every_box(texts, 0.5), lambda kind, image, kwargs: [(BOX, '28A17537', 0.9)]):
+        single = [_detector(FakeReader(answer), ocr_call_budget=5).detect_with_stats(image) for image in images]
+        batched = _detector(FakeReader(answer), ocr_call_budget=5).detect_batch(images)
+        assert [results for results, _ in batched] == [results for results, _ in single]
+        for (_, stats), (_, expected) in zip(batched, single):
+            assert stats['batch_size'] == 2
+            for key in ('stages', 'ocr_calls', 'stop_reason', 'early_exit'):
+                assert stats[key] == expected[key]
+    print(f"✅ Lô ảnh: {[stats['stages'] for _, stats in batched]}")
+
+def test_frame_planes():
+    """Mỗi plane được tính một lần mỗi frame, crop của biến thể là view của plane toàn frame"""
+    planes = FramePlanes(_two_plates(), 'fast')
+    thresh = planes.plane('thresh')
+    # thresh kéo theo gray -> enhanced -> denoised -> processed
+    assert planes.misses == 5 and planes.hits == 0
+    assert planes.plane('thresh') is thresh and planes.plane('processed') is not None
+    assert planes.misses == 5 and planes.hits == 2
+    crop = planes.get('thresh', (20, 20, 50, 30))
+    assert crop.shape == (30, 50) and np.shares_memory(crop, thresh)
+    assert len(planes.variants()) == 2 and set(planes.stats()['timings_ms']) == {
+        'gray', 'enhanced', 'denoised', 'processed', 'thresh'}
+
+    # Cả cascade (full_frame, contours, paragraph) chỉ tính mỗi plane một lần
+    _, stats = _detector(FakeReader()).detect_with_stats(_two_plates())
+    assert stats['preprocess']['misses'] == 5
+    print(f"✅ Cache plane: {stats['preprocess']['hits']} lần dùng lại, {stats['preprocess']['misses']} lần tính")
+
+def test_profiles():
+    """Profile theo camera quyết định phương pháp khử nhiễu và số biến thể được OCR"""
+    reader = FakeReader()
+    detector = LicensePlateDetector(reader=reader, camera_rois={}, profile='fast', variant_ordering=False,
+                                    camera_profiles={'lane-1': 'accurate'})
+    _, fast = detector.detect_with_stats(_blank())
+    calls = len(reader.calls)
+    _, accurate = detector.detect_with_stats(_blank(), camera_id='lane-1')
+    assert fast['profile'] == 'fast' and accurate['profile'] == 'accurate'
+    # full_frame + paragraph: 2 và 4 biến thể (cộng ảnh gốc)
+    assert calls == 6 and len(reader.calls) - calls == 10
+    assert 'denoised' in accurate['preprocess']['timings_ms']
+
+    report = detector.get_profile_stats()
+    assert report['fast']['frames'] == 1 and report['accurate']['avg_ocr_calls'] == 10
+    try:
+        LicensePlateDetector(reader=reader, camera_profiles={'lane-1': 'ultra'})
+        assert False, "profile không hợp lệ phải bị từ chối"
+    except ValueError:
+        pass
+    print(f"✅ Profile: fast {report['fast']['avg_ocr_calls']} lượt OCR, accurate {report['accurate']['avg_ocr_calls']} lượt OCR")
+
+def test_variant_ordering():
+    """Biến thể được thử theo tỉ lệ hit của từng camera, định kỳ ưu tiên biến thể ít được thử"""
+    names = ['processed', 'thresh', 'raw']
+    stats = VariantStats(explore_every=5)
+    for _ in range(3):
+        stats.record('lane-1', 'thresh', True)
+        stats.record('lane-1', 'processed', False)
+    assert stats.order('lane-1', names) == (['thresh', 'raw', 'processed'], False)
+    # Camera khác có thống kê riêng: giữ thứ tự mặc định
+    assert stats.order('lane-2', names) == (names, False)
+    for _ in range(3):
+        stats.order('lane-1', names)
+    # Frame thứ 5 của camera: khám phá, biến thể chưa thử lần nào lên đầu
+    assert stats.order('lane-1', names) == (['raw', 'processed', 'thresh'], True)
+    assert stats.report()['lane-1']['variants']['thresh']['hit_rate'] == 1.0
+
+    detector = _detector(FakeReader(), variant_ordering=True)
+    for _ in range(3):
+        detector.variant_stats.record('lane-1', 'thresh', True)
+    _, frame_stats = detector.detect_with_stats(_blank(), camera_id='lane-1')
+    assert frame_stats['variant_order'][0] == 'thresh'
+    print(f"✅ Thứ tự biến thể: {frame_stats['variant_order']}")
+
+def _write_video(frames=12):
+    path = os.path.join(tempfile.mkdtemp(), 'plates.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (240, 120))
+    for _ in range(frames):
+        writer.write(_blank())
+    writer.release()
+    return path
+
+def test_video_keeps_best_per_plate():
+    """Video: mỗi biển số chỉ giữ kết quả confidence cao nhất trong lúc xử lý"""
+    counter = itertools.count()
+    def answer(kind, image, kwargs):
+        # Confidence đổi theo từng lượt đọc: 0.2 .. 0.65 (không đủ ngưỡng dừng sớm)
+        conf = 0.2 + (next(counter) % 10) / 20
+        return [(BOX, '28A17537', conf), (BOX, '51F67890', conf)]
+    detector = _detector(FakeReader(answer))
+    seen = []
+    results = detector.detect_from_video_file(
+        _write_video(), sample_rate=1, progress_callback=lambda p: seen.extend(p['detections']),
+        tracking=False, motion_gating=False, frame_selection='sample', max_processed_frames=None)
+    assert len(seen) == 24
+    assert sorted(r['text'] for r in results) == ['28A-175.37', '51F-678.90']
+    assert all(abs(r['confidence'] - 0.65) < 1e-9 for r in results)
+    print(f"✅ Video: {len(seen)} detections -> {len(results)} biển số")
+
+if __name__ == "__main__":
+    test_early_exit()
+    test_cascade_without_early_exit()
+    test_ocr_budget()
+    test_shared_detection()
+    test_contour_recognition_only()
+    test_batched_mode()
+    test_detect_batch()
+    test_frame_planes()
+    test_profiles()
+    test_variant_ordering()
+    test_video_keeps_best_per_plate()
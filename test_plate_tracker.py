@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script cho theo dõi biển số qua nhiều frame (plate_tracker.py)
+"""
+
+from plate_tracker import fuse_reads, PlateTracker
+
+def test_fuse_reads():
+    """Bỏ phiếu từng ký tự có trọng số confidence, chỉ giữa các lần đọc cùng độ dài"""
+    assert fuse_reads([]) == (None, 0.0)
+    text, confidence = fuse_reads([("30A-12345", 0.9)])
+    assert text == "30A-12345" and abs(confidence - 0.9) < 1e-9
+
+    reads = [("30A-12345", 0.8), ("30A-12845", 0.6), ("3OA-12345", 0.7), ("30A-1234", 0.95)]
+    text, confidence = fuse_reads(reads)
+    assert text == "30A-12345"
+    # Không đồng thuận hoàn toàn: confidence thấp hơn trung bình của nhóm
+    assert 0 < confidence < (0.8 + 0.6 + 0.7) / 3
+
+    # Độ dài có tổng confidence lớn nhất thắng dù ít lần đọc hơn
+    text, _ = fuse_reads([("51F-678.90", 0.95), ("51F-67890", 0.3), ("51F-67B90", 0.3)])
+    assert text == "51F-678.90"
+    print(f"✅ fuse_reads: {fuse_reads(reads)}")
+
+def test_match():
+    """Ghép theo IoU trước, vùng không trùng ghép theo khoảng cách tâm"""
+    tracker = PlateTracker(iou_threshold=0.3, ocr_every=5, max_age=3)
+    first = tracker.update([(100, 100, 80, 20), (400, 300, 80, 20)], frame_number=1)
+    assert [needs_ocr for _, needs_ocr in first] == [True, True]
+    ids = [track.id for track, _ in first]
+
+    # Dịch nhẹ (IoU cao) và dịch xa hơn nhưng tâm vẫn trong kích thước vùng; đổi thứ tự vùng
+    second = tracker.update([(460, 305, 80, 20), (105, 101, 80, 20)], frame_number=2)
+    assert [track.id for track, _ in second] == [ids[1], ids[0]]
+    assert [needs_ocr for _, needs_ocr in second] == [False, False]
+    assert tracker._match([(900, 900, 80, 20)]) == {}
+
+    # Track cũ OCR lại sau ocr_every frame
+    for frame_number in range(3, 7):
+        updated = tracker.update([(105, 101, 80, 20)], frame_number=frame_number)
+    assert updated[0][0].id == ids[0] and updated[0][1]
+    assert tracker.stats()['tracks_created'] == 2
+    print(f"✅ PlateTracker._match: {tracker.stats()}")
+
+def test_expiry():
+    """Track mất dấu quá max_age frame kết thúc, chỉ giữ track đã đọc được biển số"""
+    tracker = PlateTracker(max_age=2)
+    (read, _), (unread, _) = tracker.update([(0, 0, 50, 20), (300, 300, 50, 20)], frame_number=1)
+    read.add_read("29B-12345", 0.9)
+    for frame_number in range(2, 4):
+        tracker.update([], frame_number=frame_number)
+    assert len(tracker.tracks) == 2 and not tracker.finished
+    tracker.update([], frame_number=4)
+    assert tracker.tracks == [] and list(tracker.finished) == [read]
+
+    plates = tracker.plates()
+    assert len(plates) == 1
+    assert plates[0]['text'] == "29B-12345" and plates[0]['track_id'] == read.id
+    assert plates[0]['bbox'] == [0, 0, 50, 20] and plates[0]['first_frame'] == 1
+    print(f"✅ Hết hạn track: {plates}")
+
+def test_pop_finished():
+    """Lấy kết quả của track đã kết thúc rồi bỏ track; danh sách chờ lấy có giới hạn"""
+    tracker = PlateTracker(max_age=1, max_finished=2)
+    for frame_number in range(1, 4):
+        # Mỗi frame một xe mới ở vị trí khác, xe trước mất dấu
+        (track, _), = tracker.update([(frame_number * 200, 0, 50, 20)], frame_number=frame_number)
+        track.add_read(f"29B-1234{frame_number}", 0.9)
+    tracker.update([], frame_number=4)
+    tracker.update([], frame_number=5)
+    plates = tracker.pop_finished()
+    # 3 track đã kết thúc nhưng chỉ giữ 2 track mới nhất
+    assert [p['text'] for p in plates] == ["29B-12342", "29B-12343"]
+    assert not tracker.finished and tracker.pop_finished() == []
+    assert tracker.stats()['finished_tracks'] == 3
+    print(f"✅ pop_finished: {[p['text'] for p in plates]}")
+
+if __name__ == "__main__":
+    test_fuse_reads()
+    test_match()
+    test_expiry()
+    test_pop_finished()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test script cho chia đoạn video xử lý song song (video_pipeline.py)
+"""
+
+import os
+import tempfile
+import cv2
+import numpy as np
+from video_pipeline import split_segments, VideoPipeline
+
+def test_split_segments():
+    """Các đoạn liên tiếp, phủ kín [0, total_frames), độ dài chênh nhau tối đa 1 frame"""
+    assert split_segments(100, 4) == [(0, 25), (25, 50), (50, 75), (75, 100)]
+    for total, segments in ((101, 4), (7, 3), (1000, 7)):
+        ranges = split_segments(total, segments)
+        assert len(ranges) == segments
+        assert ranges[0][0] == 0 and ranges[-1][1] == total
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+        lengths = [end - start for start, end in ranges]
+        assert max(lengths) - min(lengths) <= 1
+    # Không tạo đoạn rỗng khi số đoạn lớn hơn số frame; số đoạn tối thiểu là 1
+    assert split_segments(3, 8) == [(0, 1), (1, 2), (2, 3)]
+    assert split_segments(50, 0) == [(0, 50)]
+    # Không biết số frame: xử lý cả file như một đoạn
+    assert split_segments(0, 4) == [(0, None)]
+    assert split_segments(-1, 4) == [(0, None)]
+    print(f"✅ split_segments: {split_segments(101, 4)}")
+
+def _write_video(frames):
+    path = os.path.join(tempfile.mkdtemp(), 'segment.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 4 % 256, dtype=np.uint8))
+    writer.release()
+    return path
+
+def test_segment_counters():
+    """Đoạn [40, 60): frames_decoded đếm số frame lần chạy giải mã, không phải vị trí trong video"""
+    path = _write_video(60)
+    pipeline = VideoPipeline(lambda frame, number, region: [], workers=2)
+    progress = list(pipeline.run(path, sample_rate=5, start_frame=40, end_frame=60))
+    assert [p['frame_number'] for p in progress] == [45, 50, 55, 60]
+    assert pipeline.stats()['frames_decoded'] == 20
+    assert progress[-1]['frames_decoded'] == 20 and progress[-1]['frames_processed'] == 4
+
+    list(pipeline.run(path, sample_rate=5))
+    assert pipeline.stats()['frames_decoded'] == 60
+    print(f"✅ frames_decoded: đoạn [40, 60) 20 frame, cả video {pipeline.stats()['frames_decoded']} frame")
+
+if __name__ == "__main__":
+    test_split_segments()
+    test_segment_counters()
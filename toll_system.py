@@ -4,7 +4,10 @@ Module hệ thống thu phí tự động
 
 import datetime
 from typing import Dict, Optional
-from database import db
+from database import get_db, get_toll_writer, format_timestamp
+
+# Số giao dịch tối đa mỗi trang lịch sử
+MAX_HISTORY_LIMIT = 500
 
 class TollSystem:
     def __init__(self):
@@ -48,17 +51,20 @@ class TollSystem:
         return round(total_fee, -3)  # Làm tròn đến nghìn
     
     def process_vehicle_entry(self, license_plate: str, vehicle_type: str = 'car',
-                            weight: float = None, distance: float = None) -> Dict:
+                            weight: float = None, distance: float = None,
+                            lane_id: str = None) -> Dict:
         """Xử lý xe vào trạm thu phí"""
         try:
             # Tính phí
             toll_fee = self.calculate_toll_fee(vehicle_type, weight, distance)
             
-            # Thêm xe vào cơ sở dữ liệu
-            db.add_vehicle(license_plate, vehicle_type, weight)
-            
-            # Thêm giao dịch thu phí
-            db.add_transaction(license_plate, toll_fee)
+            # Ghi xe và giao dịch thu phí: qua hàng đợi ghi theo lô nếu bật, ngược lại ghi ngay
+            # trong một transaction
+            toll_writer = get_toll_writer()
+            if toll_writer is not None:
+                timestamp = toll_writer.submit(license_plate, vehicle_type, weight, toll_fee, lane_id)
+            else:
+                timestamp = get_db().process_vehicle_entry(license_plate, vehicle_type, weight, toll_fee, lane_id)
             
             # Tạo thông báo
             message = f"Xe {license_plate} đã được xử lý. Phí: {toll_fee:,} VNĐ"
@@ -69,7 +75,7 @@ class TollSystem:
                 'vehicle_type': vehicle_type,
                 'toll_fee': toll_fee,
                 'message': message,
-                'timestamp': datetime.datetime.now()
+                'timestamp': timestamp
             }
             
         except Exception as e:
@@ -81,32 +87,64 @@ class TollSystem:
     
     def get_vehicle_info(self, license_plate: str) -> Optional[Dict]:
         """Lấy thông tin xe"""
-        return db.get_vehicle(license_plate)
+        return get_db().get_vehicle(license_plate)
+    
+    def get_toll_history(self, license_plate: str = None, start=None, end=None,
+                         limit: int = 50, cursor: str = None) -> list:
+        """Lấy lịch sử thu phí (mới nhất trước).
+        
+        start/end: datetime hoặc chuỗi ISO, ngày không kèm giờ ở `end` được tính cả ngày.
+        cursor: giá trị next_cursor của trang trước (xem history_cursor).
+        """
+        return get_db().get_transactions(
+            license_plate,
+            start=self._parse_time(start),
+            end=self._parse_time(end, end=True),
+            limit=self.clamp_history_limit(limit),
+            before=self._parse_cursor(cursor),
+        )
     
-    def get_toll_history(self, license_plate: str = None) -> list:
-        """Lấy lịch sử thu phí"""
-        # Giả lập dữ liệu lịch sử
-        if license_plate:
-            return [
-                {
-                    'license_plate': license_plate,
-                    'toll_fee': 50000,
-                    'timestamp': datetime.datetime.now() - datetime.timedelta(days=1)
-                }
-            ]
-        else:
-            return [
-                {
-                    'license_plate': '30A-12345',
-                    'toll_fee': 50000,
-                    'timestamp': datetime.datetime.now() - datetime.timedelta(hours=2)
-                },
-                {
-                    'license_plate': '51F-67890',
-                    'toll_fee': 80000,
-                    'timestamp': datetime.datetime.now() - datetime.timedelta(hours=1)
-                }
-            ]
+    @staticmethod
+    def clamp_history_limit(limit: int) -> int:
+        """Số giao dịch mỗi trang thực tế, trong khoảng [1, MAX_HISTORY_LIMIT]"""
+        return max(1, min(limit, MAX_HISTORY_LIMIT))
+    
+    @staticmethod
+    def history_cursor(history: list, limit: int) -> Optional[str]:
+        """Cursor của trang tiếp theo, None nếu đã hết dữ liệu.
+        
+        limit: số giao dịch mỗi trang đã giới hạn (clamp_history_limit), không phải giá trị thô
+        """
+        if not history or len(history) < limit:
+            return None
+        last = history[-1]
+        # Cùng định dạng độ dài cố định với cột timestamp để so sánh (timestamp, id) đúng thứ tự
+        return f"{format_timestamp(last['timestamp'])}|{last['id']}"
+    
+    @staticmethod
+    def _parse_cursor(cursor: str):
+        if not cursor:
+            return None
+        timestamp, sep, transaction_id = cursor.rpartition('|')
+        if not sep or not transaction_id.isdigit():
+            raise ValueError(f"cursor không hợp lệ: {cursor}")
+        try:
+            timestamp = format_timestamp(timestamp)
+        except ValueError:
+            raise ValueError(f"cursor không hợp lệ: {cursor}")
+        return timestamp, int(transaction_id)
+    
+    @staticmethod
+    def _parse_time(value, end: bool = False):
+        if value is None or value == '':
+            return None
+        if isinstance(value, str):
+            parsed = datetime.datetime.fromisoformat(value)
+            # Chỉ có ngày: mốc kết thúc là hết ngày đó
+            if end and len(value) == 10:
+                parsed += datetime.timedelta(days=1)
+            return parsed
+        return value
     
     def generate_receipt(self, license_plate: str, toll_fee: float) -> str:
         """Tạo hóa đơn thu phí"""
@@ -124,22 +162,12 @@ class TollSystem:
         """
         return receipt
     
-    def get_daily_statistics(self) -> Dict:
+    def get_daily_statistics(self, date: datetime.date = None) -> Dict:
         """Lấy thống kê hàng ngày"""
-        today = datetime.datetime.now().date()
-        
-        # Giả lập dữ liệu thống kê
-        return {
-            'date': today.strftime('%d/%m/%Y'),
-            'total_vehicles': 45,
-            'total_revenue': 2500000,
-            'vehicle_types': {
-                'car': 30,
-                'truck': 10,
-                'bus': 3,
-                'motorcycle': 2
-            }
-        }
+        day = date or datetime.datetime.now().date()
+        stats = get_db().get_statistics(day, day + datetime.timedelta(days=1))
+        stats['date'] = day.strftime('%d/%m/%Y')
+        return stats
 
 # Khởi tạo hệ thống thu phí
 toll_system = TollSystem() 
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Xử lý video bất đồng bộ: upload trả về job id, xử lý ở background, client hỏi tiến độ
+"""
+
+import datetime
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config import VIDEO_JOB_WORKERS, VIDEO_JOB_TTL
+
+class VideoJob:
+	"""Trạng thái một job xử lý video."""
+
+	def __init__(self, video_path, filename):
+		self.id = uuid.uuid4().hex
+		self.video_path = video_path
+		self.filename = filename
+		self.status = 'queued'  # queued -> running -> completed | failed | cancelled
+		self.error = None
+		self.created_at = datetime.datetime.now()
+		self.started_at = None
+		self.finished_at = None
+		self.finished_monotonic = None
+		self.total_frames = 0
+		self.frames_decoded = 0
+		self.frames_processed = 0
+		self.detections = []  # Kết quả từng frame (kết quả tạm thời trong lúc xử lý)
+		self.results = None  # Kết quả cuối cùng (đã loại trùng)
+		self.cancel_event = threading.Event()
+		self.lock = threading.Lock()
+
+	@property
+	def finished(self):
+		return self.status in ('completed', 'failed', 'cancelled')
+
+	def plates_found(self):
+		return sorted({d['text'] for d in self.detections})
+
+	def to_dict(self, include_results=False):
+		with self.lock:
+			data = {
+				'job_id': self.id,
+				'filename': self.filename,
+				'status': self.status,
+				'error': self.error,
+				'created_at': self.created_at.isoformat(),
+				'started_at': self.started_at.isoformat() if self.started_at else None,
+				'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+				'progress': {
+					'total_frames': self.total_frames,
+					'frames_decoded': self.frames_decoded,
+					'frames_processed': self.frames_processed,
+					'percent': round(self.frames_decoded * 100 / self.total_frames, 1) if self.total_frames else None,
+				},
+				'total_detections': len(self.detections),
+				'plates_found': self.plates_found(),
+			}
+			if include_results:
+				data['partial'] = self.results is None
+				data['results'] = list(self.results if self.results is not None else self.detections)
+			return data
+
+class VideoJobManager:
+	"""Chạy job video trên executor nền và giữ kết quả job đã xong trong `ttl` giây.
+
+	runner(video_path, progress_callback, cancel_event) thực hiện nhận diện và trả về
+	list kết quả cuối cùng. File video được xóa khi job kết thúc nếu cleanup=True.
+	"""
+
+	def __init__(self, runner, max_workers=VIDEO_JOB_WORKERS, ttl=VIDEO_JOB_TTL):
+		self.runner = runner
+		self.ttl = ttl
+		self._jobs = {}
+		self._lock = threading.Lock()
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='video-job')
+
+	def submit(self, video_path, filename, cleanup=True):
+		self.purge_expired()
+		job = VideoJob(video_path, filename)
+		with self._lock:
+			self._jobs[job.id] = job
+		self._executor.submit(self._run, job, cleanup)
+		return job
+
+	def get(self, job_id):
+		self.purge_expired()
+		with self._lock:
+			return self._jobs.get(job_id)
+
+	def cancel(self, job_id):
+		"""Yêu cầu hủy job; job đang chạy dừng sau frame hiện tại và giữ kết quả tạm thời."""
+		job = self.get(job_id)
+		if job is None:
+			return None
+		job.cancel_event.set()
+		with job.lock:
+			if job.status == 'queued':
+				job.status = 'cancelled'
+				job.finished_at = datetime.datetime.now()
+				job.finished_monotonic = time.monotonic()
+		return job
+
+	def _progress(self, job, progress):
+		with job.lock:
+			job.total_frames = progress['total_frames']
+			job.frames_decoded = progress['frames_decoded']
+			job.frames_processed = progress['frames_processed']
+			job.detections.extend(dict(d) for d in progress['detections'])
+
+	def _run(self, job, cleanup):
+		try:
+			with job.lock:
+				if job.cancel_event.is_set():
+					return
+				job.status = 'running'
+				job.started_at = datetime.datetime.now()
+			results = self.runner(job.video_path, lambda p: self._progress(job, p), job.cancel_event)
+			with job.lock:
+				job.results = results
+				job.status = 'cancelled' if job.cancel_event.is_set() else 'completed'
+		except Exception as e:
+			print(f"Lỗi job video {job.id}: {e}")
+			with job.lock:
+				job.status = 'failed'
+				job.error = str(e)
+		finally:
+			with job.lock:
+				job.finished_at = job.finished_at or datetime.datetime.now()
+				job.finished_monotonic = job.finished_monotonic or time.monotonic()
+			if cleanup and os.path.exists(job.video_path):
+				os.remove(job.video_path)
+
+	def purge_expired(self):
+		"""Xóa các job đã kết thúc quá `ttl` giây."""
+		now = time.monotonic()
+		with self._lock:
+			expired = [
+				job_id for job_id, job in self._jobs.items()
+				if job.finished and job.finished_monotonic is not None and now - job.finished_monotonic > self.ttl
+			]
+			for job_id in expired:
+				del self._jobs[job_id]
+
+	def stats(self):
+		with self._lock:
+			counts = {}
+			for job in self._jobs.values():
+				counts[job.status] = counts.get(job.status, 0) + 1
+			return {'jobs': len(self._jobs), 'by_status': counts}
@@ -0,0 +1,237 @@
+"""
+Pipeline xử lý video: luồng giải mã chạy song song với các luồng OCR
+"""
+
+import queue
+import threading
+import time
+import cv2
+from config import VIDEO_PIPELINE_WORKERS, VIDEO_PIPELINE_QUEUE_SIZE
+
+_DONE = object()
+
+def split_segments(total_frames, segments):
+	"""Chia [0, total_frames) thành `segments` đoạn liên tiếp gần bằng nhau."""
+	if total_frames <= 0:
+		# Không biết độ dài (stream, container lỗi): xử lý cả file như một đoạn
+		return [(0, None)]
+	segments = max(1, min(segments, total_frames))
+	bounds = [i * total_frames // segments for i in range(segments + 1)]
+	return [(bounds[i], bounds[i + 1]) for i in range(segments)]
+
+def video_frame_count(video_path):
+	cap = cv2.VideoCapture(video_path)
+	if not cap.isOpened():
+		raise ValueError(f"Không thể mở video file: {video_path}")
+	try:
+		return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+	finally:
+		cap.release()
+
+class VideoPipeline:
+	"""Giải mã và OCR chồng lên nhau thay vì chạy tuần tự trên một luồng.
+
+	- Luồng giải mã dùng grab() cho frame bị bỏ qua (không giải mã/chuyển màu) và
+	  retrieve() chỉ cho frame được lấy mẫu, đẩy vào hàng đợi có giới hạn `queue_size`
+	  (giải mã không chạy quá xa OCR, bộ nhớ giữ ở mức vài frame).
+	- `selector` (KeyframeSelector, tùy chọn): giải mã mọi frame và chỉ giữ frame nét nhất
+	  mỗi cửa sổ thay cho lấy mẫu mỗi `sample_rate` frame.
+	- `gate` (MotionGate, tùy chọn) chạy trong luồng giải mã: frame tĩnh bị bỏ qua, frame
+	  có chuyển động được gửi kèm vùng chuyển động.
+	- `workers` luồng OCR gọi detect_fn(frame, frame_number, region) -> list kết quả,
+	  region là vùng (x, y, w, h) cần xử lý hoặc None (cả frame).
+	- run() là generator trả kết quả theo đúng thứ tự frame, cùng định dạng với
+	  LicensePlateDetector.iter_video_detections.
+	"""
+
+	def __init__(self, detect_fn, workers=VIDEO_PIPELINE_WORKERS, queue_size=VIDEO_PIPELINE_QUEUE_SIZE,
+				 gate=None, selector=None):
+		if workers < 1:
+			raise ValueError("Số luồng OCR phải >= 1")
+		self.detect_fn = detect_fn
+		self.gate = gate
+		self.selector = selector
+		self.workers = workers
+		self.queue_size = queue_size
+		self._stats = {}
+
+	def _decode(self, cap, sample_rate, max_frames, frames, stop, cancel_event, counters,
+				start_frame=0, end_frame=None):
+		sampled = 0
+
+		def emit(frame_number, frame):
+			nonlocal sampled
+			region = None
+			if self.gate is not None:
+				region = self.gate.check(frame)
+				if region is None:
+					# Frame tĩnh: không OCR
+					counters['frames_gated'] += 1
+					return
+			item = (sampled, frame_number, frame, region)
+			sampled += 1
+			while not stop.is_set():
+				try:
+					frames.put(item, timeout=0.1)
+					return
+				except queue.Full:
+					continue
+
+		try:
+			frame_count = start_frame
+			finished = False
+			while not stop.is_set():
+				if cancel_event is not None and cancel_event.is_set():
+					print("Đã hủy xử lý video")
+					break
+				if max_frames is not None and sampled >= max_frames:
+					print("Đã đạt giới hạn frame xử lý")
+					break
+				if end_frame is not None and frame_count >= end_frame:
+					finished = True
+					break
+				started = time.perf_counter()
+				if not cap.grab():
+					finished = True
+					break
+				frame_count += 1
+				# Số frame lần chạy này giải mã (frame_count là vị trí tuyệt đối trong video)
+				counters['frames_decoded'] += 1
+				# Không chọn theo độ nét thì chỉ giải mã đầy đủ mỗi N frame
+				if self.selector is None and frame_count % sample_rate != 0:
+					counters['decode_s'] += time.perf_counter() - started
+					continue
+				ret, frame = cap.retrieve()
+				counters['decode_s'] += time.perf_counter() - started
+				if not ret:
+					finished = True
+					break
+				counters['frames_retrieved'] += 1
+				if self.selector is None:
+					emit(frame_count, frame)
+					continue
+				for frame_number, selected in self.selector.push(frame_count, frame):
+					emit(frame_number, selected)
+			if finished and self.selector is not None:
+				# Cửa sổ cuối của video/đoạn
+				for frame_number, selected in self.selector.flush():
+					emit(frame_number, selected)
+		finally:
+			for _ in range(self.workers):
+				frames.put(_DONE)
+
+	def _ocr(self, frames, results, stop, cancel_event, counters, lock):
+		while True:
+			item = frames.get()
+			if item is _DONE:
+				results.put(_DONE)
+				return
+			seq, frame_number, frame, region = item
+			# Đã hủy: bỏ qua các frame còn trong hàng đợi
+			if stop.is_set() or (cancel_event is not None and cancel_event.is_set()):
+				results.put((seq, frame_number, None, None))
+				continue
+			started = time.perf_counter()
+			try:
+				results.put((seq, frame_number, self.detect_fn(frame, frame_number, region), None))
+			except Exception as e:
+				results.put((seq, frame_number, None, e))
+			with lock:
+				counters['ocr_s'] += time.perf_counter() - started
+
+	def run(self, video_path, sample_rate=5, max_frames=None, cancel_event=None,
+			start_frame=0, end_frame=None):
+		"""Generator: yield dict kết quả của từng frame được lấy mẫu, theo thứ tự frame.
+
+		max_frames: số frame lấy mẫu tối đa (None = hết video)
+		start_frame, end_frame: chỉ xử lý đoạn frame [start_frame, end_frame) (đánh số từ 0);
+			frame được lấy mẫu theo số thứ tự tuyệt đối nên các đoạn ghép lại khớp với chạy cả file
+		cancel_event: threading.Event, ngừng giải mã và bỏ các frame đang chờ khi được set;
+			các frame đang OCR dở vẫn được trả về
+		"""
+		cap = cv2.VideoCapture(video_path)
+		if not cap.isOpened():
+			raise ValueError(f"Không thể mở video file: {video_path}")
+		total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+		fps = cap.get(cv2.CAP_PROP_FPS)
+		print(f"Video info: {total_frames} frames, {fps:.2f} fps, {total_frames / fps if fps > 0 else 0:.2f}s")
+		if start_frame:
+			cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+			# Một số codec chỉ seek được tới keyframe: lấy lại vị trí thực tế
+			start_frame = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+		frames = queue.Queue(maxsize=self.queue_size)
+		results = queue.Queue()
+		stop = threading.Event()
+		lock = threading.Lock()
+		counters = {'frames_decoded': 0, 'frames_retrieved': 0, 'frames_gated': 0, 'decode_s': 0.0, 'ocr_s': 0.0}
+		started = time.perf_counter()
+		threads = [threading.Thread(
+			target=self._decode, name='video-decode', daemon=True,
+			args=(cap, sample_rate, max_frames, frames, stop, cancel_event, counters, start_frame, end_frame),
+		)]
+		threads += [
+			threading.Thread(target=self._ocr, name=f'video-ocr-{i}', daemon=True,
+							 args=(frames, results, stop, cancel_event, counters, lock))
+			for i in range(self.workers)
+		]
+		for t in threads:
+			t.start()
+
+		pending = {}
+		next_seq = 0
+		processed = 0
+		finished = 0
+		try:
+			while finished < self.workers:
+				item = results.get()
+				if item is _DONE:
+					finished += 1
+					continue
+				seq, frame_number, detections, error = item
+				pending[seq] = (frame_number, detections, error)
+				# Trả kết quả theo thứ tự frame dù các worker xong không theo thứ tự
+				while next_seq in pending:
+					frame_number, detections, error = pending.pop(next_seq)
+					next_seq += 1
+					if error is not None:
+						raise error
+					if detections is None:
+						continue
+					processed += 1
+					timestamp = frame_number / fps if fps > 0 else 0
+					for result in detections:
+						result['frame_number'] = frame_number
+						result['timestamp'] = timestamp
+					yield {
+						'frame_number': frame_number,
+						'timestamp': timestamp,
+						'frames_decoded': counters['frames_decoded'],
+						'frames_processed': processed,
+						'total_frames': total_frames,
+						'fps': fps,
+						'detections': detections,
+					}
+		finally:
+			stop.set()
+			for t in threads:
+				t.join()
+			cap.release()
+			wall = time.perf_counter() - started
+			self._stats = {
+				'workers': self.workers,
+				'frames_decoded': counters['frames_decoded'],
+				'frames_retrieved': counters['frames_retrieved'],
+				'frames_gated': counters['frames_gated'],
+				'frames_processed': processed,
+				'decode_ms': round(counters['decode_s'] * 1000, 2),
+				'ocr_ms': round(counters['ocr_s'] * 1000, 2),
+				'wall_ms': round(wall * 1000, 2),
+			}
+			if self.selector is not None:
+				self._stats['keyframes'] = self.selector.stats()
+			print(f"Pipeline video: {self._stats}")
+
+	def stats(self):
+		"""Thống kê của lần chạy gần nhất."""
+		return dict(self._stats)
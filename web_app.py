@@ -2,11 +2,23 @@
 Giao diện web Flask cho hệ thống thu phí
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
+from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 import datetime
 from toll_system import toll_system
+from database import get_db, get_toll_writer
 from license_plate_detector import LicensePlateDetector
+from ocr_pool import DetectorPool
+from micro_batch import MicroBatcher
+from video_jobs import VideoJobManager
+from admission import (
+	AdmissionController, QueueFullError, DeadlineExceededError, PRIORITIES, PRIORITY_DASHBOARD,
+)
+from config import (
+	OCR_POOL_SIZE, OCR_POOL_TIMEOUT, VIDEO_POOL_TIMEOUT, MICRO_BATCH_ENABLED, MICRO_BATCH_MAX_SIZE,
+	MICRO_BATCH_MAX_IN_FLIGHT, ADMISSION_WORKERS, ADMISSION_DEFAULT_DEADLINE_MS, VIDEO_ADMISSION_MAX_QUEUE,
+	VIDEO_ADMISSION_WORKERS, VIDEO_SEGMENT_PROCESSES, VIDEO_STREAM_BUFFER,
+)
 import cv2
 import base64
 import numpy as np
@@ -14,6 +26,11 @@ import os
 import tempfile
 import uuid
 import re
+import json
+import queue
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 # web_app.py (đầu file)
 from pathlib import Path
@@ -42,6 +59,101 @@ def get_detector():
 		_detector_singleton = LicensePlateDetector()
 	return _detector_singleton
 
+# Pool tiến trình OCR (chỉ tạo khi OCR_POOL_SIZE > 0)
+_pool_singleton = None
+_pool_lock = threading.Lock()
+
+def get_detector_pool():
+	global _pool_singleton
+	if OCR_POOL_SIZE <= 0:
+		return None
+	with _pool_lock:
+		if _pool_singleton is None:
+			# Worker tự nạp detector (OCR_POOL_START_METHOD), không fork từ tiến trình Flask đa luồng
+			_pool_singleton = DetectorPool(OCR_POOL_SIZE)
+	return _pool_singleton
+
+# Pool xử lý video song song theo đoạn (chỉ tạo khi VIDEO_SEGMENT_PROCESSES > 0)
+_segment_pool_singleton = None
+
+def get_video_segment_pool():
+	global _segment_pool_singleton
+	if VIDEO_SEGMENT_PROCESSES <= 0:
+		return None
+	# Dùng lại pool OCR nếu đã bật, tránh nạp thêm một bộ worker
+	pool = get_detector_pool()
+	if pool is not None:
+		return pool
+	with _pool_lock:
+		if _segment_pool_singleton is None:
+			_segment_pool_singleton = DetectorPool(VIDEO_SEGMENT_PROCESSES)
+	return _segment_pool_singleton
+
+def run_on_detector(fn, *args, **kwargs):
+	"""Chạy fn(detector, *args, **kwargs) trên pool worker nếu có, ngược lại trên detector dùng chung."""
+	pool = get_detector_pool()
+	if pool is not None:
+		return pool.run(fn, *args, **kwargs)
+	return fn(get_detector(), *args, **kwargs)
+
+def run_video_on_detector(fn, *args, **kwargs):
+	"""Như run_on_detector nhưng chờ theo VIDEO_POOL_TIMEOUT: thời gian xử lý video tỉ lệ với
+	độ dài video nên không dùng timeout của một task OCR (OCR_POOL_TIMEOUT)."""
+	pool = get_detector_pool()
+	if pool is not None:
+		return pool.submit(fn, *args, **kwargs).get(VIDEO_POOL_TIMEOUT)
+	return fn(get_detector(), *args, **kwargs)
+
+# Micro-batcher cho /api/detect_plate (chỉ tạo khi MICRO_BATCH_ENABLED)
+_batcher_singleton = None
+# Mỗi worker của pool OCR có thể chạy một lô
+MICRO_BATCH_IN_FLIGHT = max(OCR_POOL_SIZE, MICRO_BATCH_MAX_IN_FLIGHT)
+
+def get_micro_batcher():
+	global _batcher_singleton
+	if not MICRO_BATCH_ENABLED:
+		return None
+	with _pool_lock:
+		if _batcher_singleton is None:
+			_batcher_singleton = MicroBatcher(lambda items: run_on_detector(detect_best_plates_batch, items),
+											  max_in_flight=MICRO_BATCH_IN_FLIGHT)
+	return _batcher_singleton
+
+# Hàng đợi có giới hạn, ưu tiên và deadline đặt trước detector
+_admission_singleton = None
+
+def get_admission():
+	global _admission_singleton
+	with _pool_lock:
+		if _admission_singleton is None:
+			workers = ADMISSION_WORKERS
+			if MICRO_BATCH_ENABLED:
+				# Worker admission chỉ chờ kết quả của batcher: cần đủ request đồng thời để lấp
+				# đầy mọi lô đang chạy
+				workers = max(workers, MICRO_BATCH_MAX_SIZE * MICRO_BATCH_IN_FLIGHT)
+			_admission_singleton = AdmissionController(workers=workers)
+	return _admission_singleton
+
+# Hàng đợi riêng cho video: request video chạy nhiều phút không được chiếm worker của
+# /api/detect_plate (ưu tiên chỉ sắp lại hàng đợi, không ngắt được việc đang chạy)
+_video_admission_singleton = None
+
+def get_video_admission():
+	global _video_admission_singleton
+	with _pool_lock:
+		if _video_admission_singleton is None:
+			_video_admission_singleton = AdmissionController(VIDEO_ADMISSION_MAX_QUEUE, VIDEO_ADMISSION_WORKERS)
+	return _video_admission_singleton
+
+def _overloaded_response(error, status):
+	return jsonify({'error': str(error)}), status, {'Retry-After': str(error.retry_after)}
+
+def _run_detect_plate(image, camera_id):
+	batcher = get_micro_batcher()
+	if batcher is not None:
+		return batcher.submit((image, camera_id)).result(timeout=OCR_POOL_TIMEOUT)
+	return run_on_detector(detect_best_plate, image, camera_id)
+
 # Hàm kiểm tra/chuẩn hóa biển số VN
 VN_STRICT_REGEX = re.compile(r'^\d{1,2}[A-Z]{1,2}-\d{2,3}\.\d{2}$')
 
@@ -69,6 +181,96 @@ def normalize_vn_plate(text: str) -> str:
 		return f"{m.group(1)}-{m.group(2)}.{m.group(3)}"
 	return s
 
+def detect_best_plate(detector, image, camera_id=None):
+	"""Nhận diện và chọn biển số tốt nhất cho /api/detect_plate.
+
+	Chạy được cả trong pool worker (detector là bản nạp sẵn của worker) lẫn trong tiến trình Flask.
+	"""
+	results, ocr_stats = detector.detect_with_stats(image, camera_id=camera_id)
+	return _choose_best_plate(detector, image, camera_id, results, ocr_stats)
+
+def _choose_best_plate(detector, image, camera_id, results, ocr_stats):
+	"""Chọn biển số tốt nhất từ kết quả cascade, chạy fallback readtext khi cần."""
+	print(f"api_detect_plate: stages={ocr_stats['stages']} ocr_calls={ocr_stats['ocr_calls']} stop={ocr_stats['stop_reason']}")
+	chosen_list = _normalize_results(results)
+	
+	# Fallback mạnh: nếu vẫn rỗng, đọc OCR trực tiếp nhiều biến thể + paragraph và suy diễn.
+	# Stage paragraph của cascade đã đọc đúng các biến thể này, nên fallback chỉ chạy khi cascade
+	# dừng trước stage đó (ví dụ lỗi giữa chừng), và mỗi lượt readtext được tính vào ngân sách OCR
+	if (not chosen_list and detector.reader is not None and 'paragraph' not in ocr_stats['stages']
+			and ocr_stats['stop_reason'] != 'budget'):
+		budget = ocr_stats['ocr_budget']
+		ocr_stats['stages'].append('fallback')
+		try:
+			variants = []
+			# dựng biến thể tương tự trong detector (chỉ trong ROI của camera nếu có)
+			roi_image, _ = detector.apply_roi(image, camera_id)
+			variants.extend(detector._generate_variants(roi_image))
+			variants.append(roi_image)
+			cands = []
+			# Mỗi biến thể đọc thường rồi paragraph
+			reads = [(var, paragraph) for var in variants for paragraph in (False, True)]
+			for var, paragraph in reads:
+				if budget is not None and ocr_stats['ocr_calls'] >= budget:
+					ocr_stats['stop_reason'] = 'budget'
+					break
+				ocr_stats['ocr_calls'] += 1
+				try:
+					ocr_results = detector.reader.readtext(var, paragraph=paragraph)
+				except Exception:
+					if not paragraph:
+						raise
+					continue
+				for _, txt, conf in ocr_results:
+					n = normalize_vn_plate(txt)
+					# Ưu tiên biến thể hợp lệ hoặc có đủ 5 chữ số
+					if is_strict_vn_plate(n) or sum(1 for c in n if c.isdigit()) >= 5:
+						cands.append({'text': n, 'confidence': conf, 'score': conf})
+			# chọn ứng viên tốt nhất nếu có
+			if cands:
+				cands.sort(key=lambda x: x['score'], reverse=True)
+				best = cands[0]
+				return {'success': True, 'license_plate': best['text'], 'confidence': best['confidence'], 'ocr_stats': ocr_stats}
+		except Exception as e:
+			print(f"api_detect_plate fallback error: {e}")
+	
+	return _best_plate_response(chosen_list, ocr_stats)
+
+def _normalize_results(results):
+	"""Chuẩn hóa tất cả kết quả rồi lọc chặt, trả về danh sách ứng viên."""
+	normalized = []
+	for r in results:
+		text_norm = normalize_vn_plate(r['text'])
+		normalized.append({**r, 'text': text_norm})
+	strict_results = [r for r in normalized if is_strict_vn_plate(r['text'])]
+	return strict_results if strict_results else normalized
+
+def _best_plate_response(chosen_list, ocr_stats):
+	if chosen_list:
+		best = sorted(chosen_list, key=lambda x: x.get('score', x['confidence']), reverse=True)[0]
+		return {'success': True, 'license_plate': best['text'], 'confidence': best['confidence'], 'ocr_stats': ocr_stats}
+	else:
+		return {'success': False, 'message': 'Không tìm thấy biển số xe', 'ocr_stats': ocr_stats}
+
+def detect_best_plates_batch(detector, items):
+	"""Phiên bản theo lô của detect_best_plate cho micro-batching: items là list (image, camera_id).
+
+	Mỗi ảnh đi qua cùng cascade và cùng bước chọn/fallback như detect_best_plate, nên kết quả
+	giống hệt khi gọi từng ảnh.
+	"""
+	images = [image for image, _ in items]
+	camera_ids = [camera_id for _, camera_id in items]
+	return [
+		_choose_best_plate(detector, image, camera_id, results, ocr_stats)
+		for (image, camera_id), (results, ocr_stats) in zip(items, detector.detect_batch(images, camera_ids))
+	]
+
+def detect_video_file(detector, video_path):
+	return detector.detect_from_video_file(video_path)
+
+def collect_detector_stats(detector):
+	return {'pid': os.getpid(), 'profiles': detector.get_profile_stats(), 'variants': detector.variant_stats.report()}
+
 # Cấu hình upload
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm', 'jpg', 'jpeg', 'png', 'gif'}
@@ -112,6 +314,7 @@ def statistics():
 @app.route('/api/detect_plate', methods=['POST'])
 def api_detect_plate():
 	"""API nhận diện biển số từ ảnh"""
+	received = time.monotonic()
 	try:
 		data = request.get_json(silent=True) or {}
 		image_data = data.get('image')
@@ -147,87 +350,74 @@ def api_detect_plate():
 			print(f"api_detect_plate: resized on server to {new_w}x{new_h}")
 		
 		print(f"api_detect_plate: image shape={image.shape}")
-		detector = get_detector()
-		results = detector.detect_license_plate(image)
-		
-		# Chuẩn hóa tất cả kết quả rồi lọc chặt
-		normalized = []
-		for r in results:
-			text_norm = normalize_vn_plate(r['text'])
-			normalized.append({**r, 'text': text_norm})
-		strict_results = [r for r in normalized if is_strict_vn_plate(r['text'])]
-		chosen_list = strict_results if strict_results else normalized
-		
-		# Fallback mạnh: nếu vẫn rỗng, đọc OCR trực tiếp nhiều biến thể + paragraph và suy diễn
-		if not chosen_list:
-			try:
-				variants = []
-				# dựng biến thể tương tự trong detector
-				variants.extend(detector._generate_variants(image))
-				variants.append(image)
-				cands = []
-				for var in variants:
-					ocr1 = detector.reader.readtext(var)
-					for _, txt, conf in ocr1:
-						n = normalize_vn_plate(txt)
-						# Ưu tiên biến thể hợp lệ hoặc có đủ 5 chữ số
-						if is_strict_vn_plate(n) or sum(1 for c in n if c.isdigit()) >= 5:
-							cands.append({'text': n, 'confidence': conf, 'score': conf})
-					# paragraph
-					try:
-						ocr2 = detector.reader.readtext(var, paragraph=True)
-						for _, txt, conf in ocr2:
-							n = normalize_vn_plate(txt)
-							if is_strict_vn_plate(n) or sum(1 for c in n if c.isdigit()) >= 5:
-								cands.append({'text': n, 'confidence': conf, 'score': conf})
-					except Exception:
-						pass
-				# chọn ứng viên tốt nhất nếu có
-				if cands:
-					cands.sort(key=lambda x: x['score'], reverse=True)
-					best = cands[0]
-					return jsonify({'success': True, 'license_plate': best['text'], 'confidence': best['confidence']})
-			except Exception as e:
-				print(f"api_detect_plate fallback error: {e}")
+		# Lưu lượng từ làn thu phí ('lane') được ưu tiên hơn upload từ dashboard
+		source = data.get('source') or request.headers.get('X-Traffic-Source', 'dashboard')
+		priority = PRIORITIES.get(source, PRIORITY_DASHBOARD)
+		deadline_ms = data.get('deadline_ms') or request.headers.get('X-Deadline-Ms') or ADMISSION_DEFAULT_DEADLINE_MS
+		deadline = received + float(deadline_ms) / 1000
+		future = get_admission().submit(_run_detect_plate, image, data.get('camera_id'),
+										priority=priority, deadline=deadline)
+		try:
+			result = future.result(timeout=max(deadline - time.monotonic(), 0))
+		except FutureTimeoutError:
+			future.cancel()
+			raise DeadlineExceededError("Hết thời gian chờ nhận diện")
+		return jsonify(result)
+	
+	except QueueFullError as e:
+		print(f"api_detect_plate: rejected ({e})")
+		return _overloaded_response(e, 429)
+	except DeadlineExceededError as e:
+		print(f"api_detect_plate: dropped ({e})")
+		return _overloaded_response(e, 503)
 		
-		if chosen_list:
-			best = sorted(chosen_list, key=lambda x: x.get('score', x['confidence']), reverse=True)[0]
-			return jsonify({'success': True, 'license_plate': best['text'], 'confidence': best['confidence']})
-		else:
-			return jsonify({'success': False, 'message': 'Không tìm thấy biển số xe'})
-			
 	except Exception as e:
 		print(f"api_detect_plate: unexpected error: {e}")
 		return jsonify({'error': str(e)}), 500
 
+def _save_uploaded_video():
+	"""Kiểm tra và lưu file video upload. Trả về (tên file, đường dẫn tạm, None) hoặc (None, None, response lỗi)."""
+	# Kiểm tra file upload
+	if 'video' not in request.files:
+		return None, None, (jsonify({'error': 'Không có file video'}), 400)
+	
+	file = request.files['video']
+	if file.filename == '':
+		return None, None, (jsonify({'error': 'Không có file được chọn'}), 400)
+	
+	if not allowed_file(file.filename):
+		return None, None, (jsonify({'error': 'Định dạng file không được hỗ trợ'}), 400)
+	
+	# Kiểm tra kích thước file
+	if file.content_length and file.content_length > app.config['MAX_CONTENT_LENGTH']:
+		return None, None, (jsonify({'error': 'File video quá lớn'}), 400)
+	
+	# Lưu file tạm thời
+	temp_filename = f"{uuid.uuid4()}_{file.filename}"
+	temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
+	file.save(temp_path)
+	return file.filename, temp_path, None
+
 @app.route('/api/detect_plate_video', methods=['POST'])
 def api_detect_plate_video():
-	"""API nhận diện biển số từ video"""
+	"""API nhận diện biển số từ video (gửi async=1 để tạo job chạy nền)"""
 	try:
-		# Kiểm tra file upload
-		if 'video' not in request.files:
-			return jsonify({'error': 'Không có file video'}), 400
-		
-		file = request.files['video']
-		if file.filename == '':
-			return jsonify({'error': 'Không có file được chọn'}), 400
-		
-		if not allowed_file(file.filename):
-			return jsonify({'error': 'Định dạng file không được hỗ trợ'}), 400
+		if request.form.get('async') in ('1', 'true'):
+			return api_create_video_job()
 		
-		# Kiểm tra kích thước file
-		if file.content_length and file.content_length > app.config['MAX_CONTENT_LENGTH']:
-			return jsonify({'error': 'File video quá lớn'}), 400
-		
-		# Lưu file tạm thời
-		temp_filename = f"{uuid.uuid4()}_{file.filename}"
-		temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-		file.save(temp_path)
+		filename, temp_path, error = _save_uploaded_video()
+		if error:
+			return error
 		
 		try:
 			# Xử lý video
-			print(f"Bắt đầu xử lý video: {file.filename}")
-			results = get_detector().detect_from_video_file(temp_path)
+			print(f"Bắt đầu xử lý video: {filename}")
+			segment_pool = get_video_segment_pool()
+			if segment_pool is not None:
+				results = get_video_admission().submit(
+					segment_pool.detect_video_file, temp_path, segments=VIDEO_SEGMENT_PROCESSES).result()
+			else:
+				results = get_video_admission().submit(run_video_on_detector, detect_video_file, temp_path).result()
 			print(f"Kết quả xử lý: {len(results) if results else 0} detections")
 			
 			# Xóa file tạm
@@ -256,10 +446,201 @@ def api_detect_plate_video():
 			print(f"Lỗi xử lý video: {str(e)}")
 			raise e
 			
+	except QueueFullError as e:
+		print(f"Lỗi API video: {str(e)}")
+		return _overloaded_response(e, 429)
 	except Exception as e:
 		print(f"Lỗi API video: {str(e)}")
 		return jsonify({'error': str(e)}), 500
 
+def _json_default(value):
+	# Số kiểu numpy (confidence, toạ độ) -> kiểu Python
+	if hasattr(value, 'item'):
+		return value.item()
+	raise TypeError(f"Không thể chuyển sang JSON: {type(value)}")
+
+def _stream_event(event, data, fmt):
+	payload = json.dumps({'event': event, **data}, default=_json_default, ensure_ascii=False)
+	if fmt == 'sse':
+		return f"event: {event}\ndata: {payload}\n\n"
+	return payload + "\n"
+
+@app.route('/api/detect_plate_video/stream', methods=['POST'])
+def api_detect_plate_video_stream():
+	"""API nhận diện video dạng stream: gửi kết quả từng frame ngay khi xử lý xong.
+
+	format=sse (Server-Sent Events, mặc định) hoặc format=ndjson (mỗi dòng một JSON).
+	"""
+	fmt = request.args.get('format') or request.form.get('format') or 'sse'
+	if fmt not in ('sse', 'ndjson'):
+		return jsonify({'error': 'format phải là sse hoặc ndjson'}), 400
+	filename, temp_path, error = _save_uploaded_video()
+	if error:
+		return error
+	sample_rate = int(request.form.get('sample_rate', 5))
+	
+	# Chạy trong hàng đợi video như /api/detect_plate_video (qua pool nếu có), kết quả từng frame
+	# được chuyển sang generator qua `events`; detector chỉ giữ kết quả tốt nhất của mỗi biển số
+	events = queue.Queue(maxsize=VIDEO_STREAM_BUFFER)
+	cancel_event = threading.Event()
+	
+	def publish(progress):
+		# Client đọc chậm: chờ chỗ trống thay vì dồn event trong bộ nhớ
+		while not cancel_event.is_set():
+			try:
+				events.put(progress, timeout=0.5)
+				return
+			except queue.Full:
+				pass
+	
+	try:
+		future = get_video_admission().submit(_run_video_job, temp_path, publish, cancel_event,
+											  sample_rate=sample_rate, max_processed_frames=None)
+	except QueueFullError as e:
+		os.remove(temp_path)
+		return _overloaded_response(e, 429)
+	
+	def generate():
+		processed = 0
+		try:
+			print(f"Bắt đầu stream video: {filename}")
+			while True:
+				try:
+					progress = events.get(timeout=0.5)
+				except queue.Empty:
+					if future.done() and events.empty():
+						break
+					continue
+				processed = progress['frames_processed']
+				if progress['detections']:
+					yield _stream_event('detection', progress, fmt)
+			results = future.result()
+			yield _stream_event('done', {
+				'frames_processed': processed,
+				'plates': [{'text': r['text'], 'confidence': r['confidence']} for r in results],
+			}, fmt)
+		except Exception as e:
+			print(f"Lỗi stream video: {str(e)}")
+			yield _stream_event('error', {'error': str(e)}, fmt)
+		finally:
+			# Client ngắt kết nối: bỏ request nếu còn trong hàng đợi, dừng nếu đang chạy
+			cancel_event.set()
+			future.cancel()
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+	
+	mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+	return Response(stream_with_context(generate()), mimetype=mimetype,
+					headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Job xử lý video chạy nền
+_video_jobs_singleton = None
+
+def _run_video_job(video_path, progress_callback, cancel_event, sample_rate=5, max_processed_frames=100):
+	# Có pool: chia video theo đoạn cho các worker, tiến độ báo theo từng đoạn xong.
+	# Không có pool: chạy trên detector trong tiến trình Flask, tiến độ từng frame.
+	# Lỗi được ném lại để job chuyển sang 'failed' thay vì 'completed' với 0 kết quả
+	pool = get_video_segment_pool() or get_detector_pool()
+	if pool is not None:
+		return pool.detect_video_file(video_path, sample_rate, segments=VIDEO_SEGMENT_PROCESSES or None,
+									  progress_callback=progress_callback, cancel_event=cancel_event)
+	return get_detector().detect_from_video_file(
+		video_path, sample_rate, progress_callback=progress_callback, cancel_event=cancel_event,
+		ignore_errors=False, max_processed_frames=max_processed_frames)
+
+def get_video_jobs():
+	global _video_jobs_singleton
+	with _pool_lock:
+		if _video_jobs_singleton is None:
+			_video_jobs_singleton = VideoJobManager(_run_video_job)
+	return _video_jobs_singleton
+
+@app.route('/api/video_jobs', methods=['POST'])
+def api_create_video_job():
+	"""API tạo job nhận diện video, trả về job id ngay sau khi upload xong"""
+	try:
+		filename, temp_path, error = _save_uploaded_video()
+		if error:
+			return error
+		job = get_video_jobs().submit(temp_path, filename)
+		print(f"Tạo job video {job.id}: {filename}")
+		return jsonify({
+			'success': True,
+			'job_id': job.id,
+			'status': job.status,
+			'status_url': url_for('api_video_job', job_id=job.id),
+			'results_url': url_for('api_video_job_results', job_id=job.id),
+		}), 202
+	except Exception as e:
+		print(f"Lỗi tạo job video: {str(e)}")
+		return jsonify({'error': str(e)}), 500
+
+@app.route('/api/video_jobs/<job_id>', methods=['GET', 'DELETE'])
+def api_video_job(job_id):
+	"""API xem tiến độ job video (DELETE để hủy)"""
+	jobs = get_video_jobs()
+	job = jobs.cancel(job_id) if request.method == 'DELETE' else jobs.get(job_id)
+	if job is None:
+		return jsonify({'error': 'Không tìm thấy job (hoặc đã hết hạn)'}), 404
+	return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/video_jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_video_job(job_id):
+	"""API hủy job video"""
+	job = get_video_jobs().cancel(job_id)
+	if job is None:
+		return jsonify({'error': 'Không tìm thấy job (hoặc đã hết hạn)'}), 404
+	return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/video_jobs/<job_id>/results')
+def api_video_job_results(job_id):
+	"""API lấy kết quả job video (kết quả tạm thời nếu job chưa xong)"""
+	job = get_video_jobs().get(job_id)
+	if job is None:
+		return jsonify({'error': 'Không tìm thấy job (hoặc đã hết hạn)'}), 404
+	data = job.to_dict(include_results=True)
+	results = data['results']
+	if results:
+		best_result = max(results, key=lambda x: x['confidence'])
+		data['license_plate'] = best_result['text']
+		data['confidence'] = best_result['confidence']
+	return jsonify({'success': True, 'job': data})
+
+@app.route('/api/detector_stats')
+def api_detector_stats():
+	"""API thống kê chi phí nhận diện theo từng profile tiền xử lý và tỉ lệ hit của biến thể.
+
+	Thống kê nằm trong tiến trình chạy OCR: khi bật pool, đó là thống kê của một worker
+	(worker nhận request này, `pid`) kể từ khi worker được tạo, không phải tổng của cả pool.
+	"""
+	try:
+		stats = run_on_detector(collect_detector_stats)
+		pool = get_detector_pool()
+		stats['scope'] = 'worker' if pool is not None else 'process'
+		if pool is not None:
+			stats['pool'] = pool.stats()
+		batcher = get_micro_batcher()
+		if batcher is not None:
+			stats['micro_batch'] = batcher.stats()
+		return jsonify({'success': True, **stats})
+	except Exception as e:
+		return jsonify({'error': str(e)}), 500
+
+@app.route('/api/detection_queue/stats')
+def api_detection_queue_stats():
+	"""API theo dõi hàng đợi nhận diện: độ sâu, thời gian chờ, số request bị từ chối/bỏ"""
+	return jsonify({'success': True, 'queue': get_admission().stats(), 'video_queue': get_video_admission().stats()})
+
+@app.route('/api/database/stats')
+def api_database_stats():
+	"""API theo dõi cơ sở dữ liệu: pool kết nối, cache thông tin xe, hàng đợi ghi theo lô"""
+	toll_writer = get_toll_writer()
+	return jsonify({
+		'success': True,
+		'database': get_db().stats(),
+		'writer': toll_writer.stats() if toll_writer is not None else None,
+	})
+
 @app.route('/api/process_toll', methods=['POST'])
 def api_process_toll():
 	"""API xử lý thu phí"""
@@ -269,13 +650,14 @@ def api_process_toll():
 		vehicle_type = data.get('vehicle_type', 'car')
 		weight = data.get('weight')
 		distance = data.get('distance')
+		lane_id = data.get('lane_id')
 		
 		if not license_plate:
 			return jsonify({'error': 'Thiếu biển số xe'}), 400
 		
 		# Xử lý xe vào trạm
 		result = toll_system.process_vehicle_entry(
-			license_plate, vehicle_type, weight, distance
+			license_plate, vehicle_type, weight, distance, lane_id
 		)
 		
 		if result['success']:
@@ -307,8 +689,22 @@ def api_toll_history():
 	"""API lấy lịch sử thu phí"""
 	try:
 		license_plate = request.args.get('license_plate')
-		history = toll_system.get_toll_history(license_plate)
-		return jsonify({'success': True, 'history': history})
+		# Dùng đúng giới hạn đã áp dụng khi truy vấn để tính cursor (limit=1000 chỉ trả 500 dòng)
+		limit = toll_system.clamp_history_limit(request.args.get('limit', 50, type=int))
+		history = toll_system.get_toll_history(
+			license_plate,
+			start=request.args.get('from'),
+			end=request.args.get('to'),
+			limit=limit,
+			cursor=request.args.get('cursor'),
+		)
+		return jsonify({
+			'success': True,
+			'history': history,
+			'next_cursor': toll_system.history_cursor(history, limit),
+		})
+	except ValueError as e:
+		return jsonify({'error': f'Tham số không hợp lệ: {e}'}), 400
 	except Exception as e:
 		return jsonify({'error': str(e)}), 500
 
@@ -316,8 +712,11 @@ def api_toll_history():
 def api_statistics():
 	"""API lấy thống kê"""
 	try:
-		stats = toll_system.get_daily_statistics()
+		date = request.args.get('date')
+		stats = toll_system.get_daily_statistics(datetime.date.fromisoformat(date) if date else None)
 		return jsonify({'success': True, 'statistics': stats})
+	except ValueError as e:
+		return jsonify({'error': f'Tham số không hợp lệ: {e}'}), 400
 	except Exception as e:
 		return jsonify({'error': str(e)}), 500
 